@@ -0,0 +1 @@
+"""Supporting components for the Shiraji AI Assistant chat service (main.py)"""
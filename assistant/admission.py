@@ -0,0 +1,219 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued for an upstream slot"""
+
+    def __init__(self, reason: str, retry_after: int, status_code: int = 503):
+        super().__init__(f"Upstream overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class Slot:
+    """A granted upstream slot; record() overrides the latency measured on release"""
+
+    __slots__ = ("started", "latency")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+
+    def record(self, latency: float) -> None:
+        if self.latency is None:
+            self.latency = latency
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit for upstream generations with a fair, bounded wait queue
+
+    The limit grows by about one slot per round of completions that finish
+    within ``latency_target`` and shrinks by ``backoff`` (at most once per
+    observed latency) when calls are slow or fail. Waiting requests are served
+    round-robin by conversation so one chatty client cannot starve the rest.
+
+    Background work acquires preemptible slots: it never queues, and each
+    request that has to queue cancels the newest preemptible call so the
+    request gets its slot instead.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_target: float = 10.0,
+        backoff: float = 0.8,
+        max_queue: int = 64,
+        max_queue_per_conversation: int = 2,
+        queue_timeout: float = 20.0,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.max_queue_per_conversation = max_queue_per_conversation
+        self.queue_timeout = queue_timeout
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        self._last_decrease = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._preemptible: "OrderedDict[asyncio.Task, None]" = OrderedDict()
+
+        self.admitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = {"queue_full": 0, "conversation_queue_full": 0, "queue_timeout": 0}
+        self.preempted = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def retry_after(self) -> int:
+        """Seconds until a queued request would likely get a slot"""
+        latency = self._latency_ewma or self.latency_target
+        return max(1, math.ceil((self._queued + 1) / max(self.limit, 1) * latency))
+
+    def has_spare_capacity(self, reserve: int = 1) -> bool:
+        """True when nothing is queued and more than reserve slots are free (for optional background work)"""
+        return not self._queued and self._in_flight + reserve < self.limit
+
+    def ensure_capacity(self, conversation_id: str) -> None:
+        """Raise Overloaded now if acquire() would be shed (used before starting a stream)"""
+        if self._in_flight < self.limit and not self._queued:
+            return
+        if self._queued >= self.max_queue:
+            self.shed["queue_full"] += 1
+            raise Overloaded("queue_full", self.retry_after(), 503)
+        if len(self._queues.get(conversation_id, ())) >= self.max_queue_per_conversation:
+            self.shed["conversation_queue_full"] += 1
+            raise Overloaded("conversation_queue_full", self.retry_after(), 429)
+
+    @asynccontextmanager
+    async def acquire(self, conversation_id: str, preemptible: bool = False) -> AsyncIterator[Slot]:
+        """A slot for one upstream call; a preemptible caller raises Overloaded instead of queueing
+        and is cancelled when a request has to queue"""
+        await self._wait_for_slot(conversation_id, preemptible)
+        self.admitted += 1
+        slot = Slot()
+        task = asyncio.current_task() if preemptible else None
+        if task is not None:
+            self._preemptible[task] = None
+        try:
+            yield slot
+        except (asyncio.CancelledError, GeneratorExit):
+            # The caller went away (or was preempted); that says nothing about upstream health
+            self._in_flight -= 1
+            self._grant()
+            raise
+        except BaseException:
+            self._release(slot, failed=True)
+            raise
+        else:
+            self._release(slot, failed=False)
+        finally:
+            if task is not None:
+                self._preemptible.pop(task, None)
+
+    async def _wait_for_slot(self, conversation_id: str, preemptible: bool = False) -> None:
+        if self._in_flight < self.limit and not self._queued:
+            self._in_flight += 1
+            return
+        if preemptible:
+            raise Overloaded("no_spare_slot", self.retry_after(), 503)
+        self.ensure_capacity(conversation_id)
+
+        waiter = asyncio.get_event_loop().create_future()
+        queue = self._queues.get(conversation_id)
+        if queue is None:
+            queue = self._queues[conversation_id] = deque()
+        queue.append(waiter)
+        self._queued += 1
+        self._preempt()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(conversation_id, waiter)
+            self.shed["queue_timeout"] += 1
+            raise Overloaded("queue_timeout", self.retry_after(), 503)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the caller went away
+                self._in_flight -= 1
+                self._grant()
+            else:
+                self._discard(conversation_id, waiter)
+            raise
+
+    def _preempt(self) -> None:
+        """Cancel the newest preemptible call; its slot goes to the queue once it has unwound"""
+        if self._preemptible:
+            task, _ = self._preemptible.popitem()
+            task.cancel()
+            self.preempted += 1
+
+    def _discard(self, conversation_id: str, waiter: asyncio.Future) -> None:
+        queue = self._queues.get(conversation_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[conversation_id]
+
+    def _grant(self) -> None:
+        while self._queued and self._in_flight < self.limit:
+            conversation_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(conversation_id)
+            else:
+                del self._queues[conversation_id]
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _release(self, slot: Slot, failed: bool) -> None:
+        self._in_flight -= 1
+        latency = slot.latency if slot.latency is not None else time.monotonic() - slot.started
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+        now = time.monotonic()
+        if failed or latency > self.latency_target:
+            if now - self._last_decrease > latency:
+                self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+        self._grant()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "queued_conversations": len(self._queues),
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "shed": dict(self.shed),
+            "preempted": self.preempted,
+            "latency_ewma_seconds": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+        }
@@ -0,0 +1,250 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from assistant.messages import Message
+
+# Keyword tables, in priority order: when several labels of one table match,
+# the first one listed wins.
+INTENT_KEYWORDS = {
+    "quote_request": ["quote", "price", "cost", "estimate", "budget"],
+    "project_inquiry": ["project", "build", "construct", "renovation"],
+    "service_question": ["service", "maintenance", "repair", "install"],
+    "general_info": ["about", "company", "experience", "portfolio"],
+    "contact_request": ["contact", "call", "visit", "appointment"],
+    "technical_support": ["problem", "issue", "help", "support"],
+}
+
+PROJECT_TYPE_KEYWORDS = {
+    "villa": ["villa", "house", "home", "residential"],
+    "commercial": ["office", "commercial", "business", "shop", "restaurant"],
+    "renovation": ["renovation", "remodel", "upgrade", "refurbish"],
+    "maintenance": ["maintenance", "repair", "fix", "service"],
+}
+
+LOCATION_KEYWORDS = {
+    location.title(): [location]
+    for location in ["abu dhabi", "dubai", "sharjah", "ajman", "ras al khaimah", "fujairah", "umm al quwain"]
+}
+
+URGENCY_KEYWORDS = {
+    "urgent": ["urgent", "asap", "immediately", "emergency"],
+    "soon": ["soon", "quickly", "fast", "this week"],
+    "flexible": ["flexible", "no rush", "when possible"],
+}
+
+SERVICE_KEYWORDS = {
+    service: [service]
+    for service in ["electrical", "plumbing", "hvac", "swimming pool", "interior design",
+                    "maintenance", "painting", "tiling", "carpentry", "security"]
+}
+
+BUDGET_PATTERN = r"\d+(?:[.,]\d+)*\s*(?:aed|dirhams?|thousand|million|k|m)\b"
+
+# Keywords match at the start of a word and may carry a plain inflection
+# ("services", "installation", "repaired", "quoted", "builder") but never sit
+# inside another word ("fix" does not match "prefix").
+_INFLECTIONS = r"(?:s|es|d|ed|er|ers|ing|ion|ions|ation|ations)?"
+# A keyword ending in "e" drops it before these ("price" -> "pricing", "quote" -> "quotation")
+_E_DROP_INFLECTIONS = r"(?:ing|ion|ions|ation|ations)"
+# A keyword ending in "ion" also matches its verb ("renovation" -> "renovate", "renovating")
+_ION_INFLECTIONS = r"(?:e|es|ed|ing|or|ors)"
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation shaped like a prefix trie, so each position is tried once per branch"""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + render(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and not terminal else "(?:" + "|".join(branches) + ")"
+        return body + "?" if terminal else body
+
+    return render(trie)
+
+
+def _alternative(words: Iterable[str], inflections: str) -> str:
+    words = list(words)
+    # A group that never matches keeps the group numbers fixed when there are no words
+    return f"({_trie_pattern(words)}){inflections}" if words else "((?!))"
+
+
+class KeywordMatcher:
+    """Finds every keyword of several keyword tables in one regex pass"""
+
+    def __init__(self, tables: Dict[str, Dict[str, List[str]]], patterns: Optional[Dict[str, str]] = None):
+        self.tables = tables
+        self._labels: Dict[str, List[tuple]] = {}
+        for table, entries in tables.items():
+            for label, keywords in entries.items():
+                for keyword in keywords:
+                    self._labels.setdefault(self._normalize(keyword), []).append((table, label))
+
+        # Stems of single-word keywords, which only match with one of their own inflections
+        e_stems: Dict[str, str] = {}
+        ion_stems: Dict[str, str] = {}
+        for keyword in self._labels:
+            if " " in keyword:
+                continue
+            if keyword.endswith("e") and len(keyword) > 3:
+                e_stems[keyword[:-1]] = keyword
+            if keyword.endswith("ion") and len(keyword) > 5:
+                ion_stems[keyword[:-3]] = keyword
+        self._stems = [e_stems, ion_stems]
+
+        # Group 1 is the keyword, groups 2 and 3 stems, groups 4.. the extra patterns, so
+        # findall() yields one tuple per match and all of the work stays inside the regex engine
+        self._patterns = list((patterns or {}).items())
+        alternatives = [
+            _alternative(self._labels, _INFLECTIONS),
+            _alternative(e_stems, _E_DROP_INFLECTIONS),
+            _alternative(ion_stems, _ION_INFLECTIONS),
+        ]
+        alternatives += [f"({pattern})" for _, pattern in self._patterns]
+        self._regex = re.compile(r"\b(?:" + "|".join(alternatives) + r")\b")
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def scan(self, text: str) -> Dict[str, Any]:
+        """Return {table: set of matched labels} plus the first match of each extra pattern"""
+        found: Dict[str, Any] = {table: set() for table in self.tables}
+        matches = self._regex.findall(text.lower())
+
+        keywords = {match[0] for match in matches if match[0]}
+        for index, stems in enumerate(self._stems, start=1):
+            keywords.update(stems[match[index]] for match in matches if match[index])
+        for keyword in keywords:
+            for table, label in self._labels[self._normalize(keyword)]:
+                found[table].add(label)
+        for index, (name, _) in enumerate(self._patterns, start=1 + len(self._stems)):
+            found[name] = next((match[index] for match in matches if match[index]), None)
+        return found
+
+
+class ConversationAnalyzer:
+    """Advanced conversation analysis and context management"""
+
+    def __init__(self):
+        self.company_context = {
+            "name": "Shiraji Group",
+            "location": "Al Nahyan, Abu Dhabi, UAE",
+            "phone": "+971 55 942 5653",
+            "email": "info@shiraji.ae",
+            "services": [
+                "Residential & Commercial Construction",
+                "Electrical Systems", "HVAC & Climate Control",
+                "Plumbing & Water Systems", "Swimming Pool Installation",
+                "Interior Design", "Maintenance Services",
+                "Security & Fencing", "Cleaning Services"
+            ]
+        }
+        self.matcher = KeywordMatcher(
+            {
+                "intents": INTENT_KEYWORDS,
+                "project_type": PROJECT_TYPE_KEYWORDS,
+                "location": LOCATION_KEYWORDS,
+                "urgency": URGENCY_KEYWORDS,
+                "services": SERVICE_KEYWORDS,
+            },
+            patterns={"budget": BUDGET_PATTERN},
+        )
+
+    def analyze_intent(self, message: str, history: List[Message]) -> Dict[str, Any]:
+        """Analyze user intent and extract context"""
+        return self.analyze_message(message, len(history))
+
+    def analyze_message(self, message: str, message_count: int = 0) -> Dict[str, Any]:
+        """analyze_intent for a message with message_count earlier messages (for logs without the history)"""
+        found = self.matcher.scan(message)
+
+        # Intent detection
+        intents = {intent: intent in found["intents"] for intent in INTENT_KEYWORDS}
+
+        # Extract entities
+        entities = {
+            "project_type": self._first(PROJECT_TYPE_KEYWORDS, found["project_type"]),
+            "location": self._first(LOCATION_KEYWORDS, found["location"]),
+            "budget_range": found["budget"],
+            "urgency": self._first(URGENCY_KEYWORDS, found["urgency"]),
+            "services_mentioned": [service for service in SERVICE_KEYWORDS if service in found["services"]]
+        }
+
+        # Conversation stage analysis
+        stage = self._determine_conversation_stage(message_count, intents)
+
+        return {
+            "intents": {k: v for k, v in intents.items() if v},
+            "entities": {k: v for k, v in entities.items() if v},
+            "conversation_stage": stage,
+            "message_count": message_count,
+            "primary_intent": self._first(INTENT_KEYWORDS, found["intents"]) or "general"
+        }
+
+    @staticmethod
+    def _first(table: Dict[str, List[str]], matched: set) -> Optional[str]:
+        """Highest-priority label of a keyword table that was matched"""
+        for label in table:
+            if label in matched:
+                return label
+        return None
+
+    def _determine_conversation_stage(self, message_count: int, intents: Dict[str, bool]) -> str:
+        if message_count == 0:
+            return "greeting"
+        elif message_count <= 3:
+            return "exploration"
+        elif any(intents.get(intent, False) for intent in ["quote_request", "contact_request"]):
+            return "conversion"
+        else:
+            return "discussion"
+
+    def generate_suggestions(self, analysis: Dict[str, Any]) -> List[str]:
+        """Generate smart follow-up suggestions based on context"""
+        suggestions = []
+
+        primary_intent = analysis.get("primary_intent", "general")
+        entities = analysis.get("entities", {})
+        stage = analysis.get("conversation_stage", "greeting")
+
+        if primary_intent == "quote_request":
+            if not entities.get("project_type"):
+                suggestions.append("What type of project are you planning?")
+            if not entities.get("location"):
+                suggestions.append("Which emirate is your project located in?")
+            suggestions.append("Schedule a site visit for accurate quote")
+
+        elif primary_intent == "project_inquiry":
+            suggestions.extend([
+                "View our recent projects",
+                "Get a cost estimate",
+                "Schedule a consultation"
+            ])
+
+        elif stage == "conversion":
+            suggestions.extend([
+                "Call us now: +971 55 942 5653",
+                "Send project details via email",
+                "Book a site visit"
+            ])
+
+        else:
+            suggestions.extend([
+                "Tell me about your project",
+                "Get a quick quote",
+                "See our services"
+            ])
+
+        return suggestions[:3]  # Limit to 3 suggestions
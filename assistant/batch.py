@@ -0,0 +1,329 @@
+"""Offline intent and entity analysis of chat logs in JSONL
+
+Each input line is one message, either ``{"message": "...",
+"conversation_id": "...", "message_count": 3}`` or a history entry
+``{"role": "user", "content": "..."}`` (entries of other roles are
+skipped). message_count, the number of earlier messages in the
+conversation, sets the conversation stage; without it a message is
+analyzed as the first of its conversation.
+
+Lines are read in chunks which a process pool analyzes, with only a few
+chunks in flight, so memory stays flat however large the file is. Chunks
+are committed in order; after each one the byte offset reached, the
+counts so far and the size of the results file go to the state file, from
+which an interrupted run carries on:
+
+    python -m assistant.batch chats.jsonl --output leads.jsonl --leads-only --state chats.state.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, BinaryIO, Deque, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from assistant.analyzer import ConversationAnalyzer
+
+CHUNK_LINES = 5000
+# Longer lines in an uploaded body are counted as invalid rather than held in memory
+MAX_LINE_BYTES = 1 << 20
+
+# Messages asking for a price or a call, or naming a budget or a deadline, are worth following up
+LEAD_INTENTS = frozenset(("quote_request", "contact_request"))
+ENTITY_LABELS = ("project_type", "location", "urgency", "services_mentioned")
+
+# One analyzer per worker process, built on its first chunk
+_analyzer: Optional[ConversationAnalyzer] = None
+
+
+class OverlongLine:
+    """Stands in for a line over the length cap; only its length is kept, so offsets stay right"""
+
+    __slots__ = ("length",)
+
+    def __init__(self, length: int):
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+
+def is_lead(analysis: Dict[str, Any]) -> bool:
+    entities = analysis["entities"]
+    return analysis["primary_intent"] in LEAD_INTENTS or "budget_range" in entities or "urgency" in entities
+
+
+class BatchCounts:
+    """Message, intent and entity counts over a batch; merge() adds another chunk's"""
+
+    def __init__(self):
+        self.messages = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.leads = 0
+        self.budget_mentions = 0
+        self.primary_intent: Counter = Counter()
+        self.intents: Counter = Counter()
+        self.conversation_stage: Counter = Counter()
+        self.entities: Dict[str, Counter] = {label: Counter() for label in ENTITY_LABELS}
+
+    def add(self, analysis: Dict[str, Any]) -> bool:
+        """Count one analyzed message; returns whether it is a lead"""
+        self.messages += 1
+        self.primary_intent[analysis["primary_intent"]] += 1
+        self.intents.update(analysis["intents"].keys())
+        self.conversation_stage[analysis["conversation_stage"]] += 1
+        entities = analysis["entities"]
+        for label in ("project_type", "location", "urgency"):
+            if label in entities:
+                self.entities[label][entities[label]] += 1
+        self.entities["services_mentioned"].update(entities.get("services_mentioned", ()))
+        if "budget_range" in entities:
+            self.budget_mentions += 1
+        lead = is_lead(analysis)
+        if lead:
+            self.leads += 1
+        return lead
+
+    def merge(self, other: "BatchCounts") -> None:
+        self.messages += other.messages
+        self.skipped += other.skipped
+        self.invalid += other.invalid
+        self.leads += other.leads
+        self.budget_mentions += other.budget_mentions
+        self.primary_intent.update(other.primary_intent)
+        self.intents.update(other.intents)
+        self.conversation_stage.update(other.conversation_stage)
+        for label, counts in other.entities.items():
+            self.entities[label].update(counts)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "skipped": self.skipped,
+            "invalid": self.invalid,
+            "leads": self.leads,
+            "budget_mentions": self.budget_mentions,
+            "primary_intent": dict(self.primary_intent.most_common()),
+            "intents": dict(self.intents.most_common()),
+            "conversation_stage": dict(self.conversation_stage.most_common()),
+            "entities": {label: dict(counts.most_common()) for label, counts in self.entities.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BatchCounts":
+        counts = cls()
+        for field in ("messages", "skipped", "invalid", "leads", "budget_mentions"):
+            setattr(counts, field, data[field])
+        for field in ("primary_intent", "intents", "conversation_stage"):
+            getattr(counts, field).update(data[field])
+        for label, values in data["entities"].items():
+            counts.entities[label].update(values)
+        return counts
+
+
+def analyze_chunk(lines: List[bytes], offset: int, results: bool = False,
+                  leads_only: bool = False) -> Tuple[BatchCounts, bytes]:
+    """Counts for a chunk of JSONL lines starting at byte offset, plus one JSONL result per message when asked
+
+    Runs in the worker processes. Each result carries the byte offset of
+    its input line and whether the message is a lead.
+    """
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = ConversationAnalyzer()
+    counts = BatchCounts()
+    output: List[bytes] = []
+    for line in lines:
+        line_offset = offset
+        offset += len(line)
+        if isinstance(line, OverlongLine):
+            counts.invalid += 1
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+            if record.get("role", "user") != "user":
+                counts.skipped += 1
+                continue
+            message = record.get("message", record.get("content"))
+            message_count = int(record.get("message_count") or 0)
+        except (orjson.JSONDecodeError, AttributeError, TypeError, ValueError):
+            counts.invalid += 1
+            continue
+        if not isinstance(message, str) or not message.strip():
+            counts.skipped += 1
+            continue
+        analysis = _analyzer.analyze_message(message, message_count)
+        lead = counts.add(analysis)
+        if results and (lead or not leads_only):
+            output.append(orjson.dumps(
+                {"offset": line_offset, "conversation_id": record.get("conversation_id"), "lead": lead, **analysis}
+            ))
+    return counts, b"".join(line + b"\n" for line in output)
+
+
+async def read_chunks(handle: BinaryIO, offset: int = 0,
+                      chunk_lines: int = CHUNK_LINES) -> AsyncIterator[Tuple[int, List[bytes]]]:
+    """(byte offset, lines) chunks of a binary file positioned at offset"""
+    while True:
+        lines = list(itertools.islice(handle, chunk_lines))
+        if not lines:
+            return
+        yield offset, lines
+        offset += sum(map(len, lines))
+
+
+async def split_chunks(stream: AsyncIterator[bytes], offset: int = 0, chunk_lines: int = CHUNK_LINES,
+                       max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[Tuple[int, List[bytes]]]:
+    """(byte offset, lines) chunks of a byte stream such as a request body
+
+    A line longer than max_line_bytes is dropped as it arrives and given
+    to the chunk as an OverlongLine, which analyze_chunk counts as invalid.
+    """
+    lines: List[bytes] = []
+    partial = b""
+    dropped = 0
+    async for data in stream:
+        complete: List[Any] = []
+        if dropped:
+            newline = data.find(b"\n")
+            if newline < 0:
+                dropped += len(data)
+                continue
+            complete.append(OverlongLine(dropped + newline + 1))
+            dropped = 0
+            data = data[newline + 1:]
+        parts = (partial + data).split(b"\n")
+        partial = parts.pop()
+        if len(partial) > max_line_bytes:
+            dropped, partial = len(partial), b""
+        complete.extend(part + b"\n" if len(part) <= max_line_bytes else OverlongLine(len(part) + 1) for part in parts)
+        for line in complete:
+            lines.append(line)
+            if len(lines) >= chunk_lines:
+                yield offset, lines
+                offset += sum(map(len, lines))
+                lines = []
+    if dropped:
+        lines.append(OverlongLine(dropped))
+    elif partial:
+        lines.append(partial)
+    if lines:
+        yield offset, lines
+
+
+async def analyze_chunks(chunks: AsyncIterator[Tuple[int, List[bytes]]], executor: Executor, in_flight: int,
+                         results: bool = False, leads_only: bool = False
+                         ) -> AsyncIterator[Tuple[int, BatchCounts, bytes]]:
+    """(end offset, counts, results) per chunk, in input order, with at most in_flight chunks on the executor"""
+    loop = asyncio.get_event_loop()
+    pending: Deque[Tuple[int, "asyncio.Future"]] = deque()
+    try:
+        async for offset, lines in chunks:
+            end = offset + sum(map(len, lines))
+            pending.append((end, loop.run_in_executor(executor, analyze_chunk, lines, offset, results, leads_only)))
+            if len(pending) >= in_flight:
+                end, future = pending.popleft()
+                yield (end,) + await future
+        while pending:
+            end, future = pending.popleft()
+            yield (end,) + await future
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def _save_state(path: str, state: Dict[str, Any]) -> None:
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(state, handle)
+    os.replace(temporary, path)
+
+
+async def _run_file(path: str, workers: int, chunk_lines: int, output: Optional[str], leads_only: bool,
+                    state_path: Optional[str], progress_interval: float) -> Dict[str, Any]:
+    state = {"input": os.path.abspath(path), "offset": 0, "output_size": 0, "counts": None}
+    if state_path and os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as handle:
+            state = json.load(handle)
+        if state["input"] != os.path.abspath(path):
+            raise ValueError(f"{state_path} belongs to a run over {state['input']}")
+    counts = BatchCounts.from_dict(state["counts"]) if state["counts"] else BatchCounts()
+    start_offset = state["offset"]
+    size = os.path.getsize(path)
+
+    results = None
+    if output:
+        results = open(output, "ab")
+        # Drop results written after the last checkpoint; their chunk is analyzed again
+        results.truncate(state["output_size"])
+
+    started = time.monotonic()
+    last_report = started
+    try:
+        with ProcessPoolExecutor(workers) as executor, open(path, "rb") as handle:
+            handle.seek(start_offset)
+            chunks = read_chunks(handle, start_offset, chunk_lines)
+            async for end, chunk_counts, chunk_results in analyze_chunks(
+                chunks, executor, workers * 2, results is not None, leads_only
+            ):
+                counts.merge(chunk_counts)
+                if results is not None:
+                    results.write(chunk_results)
+                    results.flush()
+                state.update(offset=end, output_size=results.tell() if results is not None else 0,
+                             counts=counts.as_dict())
+                if state_path:
+                    _save_state(state_path, state)
+                now = time.monotonic()
+                if progress_interval and now - last_report >= progress_interval:
+                    last_report = now
+                    rate = (end - start_offset) / (now - started) / 1e6
+                    print(f"{end / max(size, 1):6.1%} {counts.messages} messages, {rate:.1f} MB/s", file=sys.stderr)
+    finally:
+        if results is not None:
+            results.close()
+
+    elapsed = time.monotonic() - started
+    return {
+        "input": path,
+        "offset": state["offset"],
+        "resumed_from": start_offset,
+        "seconds": round(elapsed, 3),
+        "bytes_per_second": round((state["offset"] - start_offset) / elapsed) if elapsed else 0,
+        "counts": counts.as_dict(),
+    }
+
+
+def run_file(path: str, workers: int = 2, chunk_lines: int = CHUNK_LINES, output: Optional[str] = None,
+             leads_only: bool = False, state_path: Optional[str] = None, progress_interval: float = 0.0) -> Dict[str, Any]:
+    """Analyze a JSONL file, resuming from state_path when it exists; returns the summary"""
+    return asyncio.run(_run_file(path, workers, chunk_lines, output, leads_only, state_path, progress_interval))
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of chat messages")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES)
+    parser.add_argument("--output", help="Write one JSONL analysis per message here")
+    parser.add_argument("--leads-only", action="store_true", help="Only write results for leads")
+    parser.add_argument("--state", help="Checkpoint file; an existing one resumes the run")
+    parser.add_argument("--progress", type=float, default=5.0, help="Seconds between progress lines (0: none)")
+    args = parser.parse_args(argv)
+
+    summary = run_file(args.input, args.workers, args.chunk_lines, args.output, args.leads_only,
+                       args.state, args.progress)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import asyncio
+import glob
+import hashlib
+import hmac
+import logging
+import os
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+
+
+def hash_conversation(salt: bytes, conversation_id: str) -> str:
+    """Keyed hash that stands in for a conversation id in captures and analytics"""
+    return hmac.new(salt, conversation_id.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def _mask_phone(match: "re.Match") -> str:
+    # Budgets ("1500000 AED") are shorter than phone numbers, and worth keeping
+    return "<phone>" if sum(char.isdigit() for char in match.group()) >= 9 else match.group()
+
+
+def anonymize(text: str) -> str:
+    """text with e-mail addresses and phone numbers masked (names and street addresses are kept)"""
+    return _PHONE.sub(_mask_phone, _EMAIL.sub("<email>", text))
+
+
+class TrafficCapture:
+    """Appends anonymized records of chat turns to rotating JSONL segment files
+
+    record() only queues the record, so it never blocks the event loop; a
+    background task hands queued records to a worker thread in batches, at
+    least every ``flush_interval`` seconds. While ``max_queue`` records are
+    waiting, new ones are dropped and counted. A segment is closed once it
+    reaches ``segment_bytes``, and only the newest ``max_segments`` are kept,
+    counting the segments already in the directory when capture starts.
+    Conversation ids are replaced by a keyed hash (stable across restarts
+    when ``salt`` is set). Only e-mail addresses and phone numbers in
+    messages are masked: names, street addresses and anything else a user
+    types are kept, so captures must be handled as personal data.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_segments: int = 20,
+        salt: Optional[str] = None,
+        max_queue: int = 10000,
+        flush_interval: float = 1.0,
+        enabled: bool = False,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self._salt = salt.encode() if salt else os.urandom(16)
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._task: Optional["asyncio.Task"] = None
+        self._writing: Optional["asyncio.Future"] = None
+        self._file = None
+        self._segment_size = 0
+        self._segments: Deque[str] = deque()
+        self._sequence = 0
+
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.errors = 0
+
+    def conversation_hash(self, conversation_id: str) -> str:
+        return hash_conversation(self._salt, conversation_id)
+
+    def record(self, endpoint: str, conversation_id: str, message: str, seconds: float, **fields: Any) -> None:
+        """Queue a record of a turn that took seconds to serve and has just finished"""
+        if not self.enabled:
+            return
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append({
+            "ts": round(time.time() - seconds, 6),
+            "endpoint": endpoint,
+            "conversation": self.conversation_hash(conversation_id),
+            "message": anonymize(message),
+            "seconds": round(seconds, 6),
+            **fields,
+        })
+
+    async def start(self) -> None:
+        """Begin writing in the background (called from the app lifespan)"""
+        if self.enabled and self._task is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Segments left by earlier runs count towards max_segments, oldest first
+            existing = glob.glob(os.path.join(self.directory, "capture-*.jsonl"))
+            self._segments.extend(sorted(existing, key=lambda path: (os.path.getmtime(path), path)))
+            self._prune()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            # Let a batch already handed to the thread finish, then write what is still queued
+            if self._writing is not None:
+                await asyncio.gather(self._writing, return_exceptions=True)
+            await self._flush()
+            await asyncio.get_event_loop().run_in_executor(None, self._close_segment)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._queue:
+            return
+        records = list(self._queue)
+        self._queue.clear()
+        self._writing = asyncio.get_event_loop().run_in_executor(None, self._write, records)
+        try:
+            # Shielded: cancelling the writer task must not let a second batch write concurrently
+            await asyncio.shield(self._writing)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Could not write {len(records)} capture records: {e}")
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        data = b"".join(orjson.dumps(record) + b"\n" for record in records)
+        if self._file is None:
+            self._open_segment()
+        self._file.write(data)
+        self._file.flush()
+        self._segment_size += len(data)
+        self.bytes_written += len(data)
+        self.records += len(records)
+        if self._segment_size >= self.segment_bytes:
+            self._close_segment()
+
+    def _open_segment(self) -> None:
+        self._sequence += 1
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}.jsonl"
+        path = os.path.join(self.directory, name)
+        self._file = open(path, "ab")
+        self._segment_size = 0
+        self._segments.append(path)
+        self._prune()
+
+    def _prune(self) -> None:
+        while len(self._segments) > self.max_segments:
+            try:
+                os.remove(self._segments.popleft())
+            except OSError:
+                pass
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "records": self.records,
+            "queued": len(self._queue),
+            "dropped": self.dropped,
+            "bytes_written": self.bytes_written,
+            "segments": len(self._segments),
+            "errors": self.errors,
+        }
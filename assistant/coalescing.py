@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Hash of everything that determines an upstream generation (model, prompt, options, ...)"""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs one upstream call per key and shares its result with every concurrent caller"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.upstream_calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # Shielded so one caller going away does not cancel the call for the others
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls": self.upstream_calls,
+            "upstream_calls_saved": self.coalesced,
+        }
+
+
+class _Broadcast(Generic[T]):
+    """One upstream stream, buffered so late subscribers replay what they missed"""
+
+    def __init__(self, source: AsyncIterator[T]):
+        self.items: List[T] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[T]) -> None:
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            self.done = True
+            self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def iterate(self) -> AsyncIterator[T]:
+        index = 0
+        while True:
+            if index < len(self.items):
+                yield self.items[index]
+                index += 1
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class StreamFanout:
+    """Shares one upstream token stream between identical concurrent streaming requests"""
+
+    def __init__(self):
+        self._streams: Dict[str, _Broadcast] = {}
+        self.upstream_streams = 0
+        self.coalesced = 0
+
+    async def subscribe(self, key: str, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast(factory())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(key, broadcast))
+            self.upstream_streams += 1
+        else:
+            self.coalesced += 1
+
+        broadcast.subscribers += 1
+        try:
+            async for item in broadcast.iterate():
+                yield item
+        finally:
+            broadcast.subscribers -= 1
+            # Stop generating once nobody is listening any more
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                broadcast.task.cancel()
+                self._forget(key, broadcast)
+
+    def _forget(self, key: str, broadcast: _Broadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._streams),
+            "subscribers": sum(broadcast.subscribers for broadcast in self._streams.values()),
+            "upstream_streams": self.upstream_streams,
+            "upstream_streams_saved": self.coalesced,
+        }
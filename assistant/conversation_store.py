@@ -0,0 +1,379 @@
+import logging
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from assistant.messages import Message, decode_message, decode_messages, encode_message, encode_messages
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_OVERHEAD = sys.getsizeof(Message("user", "", 0.0)) + sys.getsizeof(0.0) + sys.getsizeof("")
+
+
+def estimate_message_size(message: Message) -> int:
+    """Rough in-memory footprint of one history message, in bytes"""
+    return _MESSAGE_OVERHEAD + len(message.content)
+
+
+class ConversationStore:
+    """Bounded storage for per-conversation message history"""
+
+    backend = "base"
+
+    def __init__(
+        self,
+        max_conversations: int = 10000,
+        max_messages: int = 20,
+        ttl_seconds: float = 3600.0,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    async def get(self, conversation_id: str) -> List[Message]:
+        """Return a copy of the conversation history (empty if unknown or expired)"""
+        return (await self.get_numbered(conversation_id))[1]
+
+    async def get_numbered(self, conversation_id: str) -> Tuple[int, List[Message]]:
+        """The history plus the sequence number of its first message
+
+        Messages are numbered from 0 in the order they were appended, so
+        numbers stay stable while older messages are trimmed away.
+        """
+        raise NotImplementedError
+
+    async def page(self, conversation_id: str, cursor: Optional[int] = None,
+                   limit: int = 50) -> Tuple[List[Message], Optional[int]]:
+        """Up to limit messages from sequence number cursor on, and the cursor of the next page (None at the end)"""
+        if limit < 1 or (cursor is not None and cursor < 0):
+            raise ValueError(f"Invalid page (cursor={cursor}, limit={limit})")
+        first, history = await self.get_numbered(conversation_id)
+        start = 0 if cursor is None else max(cursor - first, 0)
+        messages = history[start:start + limit]
+        return messages, (first + start + limit if start + limit < len(history) else None)
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> List[Message]:
+        """Append messages, trim to max_messages and return the resulting history"""
+        raise NotImplementedError
+
+    async def delete(self, conversation_id: str) -> bool:
+        raise NotImplementedError
+
+    async def count(self) -> int:
+        raise NotImplementedError
+
+    async def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def _limits(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "max_conversations": self.max_conversations,
+            "max_messages": self.max_messages,
+            "ttl_seconds": self.ttl_seconds,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class _Entry:
+    __slots__ = ("messages", "packed", "size", "last_access", "appended")
+
+    def __init__(self):
+        self.messages: Optional[List[Message]] = []
+        # zlib-compressed history while the conversation is idle (messages is None then)
+        self.packed: Optional[bytes] = None
+        self.size = 0
+        self.last_access = 0.0
+        self.appended = 0
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Per-process store with LRU ordering, idle TTL and a memory cap
+
+    With ``compress_after`` set, conversations idle for that many seconds
+    are zlib-compressed and expanded again on their next access.
+    """
+
+    backend = "memory"
+
+    def __init__(self, *args, compress_after: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compress_after = compress_after
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Uncompressed conversations in access order, so idle ones are found at the front
+        self._expanded: "OrderedDict[str, None]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._compressed = 0
+        self._evictions = {"ttl": 0, "max_conversations": 0, "max_bytes": 0}
+
+    def _drop(self, conversation_id: str, reason: Optional[str] = None) -> None:
+        entry = self._entries.pop(conversation_id)
+        self._expanded.pop(conversation_id, None)
+        self._bytes -= entry.size
+        if reason:
+            self._evictions[reason] += 1
+
+    def _resize(self, entry: _Entry) -> None:
+        if entry.packed is not None:
+            new_size = _MESSAGE_OVERHEAD + sys.getsizeof(entry.packed)
+        else:
+            new_size = sum(estimate_message_size(message) for message in entry.messages)
+        self._bytes += new_size - entry.size
+        entry.size = new_size
+
+    def _expand(self, conversation_id: str, entry: _Entry) -> List[Message]:
+        if entry.packed is not None:
+            entry.messages = decode_messages(zlib.decompress(entry.packed))
+            entry.packed = None
+            self._compressed -= 1
+            self._resize(entry)
+        if self.compress_after is not None:
+            self._expanded[conversation_id] = None
+            self._expanded.move_to_end(conversation_id)
+        return entry.messages
+
+    def _compress_idle(self, now: float) -> None:
+        if self.compress_after is None:
+            return
+        deadline = now - self.compress_after
+        while self._expanded:
+            conversation_id = next(iter(self._expanded))
+            entry = self._entries[conversation_id]
+            if entry.last_access > deadline:
+                break
+            del self._expanded[conversation_id]
+            entry.packed = zlib.compress(encode_messages(entry.messages))
+            entry.messages = None
+            self._compressed += 1
+            self._resize(entry)
+
+    def _expire(self, now: float) -> None:
+        # Entries are kept in access order, so expired ones are always at the front
+        deadline = now - self.ttl_seconds
+        while self._entries:
+            conversation_id, entry = next(iter(self._entries.items()))
+            if entry.last_access > deadline:
+                break
+            self._drop(conversation_id, "ttl")
+
+    def _enforce_limits(self) -> None:
+        while len(self._entries) > self.max_conversations:
+            self._drop(next(iter(self._entries)), "max_conversations")
+        # Never evict the most recently used conversation for size alone
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)), "max_bytes")
+
+    async def get_numbered(self, conversation_id: str) -> Tuple[int, List[Message]]:
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            self._misses += 1
+            self._compress_idle(now)
+            return 0, []
+        self._hits += 1
+        entry.last_access = now
+        self._entries.move_to_end(conversation_id)
+        messages = self._expand(conversation_id, entry)
+        self._compress_idle(now)
+        return entry.appended - len(messages), list(messages)
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> List[Message]:
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            entry = self._entries[conversation_id] = _Entry()
+        else:
+            self._entries.move_to_end(conversation_id)
+        entry.last_access = now
+
+        history = self._expand(conversation_id, entry)
+        history.extend(messages)
+        entry.appended += len(messages)
+        if len(history) > self.max_messages:
+            del history[:-self.max_messages]
+        self._resize(entry)
+
+        self._compress_idle(now)
+        self._enforce_limits()
+        return list(history)
+
+    async def delete(self, conversation_id: str) -> bool:
+        if conversation_id not in self._entries:
+            return False
+        self._drop(conversation_id)
+        return True
+
+    async def count(self) -> int:
+        self._expire(time.monotonic())
+        return len(self._entries)
+
+    async def stats(self) -> Dict[str, Any]:
+        stats = self._limits()
+        stats.update({
+            "conversations": await self.count(),
+            "bytes": self._bytes,
+            "compressed": self._compressed,
+            "compress_after": self.compress_after,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": dict(self._evictions),
+        })
+        return stats
+
+
+class RedisConversationStore(ConversationStore):
+    """Store shared between workers, backed by Redis or any redis.asyncio-compatible client
+
+    Each conversation is a Redis list with its own idle TTL. A sorted set of
+    last-access times and a hash of per-conversation sizes are used to enforce
+    the conversation and memory caps across all workers; the accounting is
+    approximate under concurrent writers.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, *args, key_prefix: str = "shiraji:chat", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = client
+        self.key_prefix = key_prefix
+        self._index_key = f"{key_prefix}:index"
+        self._sizes_key = f"{key_prefix}:sizes"
+        self._bytes_key = f"{key_prefix}:bytes"
+        self._stats_key = f"{key_prefix}:stats"
+        self._appended_key = f"{key_prefix}:appended"
+
+    @classmethod
+    def from_url(cls, url: str, *args, **kwargs) -> "RedisConversationStore":
+        """Connect to ``redis://`` URLs, or to an in-process stand-in with ``fakeredis://``"""
+        if url.startswith("fakeredis://"):
+            import fakeredis.aioredis
+            client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        else:
+            import redis.asyncio
+            client = redis.asyncio.from_url(url, decode_responses=True)
+        return cls(client, *args, **kwargs)
+
+    def _key(self, conversation_id: str) -> str:
+        return f"{self.key_prefix}:conv:{conversation_id}"
+
+    async def get_numbered(self, conversation_id: str) -> Tuple[int, List[Message]]:
+        key = self._key(conversation_id)
+        pipe = self.client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, int(self.ttl_seconds))
+        pipe.hget(self._appended_key, conversation_id)
+        raw_messages, exists, appended = await pipe.execute()
+        if not exists:
+            await self.client.hincrby(self._stats_key, "misses", 1)
+            return 0, []
+        pipe = self.client.pipeline()
+        pipe.zadd(self._index_key, {conversation_id: time.time()})
+        pipe.hincrby(self._stats_key, "hits", 1)
+        await pipe.execute()
+        history = [decode_message(raw) for raw in raw_messages]
+        return max(int(appended or 0) - len(history), 0), history
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> List[Message]:
+        key = self._key(conversation_id)
+        pipe = self.client.pipeline()
+        pipe.hget(self._sizes_key, conversation_id)
+        pipe.rpush(key, *[encode_message(message) for message in messages])
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, int(self.ttl_seconds))
+        pipe.zadd(self._index_key, {conversation_id: time.time()})
+        pipe.hincrby(self._appended_key, conversation_id, len(messages))
+        old_size, _, _, raw_messages, _, _, _ = await pipe.execute()
+
+        history = [decode_message(raw) for raw in raw_messages]
+        new_size = sum(estimate_message_size(message) for message in history)
+        pipe = self.client.pipeline()
+        pipe.hset(self._sizes_key, conversation_id, new_size)
+        pipe.incrby(self._bytes_key, new_size - int(old_size or 0))
+        await pipe.execute()
+
+        await self._enforce_limits(protect=conversation_id)
+        return history
+
+    async def _forget(self, conversation_ids: List[str], reason: Optional[str] = None) -> None:
+        if not conversation_ids:
+            return
+        sizes = await self.client.hmget(self._sizes_key, conversation_ids)
+        pipe = self.client.pipeline()
+        pipe.delete(*[self._key(conversation_id) for conversation_id in conversation_ids])
+        pipe.zrem(self._index_key, *conversation_ids)
+        pipe.hdel(self._sizes_key, *conversation_ids)
+        pipe.hdel(self._appended_key, *conversation_ids)
+        pipe.decrby(self._bytes_key, sum(int(size or 0) for size in sizes))
+        if reason:
+            pipe.hincrby(self._stats_key, f"evictions_{reason}", len(conversation_ids))
+        await pipe.execute()
+
+    async def _expire(self) -> None:
+        # The list keys expire on their own; drop their index and size entries too
+        deadline = time.time() - self.ttl_seconds
+        expired = await self.client.zrangebyscore(self._index_key, "-inf", deadline)
+        await self._forget(expired, "ttl")
+
+    async def _enforce_limits(self, protect: str) -> None:
+        await self._expire()
+        excess = await self.client.zcard(self._index_key) - self.max_conversations
+        if excess > 0:
+            oldest = await self.client.zrange(self._index_key, 0, excess - 1)
+            await self._forget([cid for cid in oldest if cid != protect], "max_conversations")
+        while int(await self.client.get(self._bytes_key) or 0) > self.max_bytes:
+            oldest = await self.client.zrange(self._index_key, 0, 0)
+            if not oldest or oldest[0] == protect:
+                break
+            await self._forget(oldest, "max_bytes")
+
+    async def delete(self, conversation_id: str) -> bool:
+        existed = await self.client.exists(self._key(conversation_id))
+        await self._forget([conversation_id])
+        return bool(existed)
+
+    async def count(self) -> int:
+        await self._expire()
+        return await self.client.zcard(self._index_key)
+
+    async def stats(self) -> Dict[str, Any]:
+        counters = await self.client.hgetall(self._stats_key)
+        stats = self._limits()
+        stats.update({
+            "conversations": await self.count(),
+            "bytes": int(await self.client.get(self._bytes_key) or 0),
+            "hits": int(counters.get("hits", 0)),
+            "misses": int(counters.get("misses", 0)),
+            "evictions": {
+                reason: int(counters.get(f"evictions_{reason}", 0))
+                for reason in ("ttl", "max_conversations", "max_bytes")
+            },
+        })
+        return stats
+
+    async def close(self) -> None:
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
+
+
+def create_conversation_store(backend: str = "memory", redis_url: Optional[str] = None,
+                              compress_after: Optional[float] = None, **limits) -> ConversationStore:
+    """Build the configured store backend ('memory' or 'redis'); compress_after applies to the memory store"""
+    if backend == "memory":
+        return InMemoryConversationStore(compress_after=compress_after, **limits)
+    if backend == "redis":
+        if not redis_url:
+            raise ValueError("The redis conversation store requires REDIS_URL")
+        return RedisConversationStore.from_url(redis_url, **limits)
+    raise ValueError(f"Unknown conversation store backend: {backend}")
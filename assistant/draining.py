@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class Drainer:
+    """Winds a worker down before a deploy stops it
+
+    Once begin() has been called the worker reports itself not ready, and
+    long-lived connections (WebSockets) close once their turns are done, so
+    clients reconnect to the replacement. wait_idle() waits, up to a
+    deadline, until the in-flight count it is given reaches zero.
+    """
+
+    def __init__(self, timeout: float = 60.0, poll_interval: float = 0.1):
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.started_at: Optional[float] = None
+        self._event: Optional[asyncio.Event] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.started_at is not None
+
+    def _started(self) -> asyncio.Event:
+        if self._event is None:
+            self._event = asyncio.Event()
+            if self.draining:
+                self._event.set()
+        return self._event
+
+    def begin(self) -> bool:
+        """Start draining; False when already draining"""
+        if self.draining:
+            return False
+        self.started_at = time.monotonic()
+        self._started().set()
+        return True
+
+    async def wait_started(self) -> None:
+        await self._started().wait()
+
+    async def wait_idle(self, in_flight: Callable[[], int], timeout: Optional[float] = None) -> bool:
+        """True once in_flight() is zero, False if the deadline passes first"""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while in_flight() > 0:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.poll_interval)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "draining": self.draining,
+            "seconds": round(time.monotonic() - self.started_at, 3) if self.draining else None,
+            "timeout": self.timeout,
+        }
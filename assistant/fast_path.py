@@ -0,0 +1,139 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from assistant.analyzer import PROJECT_TYPE_KEYWORDS, SERVICE_KEYWORDS, KeywordMatcher
+
+# Company facts a message can ask for, in the order they are answered. Only
+# phrases that name the fact itself: words like "number", "offer" or
+# "office" also turn up in questions about something else.
+FACT_KEYWORDS = {
+    "phone": ["phone", "phone number", "telephone", "mobile", "mobile number", "whatsapp", "whatsapp number",
+              "contact number", "call you"],
+    "email": ["email", "e-mail", "email address"],
+    "location": ["where are you", "where is your", "where is your office", "your office", "address", "location",
+                 "located", "find you"],
+    "services": ["services", "what do you do", "what do you offer", "what do you provide"],
+}
+
+# Messages must ask for the fact directly ("What's your email?", "Phone number please"),
+# not as a yes/no question about something else ("Do you have an office in Dubai?")
+DIRECT_QUESTION = re.compile(
+    r"^(?:(?:hi|hello|hey)\b\W*)?"
+    r"(?:what|what's|whats|where|where's|wheres|how (?:can|do) i|(?:can|could|may) i"
+    r"|(?:can|could) you (?:give|send|share|tell)|please|give me|send me|tell me|your|the"
+    r"|phone|telephone|mobile|whatsapp|contact|email|e-mail|address|location|services)\b"
+)
+
+# Words a direct question is built from, besides the fact it asks for
+QUESTION_WORDS = frozenset("""
+    hi hello hey please thanks thank what what's whats where where's wheres how is are your you our the a an me i
+    my can could may do does give send share tell get have know reach contact offer provide it us to of for at on and or
+""".split())
+
+# The fact has to be the company's ("your email", "where are you"), not the user's ("my site
+# address", "email me"), nor belong to a project ("the address of the site", "location for the pool")
+COMPANY_WORDS = frozenset(("you", "your", "yours", "company"))
+USER_WORDS = frozenset(("my", "mine", "our"))
+PROJECT_NOUNS = ["site", "plot", "land", "property", "project", "pool", "garden", "kitchen", "bathroom",
+                 "room", "building", "apartment", "flat", "warehouse", "job", "work"]
+
+FACT_TEMPLATES = {
+    "phone": "📞 You can call or WhatsApp us on {phone}.",
+    "email": "📧 You can email us at {email}.",
+    "location": "📍 Our office is in {location}.",
+    "services": "🏗️ {name} offers: {services}.",
+}
+
+FOLLOW_UP = "Is there a project I can help you plan?"
+
+# Intents that only ever need company facts; anything else goes to the model
+ANSWERABLE_INTENTS = ("general", "general_info", "contact_request", "service_question")
+
+
+class FastPathResponder:
+    """Answers simple company-fact questions from templates, without calling the model
+
+    A message is a candidate only when it asks for a fact directly. Its
+    confidence is the share of its words taken up by the fact phrases and
+    the question around them ("what is your", "please"), so any project
+    detail, place or other request in the message lowers it. The fact must
+    be the company's: messages naming the user's own things ("my", "email
+    me") or a project or service noun score zero. Messages scoring
+    ``threshold`` or less go to the model as usual.
+    """
+
+    def __init__(self, company_context: Dict[str, Any], threshold: float = 0.75, enabled: bool = True):
+        self.company_context = company_context
+        self.threshold = threshold
+        self.enabled = enabled
+        self.matcher = KeywordMatcher({"facts": FACT_KEYWORDS})
+        fact_words = sorted((word for words in FACT_KEYWORDS.values() for word in words), key=len, reverse=True)
+        self._fact_words = re.compile(r"\b(?:" + "|".join(re.escape(word) for word in fact_words) + r")\w*")
+        self._fact_then_me = re.compile(self._fact_words.pattern + r" me\b")
+        self.projects = KeywordMatcher({
+            "project_type": PROJECT_TYPE_KEYWORDS,
+            "services": SERVICE_KEYWORDS,
+            "nouns": {"project": PROJECT_NOUNS},
+        })
+        self._company_words = COMPANY_WORDS | frozenset(company_context.get("name", "").lower().split())
+
+        self.answered = 0
+        self.low_confidence = 0
+        self.no_match = 0
+
+    def confidence(self, message: str, analysis: Dict[str, Any]) -> float:
+        if analysis.get("primary_intent", "general") not in ANSWERABLE_INTENTS:
+            return 0.0
+        text = " ".join(re.findall(r"[\w'@.+-]+", message.lower().replace("\u2019", "'"))).strip(" .")
+        if not DIRECT_QUESTION.match(text):
+            return 0.0
+        words = text.split()
+        rest = self._fact_words.sub(" ", text).split()
+        if not words or len(rest) == len(words):
+            return 0.0
+        if self._company_words.isdisjoint(words) or not USER_WORDS.isdisjoint(words) or self._fact_then_me.search(text):
+            return 0.0
+        # Words naming the fact ("office", "services") are not project details
+        if any(self.projects.scan(" ".join(rest)).values()):
+            return 0.0
+        uncovered = sum(word.strip(".") not in QUESTION_WORDS for word in rest)
+        return 1.0 - uncovered / len(words)
+
+    def can_answer(self, message: str, analysis: Dict[str, Any]) -> bool:
+        """Whether answer() would reply, without counting it in the stats"""
+        return (self.enabled and bool(self.matcher.scan(message)["facts"])
+                and self.confidence(message, analysis) > self.threshold)
+
+    def answer(self, message: str, analysis: Dict[str, Any]) -> Optional[str]:
+        """Templated reply, or None when the model should answer"""
+        if not self.enabled:
+            return None
+        facts = self.matcher.scan(message)["facts"]
+        if not facts:
+            self.no_match += 1
+            return None
+        if self.confidence(message, analysis) <= self.threshold:
+            self.low_confidence += 1
+            return None
+
+        context = self.company_context
+        values = {
+            "name": context["name"],
+            "phone": context["phone"],
+            "email": context["email"],
+            "location": context["location"],
+            "services": ", ".join(context["services"]),
+        }
+        lines: List[str] = [FACT_TEMPLATES[fact].format(**values) for fact in FACT_KEYWORDS if fact in facts]
+        lines.append(FOLLOW_UP)
+        self.answered += 1
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "llm_skipped": self.answered,
+            "low_confidence": self.low_confidence,
+            "no_match": self.no_match,
+        }
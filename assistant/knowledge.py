@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Redis keys written by core/knowledge.py in the Django site
+DEFAULT_KEY_PREFIX = "shiraji:knowledge"
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from has have how i if in is it its me my no not of on or our
+so than that the their them then there these they this to us was we were what when where which who why will with would
+you your yours please hi hello thanks thank
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words without stopwords, with a plural "s" stripped (villas -> villa)"""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class Document:
+    """One indexed row: a service, project, job or testimonial"""
+
+    __slots__ = ("doc_id", "kind", "title", "text")
+
+    def __init__(self, doc_id: str, kind: str, title: str, text: str):
+        self.doc_id = doc_id
+        self.kind = kind
+        self.title = title
+        self.text = text
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Document":
+        return cls(str(data["id"]), data.get("kind", ""), data.get("title", ""), data.get("text", ""))
+
+
+class BM25Index:
+    """In-memory BM25 index with array-backed postings and incremental updates
+
+    Each term maps to two parallel arrays (document slots and term counts),
+    so the index stays compact and a lookup scores each query term's
+    postings in one vectorised step over numpy views of those arrays.
+    Upserting or removing a document only touches the postings of its own
+    terms; freed slots are reused.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._clear()
+        # Bumped on every change, so caches built on the index can tell it has moved on
+        self.version = 0
+
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    def _clear(self) -> None:
+        self._slots: Dict[str, int] = {}
+        self._docs: List[Optional[Document]] = []
+        self._doc_terms: List[Tuple[str, ...]] = []
+        self._lengths = array("I")
+        self._free: List[int] = []
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def upsert(self, document: Document) -> None:
+        self.remove(document.doc_id)
+        # The title counts twice, so a document named after the query ranks above passing mentions
+        terms = tokenize(f"{document.title} {document.title} {document.text}")
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+
+        if self._free:
+            slot = self._free.pop()
+            self._docs[slot] = document
+            self._doc_terms[slot] = tuple(counts)
+            self._lengths[slot] = len(terms)
+        else:
+            slot = len(self._docs)
+            self._docs.append(document)
+            self._doc_terms.append(tuple(counts))
+            self._lengths.append(len(terms))
+        self._slots[document.doc_id] = slot
+        self._total_length += len(terms)
+
+        for term, count in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("H"))
+            postings[0].append(slot)
+            postings[1].append(min(count, 0xFFFF))
+        self.version += 1
+
+    def remove(self, doc_id: str) -> bool:
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return False
+        for term in self._doc_terms[slot]:
+            slots, counts = self._postings[term]
+            index = slots.index(slot)
+            if len(slots) == 1:
+                del self._postings[term]
+            else:
+                del slots[index]
+                del counts[index]
+        self._total_length -= self._lengths[slot]
+        self._docs[slot] = None
+        self._doc_terms[slot] = ()
+        self._lengths[slot] = 0
+        self._free.append(slot)
+        self.version += 1
+        return True
+
+    def replace_all(self, documents: Iterable[Document]) -> None:
+        """Rebuild from a full snapshot"""
+        self._clear()
+        for document in documents:
+            self.upsert(document)
+        self.version += 1
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """The k best-scoring documents for query, best first"""
+        started = time.perf_counter()
+        documents = len(self._slots)
+        results: List[Tuple[Document, float]] = []
+        postings = [self._postings[term] for term in set(tokenize(query)) if term in self._postings]
+        if postings and k > 0:
+            k1, b = self.k1, self.b
+            average_length = self._total_length / documents or 1.0
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            scores = np.zeros(len(lengths))
+            for slots, counts in postings:
+                slots = np.frombuffer(slots, dtype=np.uint32)
+                counts = np.frombuffer(counts, dtype=np.uint16).astype(np.float64)
+                idf = math.log(1.0 + (documents - len(slots) + 0.5) / (len(slots) + 0.5))
+                norms = k1 * (1.0 - b + b * lengths[slots] / average_length)
+                # A term appears once in a posting list, so the slots are distinct
+                scores[slots] += idf * counts * (k1 + 1.0) / (counts + norms)
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(scores[candidates], -k)[-k:]]
+            best = candidates[np.argsort(scores[candidates])[::-1]]
+            results = [(self._docs[slot], float(scores[slot])) for slot in best]
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._slots),
+            "terms": len(self._postings),
+            "postings": sum(len(slots) for slots, _ in self._postings.values()),
+            "version": self.version,
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 3) if self.searches else 0.0,
+        }
+
+
+def load_file(index: BM25Index, path: str) -> int:
+    """Fill index from a JSON list of documents (``manage.py sync_knowledge --output``)"""
+    with open(path, encoding="utf-8") as handle:
+        documents = [Document.from_dict(item) for item in json.load(handle)]
+    index.replace_all(documents)
+    return len(documents)
+
+
+class RedisKnowledgeFeed:
+    """Keeps an index in step with the Django site through Redis
+
+    Django keeps every document in the ``<prefix>:docs`` hash and appends
+    each change to the ``<prefix>:changes`` stream. On start the feed notes
+    the newest stream entry and loads the hash, then follows the stream from
+    that entry. Changes are idempotent upserts and deletes, so any overlap
+    between the snapshot and the stream is harmless.
+    """
+
+    def __init__(self, client, index: BM25Index, key_prefix: str = DEFAULT_KEY_PREFIX,
+                 block_ms: int = 5000, retry_interval: float = 5.0):
+        self.client = client
+        self.index = index
+        self.docs_key = f"{key_prefix}:docs"
+        self.stream_key = f"{key_prefix}:changes"
+        self.block_ms = block_ms
+        self.retry_interval = retry_interval
+        self._last_id = "0-0"
+        self._task: Optional["asyncio.Task"] = None
+
+        self.changes_applied = 0
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str, index: BM25Index, **kwargs) -> "RedisKnowledgeFeed":
+        """Connect to ``redis://`` URLs, or to an in-process stand-in with ``fakeredis://``"""
+        if url.startswith("fakeredis://"):
+            import fakeredis.aioredis
+            client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        else:
+            import redis.asyncio
+            client = redis.asyncio.from_url(url, decode_responses=True)
+        return cls(client, index, **kwargs)
+
+    async def load(self) -> None:
+        latest = await self.client.xrevrange(self.stream_key, count=1)
+        self._last_id = latest[0][0] if latest else "0-0"
+        documents = await self.client.hgetall(self.docs_key)
+        self.index.replace_all(Document.from_dict(json.loads(raw)) for raw in documents.values())
+        logger.info(f"Knowledge index loaded with {len(self.index)} documents")
+
+    def apply(self, fields: Dict[str, str]) -> None:
+        if fields.get("op") == "delete":
+            self.index.remove(fields["id"])
+        else:
+            self.index.upsert(Document.from_dict(json.loads(fields["doc"])))
+        self.changes_applied += 1
+
+    async def poll(self) -> int:
+        """Apply the changes that have arrived since the last poll (waits up to block_ms for one)"""
+        response = await self.client.xread({self.stream_key: self._last_id}, count=100, block=self.block_ms)
+        applied = 0
+        for _, entries in response or ():
+            for entry_id, fields in entries:
+                self.apply(fields)
+                self._last_id = entry_id
+                applied += 1
+        return applied
+
+    async def start(self) -> None:
+        """Load the snapshot and follow the change stream in the background (called from the app lifespan)"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.client.close()
+
+    async def _run(self) -> None:
+        loaded = False
+        while True:
+            try:
+                if not loaded:
+                    await self.load()
+                    loaded = True
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Knowledge feed error: {e}")
+                await asyncio.sleep(self.retry_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"last_id": self._last_id, "changes_applied": self.changes_applied, "errors": self.errors}
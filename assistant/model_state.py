@@ -0,0 +1,131 @@
+import hashlib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from assistant.messages import Message
+
+
+def message_key(message: Message) -> str:
+    """Identity of a history message, used to check a stored context still matches the history"""
+    return hashlib.sha1(f"{message.role}\x00{message.content}".encode()).hexdigest()
+
+
+class _State:
+    __slots__ = ("model", "template_version", "context", "last_message")
+
+    def __init__(self, model: str, template_version: str, context: array, last_message: str):
+        self.model = model
+        self.template_version = template_version
+        self.context = context
+        self.last_message = last_message
+
+
+class _EvalStats:
+    __slots__ = ("turns", "prompt_eval_count", "prompt_eval_duration_ns")
+
+    def __init__(self):
+        self.turns = 0
+        self.prompt_eval_count = 0
+        self.prompt_eval_duration_ns = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "avg_prompt_eval_count": round(self.prompt_eval_count / self.turns, 1) if self.turns else 0.0,
+            "avg_prompt_eval_ms": round(self.prompt_eval_duration_ns / self.turns / 1e6, 2) if self.turns else 0.0,
+        }
+
+
+class ModelStateCache:
+    """Per-conversation Ollama ``context`` token arrays, reused across turns
+
+    A stored context is only continued when the model, the prompt template
+    version and the last history message all still match; otherwise the turn
+    falls back to a full prompt and the stale state is dropped. Contexts are
+    held as compact int arrays under an LRU bound on total tokens.
+    """
+
+    def __init__(self, max_conversations: int = 2000, max_total_tokens: int = 4_000_000,
+                 max_context_tokens: int = 1536, enabled: bool = True):
+        self.max_conversations = max_conversations
+        self.max_total_tokens = max_total_tokens
+        self.max_context_tokens = max_context_tokens
+        self.enabled = enabled
+        self._states: "OrderedDict[str, _State]" = OrderedDict()
+        self._tokens = 0
+
+        self.reused = 0
+        self.rebuilt = 0
+        self.invalidations = {"model": 0, "template": 0, "history": 0, "too_long": 0, "evicted": 0}
+        self._eval = {"full": _EvalStats(), "incremental": _EvalStats()}
+
+    def _drop(self, conversation_id: str, reason: Optional[str] = None) -> None:
+        state = self._states.pop(conversation_id, None)
+        if state is not None:
+            self._tokens -= len(state.context)
+            if reason:
+                self.invalidations[reason] += 1
+
+    def lookup(self, conversation_id: str, model: str, template_version: str,
+               history: List[Message]) -> Optional[List[int]]:
+        """Context to continue from, given the history before the current user message"""
+        state = self._states.get(conversation_id) if self.enabled else None
+        if state is None:
+            self.rebuilt += 1
+            return None
+
+        reason = None
+        if state.model != model:
+            reason = "model"
+        elif state.template_version != template_version:
+            reason = "template"
+        elif not history or message_key(history[-1]) != state.last_message:
+            reason = "history"
+        if reason:
+            self._drop(conversation_id, reason)
+            self.rebuilt += 1
+            return None
+
+        self._states.move_to_end(conversation_id)
+        self.reused += 1
+        return state.context.tolist()
+
+    def update(self, conversation_id: str, model: str, template_version: str,
+               context: Optional[List[int]], last_message: Message) -> None:
+        """Store the context returned with a reply; last_message is the reply as saved in history"""
+        if not self.enabled:
+            return
+        self._drop(conversation_id)
+        if not context:
+            return
+        if len(context) > self.max_context_tokens:
+            # Let the next turn start over from a fresh, bounded prompt
+            self.invalidations["too_long"] += 1
+            return
+
+        self._states[conversation_id] = _State(model, template_version, array("i", context), message_key(last_message))
+        self._tokens += len(context)
+        while len(self._states) > self.max_conversations or self._tokens > self.max_total_tokens:
+            self._drop(next(iter(self._states)), "evicted")
+
+    def forget(self, conversation_id: str) -> None:
+        self._drop(conversation_id)
+
+    def observe(self, incremental: bool, data: Dict[str, Any]) -> None:
+        """Record Ollama's prompt evaluation counters for a finished generation"""
+        stats = self._eval["incremental" if incremental else "full"]
+        stats.turns += 1
+        stats.prompt_eval_count += int(data.get("prompt_eval_count") or 0)
+        stats.prompt_eval_duration_ns += int(data.get("prompt_eval_duration") or 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "conversations": len(self._states),
+            "tokens": self._tokens,
+            "reused": self.reused,
+            "rebuilt": self.rebuilt,
+            "invalidations": dict(self.invalidations),
+            "prompt_eval": {kind: stats.as_dict() for kind, stats in self._eval.items()},
+        }
@@ -0,0 +1,219 @@
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Default per-route timeouts (seconds), matching what the endpoints used before
+# the client was shared.
+DEFAULT_ROUTE_TIMEOUTS = {
+    "generate": 30.0,
+    "stream": 60.0,
+    "tags": 5.0,
+    "embeddings": 10.0,
+}
+
+_SEND_HEADERS_EVENTS = (
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+)
+
+# Setting up a new connection, which is not time spent waiting for the pool
+_CONNECT_EVENTS = ("connection.connect_tcp", "connection.start_tls", "http2.send_connection_init")
+
+
+class _PoolInstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Transport that records how long each request waits for a pooled connection
+
+    The wait runs until the request headers are sent, less any time spent
+    opening a new connection (TCP connect, TLS handshake, HTTP/2 preface),
+    which is recorded separately.
+    """
+
+    def __init__(self, *args, window: int = 1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquire_waits: Deque[float] = deque(maxlen=window)
+        self.acquire_wait_total = 0.0
+        self.acquired_total = 0
+        self.connects_total = 0
+        self.connect_seconds_total = 0.0
+        self.requests_total = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.http_versions: Dict[str, int] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+        connecting = 0.0
+        connect_started: Dict[str, float] = {}
+        upstream_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal acquired, connecting
+            step, _, phase = event_name.rpartition(".")
+            if step in _CONNECT_EVENTS:
+                if phase == "started":
+                    connect_started[step] = time.perf_counter()
+                    if step == "connection.connect_tcp":
+                        self.connects_total += 1
+                elif step in connect_started:
+                    elapsed = time.perf_counter() - connect_started.pop(step)
+                    connecting += elapsed
+                    self.connect_seconds_total += elapsed
+            if not acquired and event_name in _SEND_HEADERS_EVENTS:
+                acquired = True
+                self.waiting -= 1
+                wait = max(time.perf_counter() - started - connecting, 0.0)
+                self.acquire_waits.append(wait)
+                self.acquired_total += 1
+                self.acquire_wait_total += wait
+            if upstream_trace is not None:
+                await upstream_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        self.requests_total += 1
+        self.waiting += 1
+        self.in_flight += 1
+        try:
+            response = await super().handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+            if not acquired:
+                self.waiting -= 1
+        # What the server agreed to, which is HTTP/1.1 when it does not speak HTTP/2
+        version = response.extensions.get("http_version", b"HTTP/1.1").decode("ascii", "replace")
+        self.http_versions[version] = self.http_versions.get(version, 0) + 1
+        return response
+
+    def connection_counts(self) -> Dict[str, int]:
+        in_use = idle = 0
+        for connection in self._pool.connections:
+            if connection.is_closed():
+                continue
+            if connection.is_idle():
+                idle += 1
+            else:
+                in_use += 1
+        return {"in_use": in_use, "idle": idle}
+
+
+class OllamaClient:
+    """Application-scoped, pooled HTTP client for the Ollama API"""
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        connect_timeout: float = 5.0,
+        route_timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.route_timeouts = dict(DEFAULT_ROUTE_TIMEOUTS)
+        self.route_timeouts.update(route_timeouts or {})
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[_PoolInstrumentedTransport] = None
+        # Whether HTTP/2 is offered once started (False when h2 is missing)
+        self.http2_offered = False
+
+    async def start(self) -> None:
+        """Open the shared connection pool (called from the app lifespan)"""
+        if self._client is not None:
+            return
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("OLLAMA_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+                http2 = False
+        self.http2_offered = http2
+        self._transport = _PoolInstrumentedTransport(limits=self.limits, http2=http2)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=self._transport,
+            timeout=self._timeout("generate"),
+        )
+
+    async def close(self) -> None:
+        """Close all pooled connections (called on shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._transport = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("OllamaClient is not started; it is opened in the app lifespan")
+        return self._client
+
+    def _timeout(self, route: str) -> httpx.Timeout:
+        return httpx.Timeout(self.route_timeouts[route], connect=self.connect_timeout)
+
+    async def generate(self, payload: Dict[str, Any]) -> httpx.Response:
+        """Non-streaming POST /api/generate"""
+        return await self.client.post("/api/generate", json=payload, timeout=self._timeout("generate"))
+
+    @asynccontextmanager
+    async def stream_generate(self, payload: Dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        """Streaming POST /api/generate"""
+        async with self.client.stream(
+            "POST", "/api/generate", json=payload, timeout=self._timeout("stream")
+        ) as response:
+            yield response
+
+    async def embeddings(self, payload: Dict[str, Any]) -> httpx.Response:
+        """POST /api/embeddings"""
+        return await self.client.post("/api/embeddings", json=payload, timeout=self._timeout("embeddings"))
+
+    async def tags(self) -> httpx.Response:
+        """GET /api/tags, used for health checks"""
+        return await self.client.get("/api/tags", timeout=self._timeout("tags"))
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for sizing the limits"""
+        stats: Dict[str, Any] = {
+            "base_url": self.base_url,
+            "http2_configured": self.http2,
+            "http2_offered": self.http2_offered,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+        }
+        transport = self._transport
+        if transport is None:
+            stats["started"] = False
+            return stats
+
+        waits = sorted(transport.acquire_waits)
+        stats.update(transport.connection_counts())
+        stats.update({
+            "started": True,
+            "in_flight": transport.in_flight,
+            "waiting": transport.waiting,
+            "requests_total": transport.requests_total,
+            "negotiated_http_versions": dict(transport.http_versions),
+            "connects_total": transport.connects_total,
+            "connect_avg_ms": round(transport.connect_seconds_total / transport.connects_total * 1000, 3)
+            if transport.connects_total else 0.0,
+            "acquire_wait_avg_ms": round(transport.acquire_wait_total / transport.acquired_total * 1000, 3)
+            if transport.acquired_total else 0.0,
+            "acquire_wait_p95_ms": round(waits[int(len(waits) * 0.95) - 1] * 1000, 3) if waits else 0.0,
+            "acquire_wait_max_ms": round(waits[-1] * 1000, 3) if waits else 0.0,
+        })
+        return stats
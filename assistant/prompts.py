@@ -0,0 +1,237 @@
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from assistant.knowledge import BM25Index
+from assistant.messages import Message
+from assistant.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+COMPANY_PREAMBLE = """
+You are Shiraji AI Assistant - an expert construction consultant for Shiraji Group in Abu Dhabi, UAE.
+
+COMPANY INFO:
+- Location: Al Nahyan, Abu Dhabi, UAE
+- Phone: +971 55 942 5653
+- Email: info@shiraji.ae
+- Services: Construction, Electrical, HVAC, Plumbing, Swimming Pools, Interior Design, Maintenance
+"""
+
+ANALYSIS_TEMPLATE = """
+CONVERSATION ANALYSIS:
+- Primary Intent: {primary_intent}
+- Stage: {stage}
+- Entities: {entities}
+- Message Count: {message_count}
+"""
+
+RESPONSE_GUIDELINES = """RESPONSE GUIDELINES:
+- Be conversational and helpful (not robotic)
+- Reference previous conversation naturally
+- Ask ONE specific follow-up question
+- Keep response under 100 words
+- Use emojis appropriately
+- Provide actionable advice
+- Be specific and avoid generic responses"""
+
+RESPONSE_CUE = "Respond as Shiraji AI Assistant:"
+
+INTENT_INSTRUCTIONS = {
+    "quote_request": "Focus on gathering project details (type, size, location, timeline) to provide accurate pricing. Offer to schedule a site visit.",
+    "project_inquiry": "Discuss project specifics, share relevant experience, and guide toward next steps (consultation, quote, timeline).",
+    "service_question": "Explain the specific service in detail, mention related services, and suggest how to proceed.",
+    "contact_request": "Provide contact information and suggest the best way to connect based on their needs.",
+    "technical_support": "Offer practical solutions, explain the process, and suggest professional assessment if needed.",
+    "general": "Be welcoming, understand their needs, and guide the conversation toward specific services or projects."
+}
+
+# Changes whenever any template text changes, so stored model state built
+# from an older template is never continued with a newer one.
+TEMPLATE_VERSION = hashlib.sha1(
+    "\x00".join([COMPANY_PREAMBLE, ANALYSIS_TEMPLATE, RESPONSE_GUIDELINES, RESPONSE_CUE]
+                + [f"{k}={v}" for k, v in sorted(INTENT_INSTRUCTIONS.items())]).encode()
+).hexdigest()[:12]
+
+
+class PromptBudget:
+    """Token budget for each section of a prompt"""
+
+    def __init__(self, preamble: int = 400, analysis: int = 120, history: int = 600,
+                 summary: int = 150, message: int = 400, recent_messages: int = 6, knowledge: int = 200):
+        self.preamble = preamble
+        self.analysis = analysis
+        self.history = history
+        self.summary = summary
+        self.message = message
+        self.recent_messages = recent_messages
+        self.knowledge = knowledge
+
+
+class SmartPromptBuilder:
+    """Build intelligent prompts based on conversation context"""
+
+    template_version = TEMPLATE_VERSION
+
+    def __init__(self, budget: Optional[PromptBudget] = None, counter: Optional[TokenCounter] = None,
+                 knowledge: Optional[BM25Index] = None, knowledge_top_k: int = 3):
+        self.budget = budget or PromptBudget()
+        self.counter = counter or TokenCounter()
+        self.knowledge = knowledge
+        self.knowledge_top_k = knowledge_top_k
+        self.prompts_built = 0
+        self.prompt_tokens_total = 0
+        self.knowledge_snippets = 0
+        self.truncated = {"preamble": 0, "analysis": 0, "history": 0, "message": 0, "knowledge": 0}
+
+        preamble_tokens = self.counter.count(COMPANY_PREAMBLE)
+        if preamble_tokens > self.budget.preamble:
+            logger.warning(f"Company preamble is {preamble_tokens} tokens, over its budget of {self.budget.preamble}")
+            self.truncated["preamble"] += 1
+            self._preamble = self.counter.truncate(COMPANY_PREAMBLE, self.budget.preamble) + "\n"
+            preamble_tokens = self.budget.preamble
+        else:
+            self._preamble = COMPANY_PREAMBLE
+        self._preamble_tokens = preamble_tokens
+
+    def _fit(self, section: str, text: str, max_tokens: int) -> str:
+        fitted = self.counter.truncate(text, max_tokens)
+        if fitted is not text:
+            self.truncated[section] += 1
+        return fitted
+
+    def _budget_history(self, history: List[Message], summary: Optional[str]) -> str:
+        """Summary of older turns plus as many recent messages as fit the history budget"""
+        budget = self.budget
+        remaining = budget.history
+        lines: List[str] = []
+        # Newest first, so the latest turns survive when the budget runs out
+        for msg in reversed(history[-budget.recent_messages:]):
+            content = self._fit("history", msg.content, max(budget.history // 2, 1))
+            line = f"{msg.role.upper()}: {content}"
+            tokens = self.counter.count(line)
+            if tokens > remaining:
+                self.truncated["history"] += 1
+                break
+            remaining -= tokens
+            lines.append(line)
+        lines.reverse()
+
+        sections = []
+        if summary:
+            fitted = self._fit("history", summary, min(budget.summary, remaining))
+            remaining -= self.counter.count(fitted)
+            sections.append("EARLIER CONVERSATION SUMMARY:\n" + fitted)
+        if lines:
+            sections.append("RECENT CONVERSATION:\n" + "\n".join(lines))
+        self.prompt_tokens_total += budget.history - remaining
+        return "".join(f"\n\n{section}" for section in sections)
+
+    def _knowledge_section(self, message: str) -> str:
+        """The indexed website content most relevant to message, within the knowledge budget"""
+        if self.knowledge is None or self.knowledge_top_k <= 0:
+            return ""
+        hits = self.knowledge.search(message, self.knowledge_top_k)
+        remaining = self.budget.knowledge
+        lines: List[str] = []
+        for document, _ in hits:
+            text = self._fit("knowledge", document.text, max(self.budget.knowledge // len(hits), 1))
+            line = f"- {document.kind.title()}: {document.title}. {text}"
+            tokens = self.counter.count(line)
+            if tokens > remaining:
+                self.truncated["knowledge"] += 1
+                break
+            remaining -= tokens
+            lines.append(line)
+        if not lines:
+            return ""
+        self.knowledge_snippets += len(lines)
+        return "\n\nRELEVANT COMPANY INFORMATION:\n" + "\n".join(lines)
+
+    def build_prompt(self, message: str, history: List[Message], analysis: Dict[str, Any],
+                     summary: Optional[str] = None) -> str:
+        """Full prompt: company preamble, analysis, relevant website content, history and the current message
+
+        Every section is held to its token budget, so the prompt size stays
+        bounded however long the conversation or the pasted message is.
+        """
+        budget = self.budget
+
+        # The current message is quoted below, so leave it out of the history
+        if history and history[-1].role == 'user' and history[-1].content == message:
+            history = history[:-1]
+
+        analysis_text = self._fit("analysis", self._format_analysis(analysis), budget.analysis)
+        knowledge = self._knowledge_section(message)
+        message = self._fit("message", message, budget.message)
+        base_context = self._preamble + analysis_text + knowledge
+
+        # Add conversation history (rolling summary plus the most recent messages)
+        base_context += self._budget_history(history, summary)
+
+        # Add specific instructions based on intent
+        intent_instructions = self._get_intent_instructions(analysis.get('primary_intent', 'general'))
+
+        self.prompts_built += 1
+        self.prompt_tokens_total += (self._preamble_tokens + self.counter.count(analysis_text)
+                                     + self.counter.count(knowledge) + self.counter.count(message))
+
+        prompt = f"""{base_context}
+
+CURRENT USER MESSAGE: "{message}"
+
+{intent_instructions}
+
+{RESPONSE_GUIDELINES}
+
+{RESPONSE_CUE}"""
+
+        return prompt
+
+    def build_turn(self, message: str, analysis: Dict[str, Any]) -> str:
+        """Incremental prompt for a turn that continues stored model context
+
+        The preamble, guidelines and earlier turns are already in the model's
+        context, so only the new message and this turn's analysis are sent.
+        """
+        intent_instructions = self._get_intent_instructions(analysis.get('primary_intent', 'general'))
+        knowledge = self._knowledge_section(message)
+        message = self._fit("message", message, self.budget.message)
+        analysis_text = self._fit("analysis", self._format_analysis(analysis), self.budget.analysis)
+        return f"""
+
+USER: {message}
+{analysis_text}{knowledge}
+{intent_instructions}
+Keep following the RESPONSE GUIDELINES above.
+
+{RESPONSE_CUE}"""
+
+    def _format_analysis(self, analysis: Dict[str, Any]) -> str:
+        return ANALYSIS_TEMPLATE.format(
+            primary_intent=analysis.get('primary_intent', 'general'),
+            stage=analysis.get('conversation_stage', 'greeting'),
+            entities=', '.join(f"{k}: {v}" for k, v in analysis.get('entities', {}).items() if v),
+            message_count=analysis.get('message_count', 0),
+        )
+
+    def _get_intent_instructions(self, intent: str) -> str:
+        return INTENT_INSTRUCTIONS.get(intent, INTENT_INSTRUCTIONS["general"])
+
+    def stats(self) -> Dict[str, Any]:
+        budget = self.budget
+        return {
+            "tokenizer": "exact" if self.counter.exact else "approximate",
+            "budget": {
+                "preamble": budget.preamble,
+                "analysis": budget.analysis,
+                "history": budget.history,
+                "summary": budget.summary,
+                "message": budget.message,
+                "knowledge": budget.knowledge,
+            },
+            "knowledge_snippets": self.knowledge_snippets,
+            "prompts_built": self.prompts_built,
+            "avg_prompt_tokens": round(self.prompt_tokens_total / self.prompts_built, 1) if self.prompts_built else 0.0,
+            "truncated": dict(self.truncated),
+        }
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitBreaker:
+    """Opens when too many recent calls fail
+
+    While open, calls are refused for ``open_seconds``; after that up to
+    ``half_open_calls`` trial calls are let through, and the breaker closes
+    again once one of them succeeds (or re-opens if one fails).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: int = 50, min_calls: int = 10, failure_ratio: float = 0.5,
+                 open_seconds: float = 30.0, half_open_calls: int = 1):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._results: Deque[bool] = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._trials < self.half_open_calls:
+            self._trials += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def abandon(self) -> None:
+        """A permitted call ended before reaching the upstream, so it says nothing either way"""
+        if self._state == self.HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def record(self, ok: bool) -> None:
+        state = self.state
+        if state == self.HALF_OPEN:
+            if ok:
+                self._state = self.CLOSED
+                self._results.clear()
+                logger.info("Circuit breaker closed")
+            else:
+                self._open()
+            return
+
+        self._results.append(ok)
+        failures = self._results.count(False)
+        if (state == self.CLOSED and len(self._results) >= self.min_calls
+                and failures / len(self._results) >= self.failure_ratio):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._results.clear()
+        self.opened += 1
+        logger.warning(f"Circuit breaker opened for {self.open_seconds:.0f}s")
+
+    def retry_after(self) -> int:
+        if self._state != self.OPEN:
+            return 1
+        return max(1, math.ceil(self.open_seconds - (time.monotonic() - self._opened_at)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._results),
+            "recent_failures": self._results.count(False),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class Hedger:
+    """Sends a second copy of a slow call after a delay based on recent latency
+
+    The delay is the ``quantile`` of recent call latencies (clamped to
+    ``min_delay``..``max_delay``), so only the slowest few percent of calls
+    are hedged. Hedges are capped at ``max_ratio`` of all calls so a slow
+    backend never sees its load doubled.
+    """
+
+    def __init__(self, quantile: float = 0.95, min_delay: float = 0.5, max_delay: float = 10.0,
+                 window: int = 200, min_samples: int = 20, max_ratio: float = 0.1, enabled: bool = True):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.enabled = enabled
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _within_budget(self) -> bool:
+        return self.enabled and self.hedged < self.max_ratio * self.calls
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while hedging is not allowed"""
+        if len(self._latencies) < self.min_samples or not self._within_budget():
+            return None
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.quantile))
+        return min(max(latencies[index], self.min_delay), self.max_delay)
+
+    async def run(self, primary: Callable[[], Awaitable[T]],
+                  hedge: Optional[Callable[[], Awaitable[T]]] = None) -> Tuple[T, str]:
+        """Result of whichever call finishes first, and "primary" or "hedge" for the one that did
+
+        A primary call that fails before the hedge delay is hedged straight away.
+        """
+        self.calls += 1
+        started = time.monotonic()
+        delay = self.delay() if hedge is not None else None
+        tasks = {asyncio.ensure_future(primary()): "primary"}
+        try:
+            done, _ = await asyncio.wait(set(tasks), timeout=delay)
+            failed = any(task.exception() is not None for task in done)
+            if hedge is not None and (not done or failed) and self._within_budget():
+                self.hedged += 1
+                tasks[asyncio.ensure_future(hedge())] = "hedge"
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    path = tasks[task]
+                    if path == "hedge":
+                        self.hedge_wins += 1
+                    self._latencies.append(time.monotonic() - started)
+                    return task.result(), path
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.delay()
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "current_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+        }
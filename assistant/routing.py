@@ -0,0 +1,124 @@
+import json
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional
+
+
+class Route:
+    """A model and its generation options for one kind of turn"""
+
+    def __init__(self, name: str, model: str, num_predict: int, temperature: float = 0.7):
+        self.name = name
+        self.model = model
+        self.num_predict = num_predict
+        self.temperature = temperature
+
+
+class RouteRule:
+    """Sends turns whose primary intent and stage match to a route; an empty list matches anything"""
+
+    def __init__(self, route: str, intents: Iterable[str] = (), stages: Iterable[str] = ()):
+        self.route = route
+        self.intents = set(intents)
+        self.stages = set(stages)
+
+    def matches(self, analysis: Dict[str, Any]) -> bool:
+        if self.intents and analysis.get("primary_intent", "general") not in self.intents:
+            return False
+        if self.stages and analysis.get("conversation_stage", "greeting") not in self.stages:
+            return False
+        return True
+
+
+class _RouteStats:
+    __slots__ = ("requests", "latencies", "latency_total", "eval_count", "eval_duration_ns")
+
+    def __init__(self, window: int):
+        self.requests = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.latency_total = 0.0
+        self.eval_count = 0
+        self.eval_duration_ns = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "avg_latency_ms": round(self.latency_total / self.requests * 1000, 1) if self.requests else 0.0,
+            "p95_latency_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else 0.0,
+            "avg_output_tokens": round(self.eval_count / self.requests, 1) if self.requests else 0.0,
+            "tokens_per_second": round(self.eval_count / (self.eval_duration_ns / 1e9), 1)
+            if self.eval_duration_ns else 0.0,
+        }
+
+
+class ModelRouter:
+    """Chooses the model and output length for a turn from its intent analysis
+
+    Rules are checked in order and the first match wins; turns matching no
+    rule use ``default``. Latency and output tokens are recorded per route.
+    """
+
+    def __init__(self, routes: Iterable[Route], rules: Iterable[RouteRule], default: str, window: int = 500):
+        self.routes = {route.name: route for route in routes}
+        self.rules = list(rules)
+        self.default = default
+        for name in [default] + [rule.route for rule in self.rules]:
+            if name not in self.routes:
+                raise ValueError(f"Routing rule refers to unknown route {name!r}")
+        self._stats = {name: _RouteStats(window) for name in self.routes}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ModelRouter":
+        """Build from {"routes": {name: {model, num_predict, temperature}}, "rules": [...], "default": name}"""
+        routes = [
+            Route(name, spec["model"], int(spec["num_predict"]), float(spec.get("temperature", 0.7)))
+            for name, spec in config["routes"].items()
+        ]
+        rules = [RouteRule(rule["route"], rule.get("intents", ()), rule.get("stages", ())) for rule in config.get("rules", [])]
+        return cls(routes, rules, config["default"])
+
+    @classmethod
+    def from_json(cls, text: str) -> "ModelRouter":
+        return cls.from_config(json.loads(text))
+
+    def choose(self, analysis: Dict[str, Any]) -> Route:
+        for rule in self.rules:
+            if rule.matches(analysis):
+                return self.routes[rule.route]
+        return self.routes[self.default]
+
+    def observe(self, route: Route, latency: float, data: Optional[Dict[str, Any]] = None) -> None:
+        """Record a finished generation on route; data is Ollama's final response body"""
+        stats = self._stats[route.name]
+        stats.requests += 1
+        stats.latencies.append(latency)
+        stats.latency_total += latency
+        if data:
+            stats.eval_count += int(data.get("eval_count") or 0)
+            stats.eval_duration_ns += int(data.get("eval_duration") or 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": self.default,
+            "routes": {
+                name: {"model": route.model, "num_predict": route.num_predict, **self._stats[name].as_dict()}
+                for name, route in self.routes.items()
+            },
+        }
+
+
+def default_routing_config(model: str, fast_model: str, large_model: str) -> Dict[str, Any]:
+    """Short informational turns on the fast model, converting quotes and projects on the large one"""
+    return {
+        "routes": {
+            "fast": {"model": fast_model, "num_predict": 120, "temperature": 0.5},
+            "standard": {"model": model, "num_predict": 200, "temperature": 0.7},
+            "large": {"model": large_model, "num_predict": 320, "temperature": 0.7},
+        },
+        "rules": [
+            {"route": "large", "intents": ["quote_request", "project_inquiry"], "stages": ["conversion"]},
+            {"route": "fast", "intents": ["general", "general_info", "contact_request", "service_question"],
+             "stages": ["greeting", "exploration"]},
+        ],
+        "default": "standard",
+    }
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(_PUNCTUATION.sub(" ", message.lower()).split())
+
+
+def fingerprint(value: Any) -> str:
+    """Stable short hash of a JSON-serializable value, used as a cache version"""
+    encoded = json.dumps(value, sort_keys=True, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+class HashingEmbedder:
+    """Local embedding from hashed word and character n-grams (no model call)"""
+
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[str]:
+        words = text.split()
+        features = list(words)
+        for word in words:
+            padded = f" {word} "
+            features.extend(padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1))
+        return features
+
+    async def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+
+class OllamaEmbedder:
+    """Embeddings from an Ollama embedding model via /api/embeddings"""
+
+    def __init__(self, client, model: str = "nomic-embed-text"):
+        self.client = client
+        self.model = model
+
+    async def __call__(self, text: str) -> np.ndarray:
+        response = await self.client.embeddings({"model": self.model, "prompt": text})
+        response.raise_for_status()
+        return np.asarray(response.json()["embedding"], dtype=np.float32)
+
+
+def partition_code(key: Tuple[Any, ...]) -> int:
+    """Non-negative 63-bit code of a partition key"""
+    return int(fingerprint(key), 16) >> 1
+
+
+class CacheProbe:
+    """Result of a cache lookup; pass it back to store() on a miss"""
+
+    __slots__ = ("cacheable", "partition", "vector", "response", "started")
+
+    def __init__(self, cacheable: bool, partition: int = -1, vector: Optional[np.ndarray] = None,
+                 response: Optional[str] = None):
+        self.cacheable = cacheable
+        self.partition = partition
+        self.vector = vector
+        self.response = response
+        self.started = time.perf_counter()
+
+    @property
+    def hit(self) -> bool:
+        return self.response is not None
+
+
+class _Entry:
+    __slots__ = ("response", "created", "generation_seconds")
+
+    def __init__(self, response: str, generation_seconds: float):
+        self.response = response
+        self.created = time.monotonic()
+        self.generation_seconds = generation_seconds
+
+
+class SemanticResponseCache:
+    """Reuses generated answers for questions that mean the same thing
+
+    Entries are partitioned by primary_intent, conversation_stage, the
+    extracted entities (budget, location, project type, services...) and the
+    numbers in the message, so "a villa in Dubai" never gets the answer about
+    "a villa in Sharjah", and matched by cosine similarity of the normalized
+    message embedding. Vectors live in one preallocated NumPy matrix so a
+    lookup is a single matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        embedder: Callable[[str], Awaitable[np.ndarray]],
+        capacity: int = 2048,
+        threshold: float = 0.9,
+        ttl_seconds: float = 3600.0,
+        stages: Tuple[str, ...] = ("greeting", "exploration"),
+        version_source: Optional[Callable[[], str]] = None,
+        enabled: bool = True,
+    ):
+        self.embedder = embedder
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.stages = tuple(stages)
+        self.version_source = version_source
+        self.enabled = enabled
+
+        self._vectors: Optional[np.ndarray] = None
+        self._partitions = np.full(capacity, -1, dtype=np.int64)
+        self._entries: List[Optional[_Entry]] = [None] * capacity
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free = list(range(capacity - 1, -1, -1))
+        self._version = version_source() if version_source else None
+
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+
+    def invalidate(self) -> int:
+        """Drop every entry (e.g. after company information changes)"""
+        dropped = len(self._lru)
+        self._partitions.fill(-1)
+        self._entries = [None] * self.capacity
+        self._lru.clear()
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self.invalidations += 1
+        return dropped
+
+    def _check_version(self) -> None:
+        if self.version_source is None:
+            return
+        version = self.version_source()
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    def _release(self, slot: int) -> None:
+        self._partitions[slot] = -1
+        self._entries[slot] = None
+        self._lru.pop(slot, None)
+        self._free.append(slot)
+
+    async def _embed(self, message: str) -> np.ndarray:
+        vector = np.asarray(await self.embedder(message), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    async def lookup(self, message: str, primary_intent: str, conversation_stage: str,
+                     entities: Optional[Dict[str, Any]] = None) -> CacheProbe:
+        """Cached answer for the message, if any; embedder errors propagate"""
+        if not self.enabled or conversation_stage not in self.stages:
+            return CacheProbe(False)
+        self._check_version()
+
+        normalized = normalize_message(message)
+        if not normalized:
+            return CacheProbe(False)
+        partition = partition_code((primary_intent, conversation_stage, entities or {}, _DIGITS.findall(normalized)))
+        probe = CacheProbe(True, partition, await self._embed(normalized))
+
+        if self._vectors is not None:
+            slots = np.flatnonzero(self._partitions == partition)
+            if slots.size:
+                similarities = self._vectors[slots] @ probe.vector
+                best = int(np.argmax(similarities))
+                slot = int(slots[best])
+                entry = self._entries[slot]
+                if similarities[best] >= self.threshold and entry is not None:
+                    if time.monotonic() - entry.created <= self.ttl_seconds:
+                        self._lru.move_to_end(slot)
+                        self.hits += 1
+                        self.seconds_saved += max(0.0, entry.generation_seconds - (time.perf_counter() - probe.started))
+                        probe.response = entry.response
+                        return probe
+                    self._release(slot)
+        self.misses += 1
+        return probe
+
+    def store(self, probe: CacheProbe, response: str, generation_seconds: float) -> None:
+        """Remember the response generated after a cache miss"""
+        if not probe.cacheable or probe.hit or probe.vector is None:
+            return
+        if self._vectors is None:
+            self._vectors = np.zeros((self.capacity, probe.vector.shape[0]), dtype=np.float32)
+        if not self._free:
+            oldest, _ = self._lru.popitem(last=False)
+            self._release(oldest)
+            self.evictions += 1
+
+        slot = self._free.pop()
+        self._vectors[slot] = probe.vector
+        self._partitions[slot] = probe.partition
+        self._entries[slot] = _Entry(response, generation_seconds)
+        self._lru[slot] = None
+        self.inserts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._lru),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "inserts": self.inserts,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": round(self.seconds_saved, 3),
+        }
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from assistant.routing import Route
+from assistant.sse import TokenBatch
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class Speculation:
+    """A reply generated ahead of time for a suggested follow-up"""
+
+    __slots__ = ("reply", "analysis", "route", "data", "seconds")
+
+    def __init__(self, reply: str, analysis: Dict[str, Any], route: Route, data: Dict[str, Any]):
+        self.reply = reply
+        self.analysis = analysis
+        self.route = route
+        # Ollama's response body, including the context that continues from this reply
+        self.data = data
+        self.seconds = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return int(self.data.get("eval_count") or 0)
+
+    async def batches(self) -> AsyncIterator[TokenBatch]:
+        """The reply as a stream of one batch, for the streaming endpoints"""
+        yield TokenBatch(self.reply, self.tokens, self.data)
+
+
+class _Speculations:
+    __slots__ = ("task", "answers", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.task: Optional["asyncio.Task"] = None
+        self.answers: Dict[str, "asyncio.Future"] = {}
+        self.expires_at = expires_at
+
+
+class SuggestionSpeculator:
+    """Generates answers to a reply's suggested follow-ups while the user reads it
+
+    After a turn, the suggestions are answered one after another in the
+    background, each only when ``has_capacity()`` says the upstreams have a
+    slot to spare and fewer than ``max_concurrent`` speculations are running.
+    ``generate`` should give up its slot to real turns that would otherwise
+    queue behind it; when it is cancelled for one, the conversation's
+    remaining suggestions are dropped. ``generate`` returns None for
+    suggestions that need no model call (the fast path answers them anyway).
+
+    The next message in the conversation takes the answers: a message that
+    matches a suggestion gets its answer (waiting for it if still being
+    generated), and anything else cancels the rest. Answers not taken within
+    ``ttl_seconds`` are dropped. Unused answers are counted as wasted, with
+    the output tokens and generation time they cost.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str, str], Awaitable[Optional[Speculation]]],
+        has_capacity: Callable[[], bool],
+        ttl_seconds: float = 120.0,
+        max_suggestions: int = 3,
+        max_concurrent: int = 2,
+        max_conversations: int = 1000,
+        enabled: bool = True,
+    ):
+        self.generate = generate
+        self.has_capacity = has_capacity
+        self.ttl_seconds = ttl_seconds
+        self.max_suggestions = max_suggestions
+        self.max_concurrent = max_concurrent
+        self.max_conversations = max_conversations
+        self.enabled = enabled
+        self._conversations: "OrderedDict[str, _Speculations]" = OrderedDict()
+        self._running = 0
+
+        self.scheduled = 0
+        self.generated = 0
+        self.not_needed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.expired = 0
+        self.hits = 0
+        self.joined = 0
+        self.misses = 0
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+        self.wasted = 0
+        self.wasted_tokens = 0
+        self.wasted_seconds = 0.0
+
+    def schedule(self, conversation_id: str, suggestions: List[str]) -> None:
+        """Start answering suggestions in the background, replacing any earlier speculation"""
+        if not self.enabled or not suggestions:
+            return
+        self.forget(conversation_id)
+        self._expire(time.monotonic())
+        entry = _Speculations(time.monotonic() + self.ttl_seconds)
+        entry.task = asyncio.ensure_future(self._run(conversation_id, entry, suggestions[:self.max_suggestions]))
+        self._conversations[conversation_id] = entry
+        self.scheduled += 1
+        while len(self._conversations) > self.max_conversations:
+            _, oldest = self._conversations.popitem(last=False)
+            self._discard(oldest)
+
+    async def _run(self, conversation_id: str, entry: _Speculations, suggestions: List[str]) -> None:
+        loop = asyncio.get_event_loop()
+        for suggestion in suggestions:
+            key = _normalize(suggestion)
+            if key in entry.answers:
+                continue
+            if self._running >= self.max_concurrent or not self.has_capacity():
+                self.skipped += 1
+                continue
+            future = entry.answers[key] = loop.create_future()
+            self._running += 1
+            started = time.monotonic()
+            try:
+                result = await self.generate(conversation_id, suggestion)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Speculative answer for {suggestion!r} failed: {type(e).__name__}: {e}")
+                result = None
+            finally:
+                self._running -= 1
+            if result is None:
+                self.not_needed += 1
+            else:
+                result.seconds = time.monotonic() - started
+                self.generated += 1
+                self.generated_tokens += result.tokens
+                self.generation_seconds += result.seconds
+            future.set_result(result)
+
+    async def take(self, conversation_id: str, message: str) -> Optional[Speculation]:
+        """The prepared answer when message is one of the suggestions; any other speculation is cancelled"""
+        entry = self._conversations.pop(conversation_id, None)
+        if entry is None:
+            return None
+        key = _normalize(message)
+        future = entry.answers.get(key)
+        if future is not None and time.monotonic() > entry.expires_at:
+            self.expired += 1
+            future = None
+        if future is None:
+            self.misses += 1
+            self._discard(entry)
+            return None
+        if not future.done():
+            # Still generating: finishing it beats starting the same answer from scratch
+            self.joined += 1
+            await asyncio.wait([future])
+        result = None if future.cancelled() else future.result()
+        self._discard(entry, used=key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def forget(self, conversation_id: str) -> None:
+        entry = self._conversations.pop(conversation_id, None)
+        if entry is not None:
+            self._discard(entry)
+
+    def _expire(self, now: float) -> None:
+        while self._conversations:
+            conversation_id, entry = next(iter(self._conversations.items()))
+            if entry.expires_at > now:
+                break
+            del self._conversations[conversation_id]
+            self.expired += 1
+            self._discard(entry)
+
+    def _discard(self, entry: _Speculations, used: Optional[str] = None) -> None:
+        if entry.task is not None and not entry.task.done():
+            entry.task.cancel()
+            self.cancelled += 1
+        for key, future in entry.answers.items():
+            if key == used or not future.done() or future.cancelled():
+                continue
+            result = future.result()
+            if result is not None:
+                self.wasted += 1
+                self.wasted_tokens += result.tokens
+                self.wasted_seconds += result.seconds
+
+    async def close(self) -> None:
+        entries = list(self._conversations.values())
+        self._conversations.clear()
+        for entry in entries:
+            self._discard(entry)
+        tasks = [entry.task for entry in entries if entry.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        takes = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "conversations": len(self._conversations),
+            "running": self._running,
+            "scheduled": self.scheduled,
+            "generated": self.generated,
+            "not_needed": self.not_needed,
+            "skipped_no_capacity": self.skipped,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "expired": self.expired,
+            "hits": self.hits,
+            "joined_in_flight": self.joined,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / takes, 3) if takes else 0.0,
+            "generated_tokens": self.generated_tokens,
+            "generation_seconds": round(self.generation_seconds, 3),
+            "wasted": self.wasted,
+            "wasted_tokens": self.wasted_tokens,
+            "wasted_seconds": round(self.wasted_seconds, 3),
+        }
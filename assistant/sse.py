@@ -0,0 +1,204 @@
+import asyncio
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Comment frame; ignored by EventSource but keeps proxies from timing the stream out
+HEARTBEAT = ": keep-alive\n\n"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Tell nginx not to buffer the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(data: Dict[str, Any], event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    """Encode one server-sent event frame"""
+    frame = ""
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    if event is not None:
+        frame += f"event: {event}\n"
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_token_event(text: str, event_id: int, done: bool = False) -> str:
+    """sse_event({"token": text, "done": done}, event_id), without building and encoding a dict"""
+    return f"id: {event_id}\ndata: {{\"token\": {encode_basestring_ascii(text)}, \"done\": {'true' if done else 'false'}}}\n\n"
+
+
+class TokenBatch:
+    """Tokens coalesced into one frame; done holds Ollama's final response body on the last batch"""
+
+    __slots__ = ("text", "tokens", "done")
+
+    def __init__(self, text: str, tokens: int, done: Optional[Dict[str, Any]] = None):
+        self.text = text
+        self.tokens = tokens
+        self.done = done
+
+
+async def coalesce_tokens(
+    source: AsyncIterator[Dict[str, Any]],
+    interval: float = 0.05,
+    max_bytes: int = 1024,
+) -> AsyncIterator[TokenBatch]:
+    """Ollama stream chunks batched into one TokenBatch per ``interval`` seconds or ``max_bytes`` of text
+
+    A reader task drains source into a list buffer; a timer started by the
+    first token of each batch flushes it, so tokens are never held back for
+    longer than ``interval`` even when the upstream stalls. An interval of 0
+    passes every token through on its own.
+    """
+    if interval <= 0:
+        async for data in source:
+            if "response" in data:
+                yield TokenBatch(data["response"], 1, data if data.get("done", False) else None)
+        return
+
+    loop = asyncio.get_event_loop()
+    ready = asyncio.Event()
+    parts: List[str] = []
+    size = 0
+    final: Optional[Dict[str, Any]] = None
+    finished = False
+    error: Optional[Exception] = None
+    timer: Optional[asyncio.TimerHandle] = None
+
+    async def read() -> None:
+        nonlocal size, final, finished, error, timer
+        try:
+            async for data in source:
+                if "response" not in data:
+                    continue
+                token = data["response"]
+                if not parts:
+                    timer = loop.call_later(interval, ready.set)
+                parts.append(token)
+                size += len(token.encode("utf-8"))
+                if data.get("done", False):
+                    final = data
+                    break
+                if size >= max_bytes:
+                    ready.set()
+        except Exception as e:
+            error = e
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            finished = True
+            ready.set()
+
+    reader = asyncio.ensure_future(read())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            if parts:
+                batch = TokenBatch("".join(parts), len(parts), final)
+                parts.clear()
+                size = 0
+                final = None
+                yield batch
+            if finished and not parts:
+                if error is not None:
+                    raise error
+                return
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if not reader.done():
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the stream finished"""
+
+
+async def watch_client(
+    source: AsyncIterator[T],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat_interval: float = 15.0,
+    poll_interval: float = 0.5,
+) -> AsyncIterator[Optional[T]]:
+    """Items from source, or None whenever a heartbeat is due
+
+    The client is polled while waiting for the next item. Once it has gone
+    away the pending read is cancelled, which closes source (and with it the
+    upstream request), and ClientDisconnected is raised.
+    """
+    loop = asyncio.get_event_loop()
+    pending: Optional["asyncio.Future"] = None
+    last_sent = loop.time()
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(source.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=poll_interval)
+            if done:
+                try:
+                    item = pending.result()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    pending = None
+                last_sent = loop.time()
+                yield item
+                continue
+
+            if await is_disconnected():
+                raise ClientDisconnected()
+            if loop.time() - last_sent >= heartbeat_interval:
+                last_sent = loop.time()
+                yield None
+    finally:
+        if pending is not None:
+            pending.cancel()
+        else:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+class StreamMetrics:
+    """Outcome counters for streamed generations"""
+
+    OUTCOMES = ("completed", "cancelled", "failed")
+
+    def __init__(self):
+        self.started = 0
+        self.outcomes = {outcome: 0 for outcome in self.OUTCOMES}
+        self.partial_replies_saved = 0
+        self.heartbeats = 0
+        self.frames = 0
+        self.tokens = 0
+
+    @property
+    def active(self) -> int:
+        return self.started - sum(self.outcomes.values())
+
+    def record(self, outcome: str) -> None:
+        self.outcomes[outcome] += 1
+
+    def sent(self, batch: TokenBatch) -> None:
+        self.frames += 1
+        self.tokens += batch.tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "started": self.started,
+            **self.outcomes,
+            "partial_replies_saved": self.partial_replies_saved,
+            "heartbeats": self.heartbeats,
+            "frames": self.frames,
+            "tokens_per_frame": round(self.tokens / self.frames, 2) if self.frames else 0.0,
+        }
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from assistant.messages import Message
+from assistant.model_state import message_key
+from assistant.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Summarize this conversation between a customer and the Shiraji Group construction assistant in at most {words} words.
+Keep every concrete detail: project type, location, size, budget, timeline, services, contact details and open questions.
+
+EXISTING SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}
+
+SUMMARY:"""
+
+
+class _Summary:
+    __slots__ = ("text", "covered")
+
+    def __init__(self, text: str, covered: str):
+        self.text = text
+        self.covered = covered
+
+
+class ConversationSummarizer:
+    """Folds turns that fall out of the prompt window into a rolling summary
+
+    Summaries are produced by background tasks after a reply has been sent,
+    so they never add latency to a request. A turn always uses the latest
+    finished summary, and prompt size stays bounded while an update runs.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str, str], Awaitable[Optional[str]]],
+        counter: Optional[TokenCounter] = None,
+        window: int = 6,
+        max_summary_tokens: int = 150,
+        max_message_tokens: int = 200,
+        max_conversations: int = 5000,
+        enabled: bool = True,
+    ):
+        self.generate = generate
+        self.counter = counter or TokenCounter()
+        self.window = window
+        self.max_summary_tokens = max_summary_tokens
+        self.max_message_tokens = max_message_tokens
+        self.max_conversations = max_conversations
+        self.enabled = enabled
+        self._summaries: "OrderedDict[str, _Summary]" = OrderedDict()
+        self._tasks: Dict[str, "asyncio.Task"] = {}
+        self._background: Set["asyncio.Task"] = set()
+
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+
+    def get(self, conversation_id: str) -> Optional[str]:
+        summary = self._summaries.get(conversation_id)
+        if summary is None:
+            return None
+        self._summaries.move_to_end(conversation_id)
+        return summary.text
+
+    def forget(self, conversation_id: str) -> None:
+        self._summaries.pop(conversation_id, None)
+        task = self._tasks.pop(conversation_id, None)
+        if task is not None:
+            task.cancel()
+
+    def _pending(self, conversation_id: str, history: List[Message]) -> List[Message]:
+        """Messages older than the prompt window that the summary does not cover yet"""
+        older = history[:-self.window] if len(history) > self.window else []
+        summary = self._summaries.get(conversation_id)
+        if summary is None or not older:
+            return older
+        keys = [message_key(message) for message in older]
+        if summary.covered in keys:
+            return older[keys.index(summary.covered) + 1:]
+        # The covered message was trimmed from history; everything left is newer
+        return older
+
+    def schedule(self, conversation_id: str, history: List[Message]) -> None:
+        """Start a background summary update if turns have fallen out of the window"""
+        if not self.enabled or conversation_id in self._tasks:
+            return
+        pending = self._pending(conversation_id, history)
+        if not pending:
+            return
+        self.scheduled += 1
+        task = asyncio.ensure_future(self._summarize(conversation_id, pending))
+        self._tasks[conversation_id] = task
+        self._background.add(task)
+        task.add_done_callback(lambda t: self._finished(conversation_id, t))
+
+    def _finished(self, conversation_id: str, task: "asyncio.Task") -> None:
+        self._background.discard(task)
+        if self._tasks.get(conversation_id) is task:
+            del self._tasks[conversation_id]
+
+    async def _summarize(self, conversation_id: str, pending: List[Message]) -> None:
+        previous = self._summaries.get(conversation_id)
+        messages = "\n".join(
+            f"{message.role.upper()}: {self.counter.truncate(message.content, self.max_message_tokens)}"
+            for message in pending
+        )
+        prompt = SUMMARY_PROMPT.format(
+            words=max(self.max_summary_tokens * 3 // 4, 20),
+            summary=previous.text if previous else "(none)",
+            messages=messages,
+        )
+        try:
+            text = await self.generate(prompt, conversation_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Conversation summary failed for {conversation_id}: {e}")
+            return
+        if not text:
+            self.failed += 1
+            return
+
+        self._summaries[conversation_id] = _Summary(
+            self.counter.truncate(text.strip(), self.max_summary_tokens), message_key(pending[-1])
+        )
+        self._summaries.move_to_end(conversation_id)
+        while len(self._summaries) > self.max_conversations:
+            self._summaries.popitem(last=False)
+        self.completed += 1
+
+    async def close(self) -> None:
+        for task in list(self._background):
+            task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "summaries": len(self._summaries),
+            "in_progress": len(self._tasks),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
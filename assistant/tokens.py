@@ -0,0 +1,60 @@
+import logging
+import re
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Approximates a BPE tokenizer: words split into pieces of up to four
+# characters, and every punctuation mark counts as its own token.
+_APPROX_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class TokenCounter:
+    """Local token counting and truncation for prompt budgeting
+
+    Uses the model's own tokenizer when a HuggingFace ``tokenizer.json`` is
+    configured and the ``tokenizers`` package is installed, and a fast
+    regex approximation otherwise.
+    """
+
+    def __init__(self, tokenizer_path: Optional[str] = None):
+        self._tokenizer = None
+        if tokenizer_path:
+            try:
+                from tokenizers import Tokenizer
+                self._tokenizer = Tokenizer.from_file(tokenizer_path)
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer {tokenizer_path}: {e}; using approximate counts")
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Character span of every token in text"""
+        if self._tokenizer is not None:
+            return [span for span in self._tokenizer.encode(text, add_special_tokens=False).offsets if span[1] > span[0]]
+        return [match.span() for match in _APPROX_TOKEN.finditer(text)]
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return sum(1 for _ in _APPROX_TOKEN.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to max_tokens, keeping its beginning and end around a marker"""
+        spans = self.spans(text)
+        if len(spans) <= max_tokens:
+            return text
+        # One token is reserved for the ellipsis marker
+        keep = max_tokens - 1
+        if keep <= 0:
+            return ""
+        head = max(1, (keep * 2) // 3)
+        tail = keep - head
+        truncated = text[:spans[head - 1][1]].rstrip() + " \u2026"
+        if tail > 0:
+            truncated += " " + text[spans[-tail][0]:].lstrip()
+        return truncated
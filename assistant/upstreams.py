@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+import httpx
+
+from assistant.ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+ROUTING_STRATEGIES = ("least_outstanding", "ewma")
+
+
+class Upstream:
+    """One Ollama server, with its routing load and health state"""
+
+    def __init__(self, client: OllamaClient, ewma_alpha: float = 0.3):
+        self.client = client
+        self.name = client.base_url
+        self.ewma_alpha = ewma_alpha
+        self.healthy = True
+        self.probed = False
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.last_probe_at: Optional[float] = None
+        self.last_probe_error: Optional[str] = None
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+            return
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += self.ewma_alpha * (latency - self.ewma_latency)
+
+    def probe_result(self, ok: bool, error: Optional[str], eject_after: int, reinstate_after: int) -> None:
+        self.probed = True
+        self.last_probe_at = time.time()
+        self.last_probe_error = error
+        if ok:
+            self.consecutive_failures = 0
+            self.consecutive_successes += 1
+            if not self.healthy and self.consecutive_successes >= reinstate_after:
+                self.healthy = True
+                logger.info(f"Ollama upstream {self.name} reinstated")
+        else:
+            self.consecutive_successes = 0
+            self.consecutive_failures += 1
+            if self.healthy and self.consecutive_failures >= eject_after:
+                self.healthy = False
+                self.ejections += 1
+                logger.warning(f"Ollama upstream {self.name} ejected: {error}")
+
+    @property
+    def state(self) -> str:
+        if not self.probed:
+            return "unknown"
+        return "healthy" if self.healthy else "ejected"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.name,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "ejections": self.ejections,
+            "last_probe_at": self.last_probe_at,
+            "last_probe_error": self.last_probe_error,
+            "pool": self.client.pool_stats(),
+        }
+
+
+class UpstreamPool:
+    """Routes Ollama calls across several servers and probes their health in the background
+
+    Exposes the same calls as OllamaClient. Each call goes to the healthy
+    upstream with the fewest outstanding requests ("least_outstanding") or the
+    lowest expected latency ("ewma": latency EWMA scaled by outstanding load).
+    The prober ejects an upstream after ``eject_after`` consecutive failed
+    probes and reinstates it after ``reinstate_after`` successful ones. If
+    every upstream is ejected, calls still go out rather than failing fast.
+    """
+
+    def __init__(
+        self,
+        clients: Iterable[OllamaClient],
+        strategy: str = "least_outstanding",
+        probe_interval: float = 5.0,
+        eject_after: int = 2,
+        reinstate_after: int = 2,
+        ewma_alpha: float = 0.3,
+    ):
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Unknown routing strategy {strategy!r}; expected one of {', '.join(ROUTING_STRATEGIES)}")
+        self.upstreams = [Upstream(client, ewma_alpha) for client in clients]
+        if not self.upstreams:
+            raise ValueError("UpstreamPool needs at least one upstream")
+        self.strategy = strategy
+        self.probe_interval = probe_interval
+        self.eject_after = eject_after
+        self.reinstate_after = reinstate_after
+        self._prober: Optional["asyncio.Task"] = None
+
+    async def start(self) -> None:
+        """Open every upstream's connection pool and start the prober (called from the app lifespan)"""
+        for upstream in self.upstreams:
+            await upstream.client.start()
+        if self._prober is None:
+            self._prober = asyncio.ensure_future(self._probe_loop())
+
+    async def close(self) -> None:
+        if self._prober is not None:
+            self._prober.cancel()
+            await asyncio.gather(self._prober, return_exceptions=True)
+            self._prober = None
+        for upstream in self.upstreams:
+            await upstream.client.close()
+
+    async def _probe(self, upstream: Upstream) -> None:
+        try:
+            response = await upstream.client.tags()
+            ok = response.status_code == 200
+            error = None if ok else f"HTTP {response.status_code}"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        upstream.probe_result(ok, error, self.eject_after, self.reinstate_after)
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self._probe(upstream) for upstream in self.upstreams))
+
+    async def _probe_loop(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning(f"Ollama upstream probe failed: {e}")
+            await asyncio.sleep(self.probe_interval)
+
+    def available(self) -> int:
+        """Number of upstreams currently in rotation"""
+        return sum(1 for upstream in self.upstreams if upstream.healthy)
+
+    def pick(self, exclude: Iterable[Upstream] = ()) -> Upstream:
+        """Upstream for the next call, skipping any in exclude while others are left"""
+        excluded = set(map(id, exclude))
+        candidates = [upstream for upstream in self.upstreams if id(upstream) not in excluded] or self.upstreams
+        candidates = [upstream for upstream in candidates if upstream.healthy] or candidates
+
+        if self.strategy == "ewma":
+            load = lambda u: (u.ewma_latency or 0.0) * (u.outstanding + 1)
+        else:
+            load = lambda u: u.outstanding
+        lowest = min(load(upstream) for upstream in candidates)
+        # Break ties at random so equally loaded upstreams share the traffic
+        return random.choice([upstream for upstream in candidates if load(upstream) == lowest])
+
+    async def _call(self, method: str, payload: Optional[Dict[str, Any]], upstream: Optional[Upstream]) -> httpx.Response:
+        upstream = upstream or self.pick()
+        call = getattr(upstream.client, method)
+        upstream.outstanding += 1
+        started = time.monotonic()
+        try:
+            response = await (call() if payload is None else call(payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            upstream.record(time.monotonic() - started, False)
+            raise
+        finally:
+            upstream.outstanding -= 1
+        upstream.record(time.monotonic() - started, response.status_code < 500)
+        return response
+
+    async def generate(self, payload: Dict[str, Any], upstream: Optional[Upstream] = None) -> httpx.Response:
+        """Non-streaming POST /api/generate"""
+        return await self._call("generate", payload, upstream)
+
+    @asynccontextmanager
+    async def stream_generate(self, payload: Dict[str, Any],
+                              upstream: Optional[Upstream] = None) -> AsyncIterator[httpx.Response]:
+        """Streaming POST /api/generate; latency is measured to the response headers"""
+        upstream = upstream or self.pick()
+        upstream.outstanding += 1
+        started = time.monotonic()
+        opened = False
+        try:
+            async with upstream.client.stream_generate(payload) as response:
+                opened = True
+                upstream.record(time.monotonic() - started, response.status_code < 500)
+                yield response
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if not opened:
+                upstream.record(time.monotonic() - started, False)
+            raise
+        finally:
+            upstream.outstanding -= 1
+
+    async def embeddings(self, payload: Dict[str, Any]) -> httpx.Response:
+        """POST /api/embeddings"""
+        return await self._call("embeddings", payload, None)
+
+    async def tags(self) -> httpx.Response:
+        """GET /api/tags"""
+        return await self._call("tags", None, None)
+
+    def health(self) -> Dict[str, Any]:
+        """Last probe result for every upstream; never calls out"""
+        healthy = self.available()
+        return {
+            "status": "healthy" if healthy else "unhealthy",
+            "healthy_upstreams": healthy,
+            "upstreams": {upstream.name: upstream.state for upstream in self.upstreams},
+        }
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "probe_interval": self.probe_interval,
+            "upstreams": [upstream.stats() for upstream in self.upstreams],
+        }
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from datetime import time as clock_time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from assistant.upstreams import Upstream, UpstreamPool
+
+logger = logging.getLogger(__name__)
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _parse_day(value: str) -> int:
+    value = value.strip().lower()
+    return DAY_NAMES.index(value[:3]) if value[:3] in DAY_NAMES else int(value)
+
+
+class WarmHours:
+    """Days of the week and time of day during which models are kept loaded"""
+
+    def __init__(self, start: clock_time, end: clock_time, days: Iterable[int] = range(7)):
+        self.start = start
+        self.end = end
+        self.days = set(days)
+
+    @classmethod
+    def parse(cls, hours: str, days: str = "") -> Optional["WarmHours"]:
+        """From "08:00-20:00" and "mon-fri" (or "0-4", "0,1,2"); empty hours mean always"""
+        if not hours.strip():
+            return None
+        start, end = (clock_time.fromisoformat(part.strip()) for part in hours.split("-"))
+        weekdays = set()
+        for part in filter(None, (part.strip() for part in days.split(","))):
+            if "-" in part:
+                first, last = (_parse_day(day) for day in part.split("-"))
+                weekdays.update(range(first, last + 1))
+            else:
+                weekdays.add(_parse_day(part))
+        return cls(start, end, weekdays or range(7))
+
+    def __contains__(self, moment: datetime) -> bool:
+        if moment.weekday() not in self.days:
+            return False
+        now = moment.time()
+        if self.start <= self.end:
+            return self.start <= now < self.end
+        # Windows that run past midnight, e.g. 20:00-02:00
+        return now >= self.start or now < self.end
+
+
+class _ModelState:
+    __slots__ = ("warm", "warmed_at", "load_seconds", "failures", "cold", "warm_starts")
+
+    def __init__(self):
+        self.warm = False
+        self.warmed_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.failures = 0
+        self.cold = 0
+        self.warm_starts = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "warm": self.warm,
+            "warmed_at": self.warmed_at,
+            "last_load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_failures": self.failures,
+            "cold_starts": self.cold,
+            "warm_starts": self.warm_starts,
+        }
+
+
+class ModelWarmer:
+    """Loads models into Ollama at startup and keeps them resident during business hours
+
+    Each model is loaded on every upstream in rotation with an empty
+    generation, which Ollama treats as a load request. After that a ping
+    with ``keep_alive`` goes out every ``ping_interval`` seconds while the
+    time is within ``hours`` (always when hours is None); outside them the
+    models are left to unload. The warmer is ready once every model has
+    loaded at least once, and retries every ``retry_interval`` until then.
+    Generations whose Ollama ``load_duration`` is at least
+    ``cold_threshold`` seconds count as cold starts.
+    """
+
+    def __init__(
+        self,
+        pool: UpstreamPool,
+        models: Iterable[str],
+        keep_alive: str = "30m",
+        ping_interval: float = 240.0,
+        retry_interval: float = 10.0,
+        hours: Optional[WarmHours] = None,
+        cold_threshold: float = 1.0,
+        enabled: bool = True,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.pool = pool
+        self.models = {model: _ModelState() for model in dict.fromkeys(models)}
+        self.keep_alive = keep_alive
+        self.ping_interval = ping_interval
+        self.retry_interval = retry_interval
+        self.hours = hours
+        self.cold_threshold = cold_threshold
+        self.enabled = enabled
+        self.clock = clock
+        self._task: Optional["asyncio.Task"] = None
+        self._ready = not enabled
+
+        self.pings = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def in_hours(self) -> bool:
+        return self.hours is None or self.clock() in self.hours
+
+    async def start(self) -> None:
+        """Begin warming in the background (called from the app lifespan)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _load(self, model: str, upstream: Upstream) -> bool:
+        payload = {"model": model, "prompt": "", "stream": False, "keep_alive": self.keep_alive}
+        started = time.monotonic()
+        try:
+            response = await self.pool.generate(payload, upstream)
+        except Exception as e:
+            logger.warning(f"Loading {model} on {upstream.name} failed: {type(e).__name__}: {e}")
+            return False
+        if response.status_code != 200:
+            logger.warning(f"Loading {model} on {upstream.name} failed: HTTP {response.status_code}")
+            return False
+        self.models[model].load_seconds = time.monotonic() - started
+        return True
+
+    async def warm_all(self) -> bool:
+        """Load every model on every upstream in rotation; True when each model loaded somewhere"""
+        upstreams = [upstream for upstream in self.pool.upstreams if upstream.state != "ejected"] or self.pool.upstreams
+        all_warm = True
+        for model, state in self.models.items():
+            results = await asyncio.gather(*(self._load(model, upstream) for upstream in upstreams))
+            if any(results):
+                if not state.warm:
+                    logger.info(f"Model {model} is loaded ({state.load_seconds:.2f}s)")
+                state.warm = True
+                state.warmed_at = time.time()
+            else:
+                state.failures += 1
+                all_warm = False
+        self.pings += 1
+        return all_warm
+
+    async def _run(self) -> None:
+        while True:
+            if not self._ready or self.in_hours():
+                try:
+                    if await self.warm_all():
+                        self._ready = True
+                except Exception as e:
+                    logger.warning(f"Model warm-up failed: {e}")
+            await asyncio.sleep(self.ping_interval if self._ready else self.retry_interval)
+
+    def observe(self, model: str, data: Dict[str, Any]) -> str:
+        """"cold" or "warm" for a finished generation, from Ollama's load_duration"""
+        cold = (data.get("load_duration") or 0) / 1e9 >= self.cold_threshold
+        state = self.models.get(model)
+        if state is not None:
+            if cold:
+                state.cold += 1
+            else:
+                state.warm_starts += 1
+        return "cold" if cold else "warm"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ready": self._ready,
+            "keep_alive": self.keep_alive,
+            "ping_interval": self.ping_interval,
+            "in_hours": self.in_hours(),
+            "pings": self.pings,
+            "models": {model: state.as_dict() for model, state in self.models.items()},
+        }
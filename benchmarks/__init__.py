@@ -0,0 +1 @@
+"""Performance benchmarks for the chat service (run with ``python -m benchmarks.<name>``)"""
@@ -0,0 +1,98 @@
+"""Benchmark for conversation history: memory per conversation and serialization time
+
+Builds the same conversations as the previous dict records (ISO timestamp
+strings), as Message records, and as zlib-compressed idle entries, and
+measures their memory with tracemalloc. Then times serializing a history
+for the API: the previous endpoint returned the dicts, which FastAPI runs
+through jsonable_encoder and json.dumps; it now writes dump_messages
+(orjson) straight into the response. The repeated phrases make the
+compressed figure optimistic; real replies compress less well:
+
+    python -m benchmarks.bench_history --conversations 10000 --messages 20
+"""
+import argparse
+import json
+import time
+import tracemalloc
+import zlib
+from datetime import datetime
+from typing import Any, Callable, List
+
+from fastapi.encoders import jsonable_encoder
+
+from assistant.messages import Message, dump_messages, encode_messages
+
+PHRASES = (
+    "Hi, we are planning a four bedroom villa in Abu Dhabi and need a contractor.",
+    "We can help with that. Do you already have approved drawings, or do you need design services as well?",
+    "We have drawings. What would the construction cost be, roughly?",
+    "It depends on the specification; our team can prepare a detailed estimate after a site visit.",
+)
+
+
+def make_dicts(conversations: int, messages: int) -> List[List[dict]]:
+    return [
+        [{"role": "user" if index % 2 == 0 else "assistant",
+          # Each message gets its own string, as it would arriving from a request
+          "content": "".join([PHRASES[index % len(PHRASES)], ""]),
+          "timestamp": datetime.now().isoformat()}
+         for index in range(messages)]
+        for _ in range(conversations)
+    ]
+
+
+def make_messages(conversations: int, messages: int) -> List[List[Message]]:
+    return [
+        [Message("user" if index % 2 == 0 else "assistant", "".join([PHRASES[index % len(PHRASES)], ""]))
+         for index in range(messages)]
+        for _ in range(conversations)
+    ]
+
+
+def make_compressed(conversations: int, messages: int) -> List[bytes]:
+    return [zlib.compress(encode_messages(history)) for history in make_messages(conversations, messages)]
+
+
+def measure_memory(name: str, build: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    data = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    print(f"{name:<12} {size / 1024 / 1024:8.1f} MiB")
+    return size
+
+
+def measure_time(name: str, dump: Callable[[], Any], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        dump()
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f"{name:<12} {elapsed * 1e6:8.1f} us per history")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"Memory for {args.conversations} conversations of {args.messages} messages")
+    dicts = measure_memory("dicts", lambda: make_dicts(args.conversations, args.messages))
+    records = measure_memory("messages", lambda: make_messages(args.conversations, args.messages))
+    packed = measure_memory("compressed", lambda: make_compressed(args.conversations, args.messages))
+    print(f"messages use {records / dicts:.0%} and compressed {packed / dicts:.0%} of the dict records")
+
+    print(f"\nSerializing one history of {args.messages} messages for the API")
+    dict_history = make_dicts(1, args.messages)[0]
+    history = make_messages(1, args.messages)[0]
+    before = measure_time("fastapi", lambda: json.dumps(jsonable_encoder(dict_history)).encode(), args.rounds)
+    measure_time("json.dumps", lambda: json.dumps(dict_history).encode(), args.rounds)
+    after = measure_time("orjson", lambda: dump_messages(history), args.rounds)
+    print(f"dump_messages takes {after / before:.0%} of the previous endpoint's time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark for the streaming path: one SSE frame per token versus coalesced frames
+
+Runs many concurrent streams of Ollama-style chunks through the previous
+per-token loop (json.dumps per frame, ``+=`` accumulation) and through
+coalesce_tokens with a list buffer and pre-encoded frames, reporting frames
+and CPU time per stream. Each frame also costs an ASGI send and a socket
+write in the real service, which this does not include:
+
+    python -m benchmarks.bench_streaming --streams 200 --tokens 400 --tokens-per-second 200
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+from assistant.sse import coalesce_tokens, sse_event, sse_token_event
+
+WORDS = (" We", " can", " help", " with", " your", " villa", " project", " in", " Abu", " Dhabi", ".")
+
+
+async def fake_stream(tokens: int, tokens_per_second: float) -> AsyncIterator[Dict[str, Any]]:
+    interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+    for index in range(tokens):
+        await asyncio.sleep(interval)
+        yield {"model": "mistral", "response": WORDS[index % len(WORDS)], "done": False}
+    yield {"model": "mistral", "response": "", "done": True, "eval_count": tokens}
+
+
+async def source_only(tokens: int, tokens_per_second: float, sink: List[int]) -> None:
+    """The cost of the fake upstream itself, to subtract from the other rows"""
+    async for _ in fake_stream(tokens, tokens_per_second):
+        pass
+
+
+async def per_token(tokens: int, tokens_per_second: float, sink: List[int]) -> None:
+    """The previous loop"""
+    full_response = ""
+    event_id = 0
+    async for data in fake_stream(tokens, tokens_per_second):
+        if "response" in data:
+            token = data["response"]
+            full_response += token
+            event_id += 1
+            sink.append(len(sse_event({'token': token, 'done': data.get('done', False)}, event_id)))
+
+
+async def coalesced(tokens: int, tokens_per_second: float, interval: float, max_bytes: int, sink: List[int]) -> None:
+    reply_parts: List[str] = []
+    event_id = 0
+    async for batch in coalesce_tokens(fake_stream(tokens, tokens_per_second), interval, max_bytes):
+        reply_parts.append(batch.text)
+        event_id += 1
+        sink.append(len(sse_token_event(batch.text, event_id, batch.done is not None)))
+    "".join(reply_parts)
+
+
+async def measure(name: str, make, streams: int) -> None:
+    sink: List[int] = []
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*(make(sink) for _ in range(streams)))
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    print(f"{name:<22} {len(sink) / streams:>10.1f} {len(sink) / wall:>12.0f} "
+          f"{sum(sink) / streams / 1024:>10.1f} {cpu / streams * 1000:>12.2f} {wall:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=400, help="tokens per stream")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="per stream; 0 for as fast as possible")
+    parser.add_argument("--interval-ms", type=float, default=50.0, help="coalescing window")
+    parser.add_argument("--max-bytes", type=int, default=1024)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        print(f"{'':<22} {'frames/str':>10} {'frames/sec':>12} {'KiB/str':>10} {'CPU ms/str':>12} {'wall s':>8}")
+        await measure("source only", lambda sink: source_only(args.tokens, args.tokens_per_second, sink), args.streams)
+        await measure("per token", lambda sink: per_token(args.tokens, args.tokens_per_second, sink), args.streams)
+        await measure(
+            f"coalesced {args.interval_ms:g} ms",
+            lambda sink: coalesced(args.tokens, args.tokens_per_second, args.interval_ms / 1000, args.max_bytes, sink),
+            args.streams,
+        )
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Fake Ollama server for load tests
+
+Serves /api/generate (streaming and non-streaming), /api/tags and
+/api/embeddings with a configurable time to first token, token rate and
+error rate, so the chat service can be measured without a GPU. With
+--load-time, a model idle for --unload-after seconds is "loaded" again
+before its next generation, and an empty prompt only loads the model:
+
+    python -m benchmarks.fake_ollama --port 11434 --ttft 0.3 --tokens-per-second 40 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ("We", " can", " help", " with", " your", " villa", " project", " in", " Abu", " Dhabi", ".")
+
+
+def create_app(ttft: float = 0.2, tokens_per_second: float = 40.0, tokens: int = 40,
+               error_rate: float = 0.0, tags_error_rate: float = 0.0, seed: int = 0,
+               load_time: float = 0.0, unload_after: float = 300.0) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+    rng = random.Random(seed)
+    interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+    counters = {"generate": 0, "stream": 0, "errors": 0, "cancelled": 0, "loads": 0}
+    loaded_until: Dict[str, float] = {}
+
+    def token(index: int) -> str:
+        return WORDS[index % len(WORDS)]
+
+    async def load(model: str) -> float:
+        """Seconds spent loading model, which stays loaded for unload_after seconds"""
+        if loaded_until.get(model, 0.0) > time.monotonic() or not load_time:
+            loaded_until[model] = time.monotonic() + unload_after
+            return 0.001
+        counters["loads"] += 1
+        await asyncio.sleep(load_time)
+        loaded_until[model] = time.monotonic() + unload_after
+        return load_time
+
+    def final(body: Dict[str, Any], load_duration: float) -> Dict[str, Any]:
+        prompt_tokens = max(1, len(body.get("prompt", "")) // 4)
+        return {
+            "model": body.get("model"),
+            "done": True,
+            "load_duration": int(load_duration * 1e9),
+            "context": list(body.get("context") or []) + list(range(prompt_tokens + tokens)),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": prompt_tokens * 100_000,
+            "eval_count": tokens,
+            "eval_duration": int(tokens * interval * 1e9),
+            "total_duration": int((ttft + tokens * interval) * 1e9),
+        }
+
+    def fail() -> bool:
+        if error_rate and rng.random() < error_rate:
+            counters["errors"] += 1
+            return True
+        return False
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        num_predict = (body.get("options") or {}).get("num_predict")
+        count = min(tokens, num_predict) if num_predict else tokens
+        if fail():
+            return JSONResponse({"error": "fake upstream failure"}, status_code=500)
+        if not body.get("prompt"):
+            load_duration = await load(body.get("model"))
+            return {"model": body.get("model"), "response": "", "done": True, "done_reason": "load",
+                    "load_duration": int(load_duration * 1e9)}
+
+        if not body.get("stream", True):
+            counters["generate"] += 1
+            load_duration = await load(body.get("model"))
+            await asyncio.sleep(ttft + count * interval)
+            return {"response": "".join(token(i) for i in range(count)), **final(body, load_duration)}
+
+        counters["stream"] += 1
+
+        async def stream():
+            try:
+                load_duration = await load(body.get("model"))
+                await asyncio.sleep(ttft)
+                for index in range(count):
+                    if index:
+                        await asyncio.sleep(interval)
+                    yield json.dumps({"model": body.get("model"), "response": token(index), "done": False}) + "\n"
+                yield json.dumps({"response": "", **final(body, load_duration)}) + "\n"
+            except asyncio.CancelledError:
+                counters["cancelled"] += 1
+                raise
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.get("/api/tags")
+    async def tags():
+        if tags_error_rate and rng.random() < tags_error_rate:
+            return JSONResponse({"error": "fake upstream failure"}, status_code=500)
+        return {"models": [{"name": "mistral"}]}
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        return {"embedding": [((hash(prompt) >> shift) & 0xFF) / 255.0 for shift in range(0, 64, 2)]}
+
+    @app.get("/counters")
+    async def get_counters():
+        return counters
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--tokens", type=int, default=40, help="tokens per reply (capped by num_predict)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of /api/generate calls failing with 500")
+    parser.add_argument("--tags-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load-time", type=float, default=0.0, help="seconds to load a model that is not resident")
+    parser.add_argument("--unload-after", type=float, default=300.0, help="idle seconds before a model is unloaded")
+    args = parser.parse_args()
+
+    app = create_app(args.ttft, args.tokens_per_second, args.tokens, args.error_rate, args.tags_error_rate, args.seed,
+                     args.load_time, args.unload_after)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
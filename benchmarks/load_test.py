@@ -0,0 +1,351 @@
+"""Load test for the chat service against a fake Ollama server
+
+Starts benchmarks.fake_ollama and the chat service (main.py under uvicorn)
+as subprocesses, drives /chat, /chat/stream and /ws/chat at a target
+concurrency, and reports p50/p95/p99 latency, time to first token,
+throughput and memory growth as JSON so runs can be compared across commits:
+
+    python -m benchmarks.load_test --concurrency 32 --duration 20 --output bench-$(git rev-parse --short HEAD).json
+
+The semantic cache and the fast path are turned off by default so every
+request reaches the (fake) model; pass --service-env KEY=VALUE to change
+any setting of the service under test.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = [
+    "Hi, I'm planning a new villa in Abu Dhabi. Where do I start?",
+    "How much would a swimming pool installation cost?",
+    "Can you handle electrical and plumbing for a small office fit-out?",
+    "We need maintenance for our HVAC system, is that something you do?",
+    "What's the usual timeline for a villa renovation?",
+    "Could you send a quote for interior design of a 3 bedroom apartment?",
+]
+
+SCENARIOS = ("chat", "stream", "websocket")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process, from /proc (None where that is unavailable)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} during startup")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+@contextmanager
+def running(command: List[str], url: str, env: Dict[str, str], cwd: str) -> Iterator[subprocess.Popen]:
+    process = subprocess.Popen(command, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_until_up(url, process)
+        yield process
+    except RuntimeError:
+        process.kill()
+        sys.stderr.write(process.stderr.read().decode(errors="replace") if process.stderr else "")
+        raise
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Percentiles of a list of durations, in milliseconds"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def percentile(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+class Turn:
+    """One request of a worker: its message and the conversation it belongs to"""
+
+    __slots__ = ("message", "conversation_id")
+
+    def __init__(self, scenario: str, worker: int, number: int, turns_per_conversation: int):
+        # A unique suffix keeps identical requests from being coalesced
+        self.message = f"{MESSAGES[number % len(MESSAGES)]} (ref {worker}-{number})"
+        self.conversation_id = f"load-{scenario}-{worker}-{number // turns_per_conversation}"
+
+
+Driver = Callable[[Turn], Awaitable[Optional[float]]]
+
+
+async def run_scenario(name: str, make_driver: Callable[[], Awaitable[Tuple[Driver, Callable[[], Awaitable[None]]]]],
+                       concurrency: int, duration: float, turns_per_conversation: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def worker(index: int, deadline: float) -> None:
+        drive, close = await make_driver()
+        try:
+            number = 0
+            while time.monotonic() < deadline:
+                turn = Turn(name, index, number, turns_per_conversation)
+                number += 1
+                started = time.monotonic()
+                try:
+                    ttft = await drive(turn)
+                except Exception as e:
+                    kind = type(e).__name__
+                    errors[kind] = errors.get(kind, 0) + 1
+                    continue
+                latencies.append(time.monotonic() - started)
+                if ttft is not None:
+                    ttfts.append(ttft - started)
+        finally:
+            await close()
+
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(worker(index, deadline) for index in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    total = len(latencies) + sum(errors.values())
+    return {
+        "requests": total,
+        "completed": len(latencies),
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": summarize(latencies),
+        "ttft_ms": summarize(ttfts),
+    }
+
+
+class UnexpectedReply(Exception):
+    """The service answered, but not with a successful reply"""
+
+
+def chat_driver(base_url: str):
+    async def make():
+        client = httpx.AsyncClient(base_url=base_url, timeout=120.0)
+
+        async def drive(turn: Turn) -> Optional[float]:
+            response = await client.post("/chat", json={"message": turn.message, "conversation_id": turn.conversation_id})
+            if response.status_code != 200:
+                raise UnexpectedReply(f"HTTP {response.status_code}")
+            if response.json().get("served_by") == "error":
+                raise UnexpectedReply("error reply")
+            return None
+
+        return drive, client.aclose
+    return make
+
+
+def stream_driver(base_url: str):
+    async def make():
+        client = httpx.AsyncClient(base_url=base_url, timeout=120.0)
+
+        async def drive(turn: Turn) -> Optional[float]:
+            first_token = None
+            params = {"message": turn.message, "conversation_id": turn.conversation_id}
+            async with client.stream("GET", "/chat/stream", params=params) as response:
+                if response.status_code != 200:
+                    raise UnexpectedReply(f"HTTP {response.status_code}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[5:])
+                    if "error" in event:
+                        raise UnexpectedReply(event["error"])
+                    if first_token is None and event.get("token"):
+                        first_token = time.monotonic()
+                    if event.get("done"):
+                        return first_token
+            raise UnexpectedReply("stream ended before done")
+
+        return drive, client.aclose
+    return make
+
+
+def websocket_driver(base_url: str):
+    import websockets
+
+    async def make():
+        connection = await websockets.connect(base_url.replace("http", "ws", 1) + "/ws/chat", max_size=None)
+        counter = iter(range(1 << 62))
+
+        async def drive(turn: Turn) -> Optional[float]:
+            request_id = str(next(counter))
+            await connection.send(json.dumps({
+                "type": "chat", "id": request_id, "conversation_id": turn.conversation_id, "message": turn.message,
+            }))
+            first_token = None
+            while True:
+                frame = json.loads(await connection.recv())
+                if frame.get("id") != request_id:
+                    continue
+                if frame["type"] == "delta" and first_token is None:
+                    first_token = time.monotonic()
+                elif frame["type"] == "done":
+                    return first_token
+                elif frame["type"] in ("error", "cancelled"):
+                    raise UnexpectedReply(frame.get("error", frame["type"]))
+
+        return drive, connection.close
+    return make
+
+
+DRIVERS = {"chat": chat_driver, "stream": stream_driver, "websocket": websocket_driver}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per scenario")
+    parser.add_argument("--turns-per-conversation", type=int, default=4)
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake Ollama time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tags-error-rate", type=float, default=0.0)
+    parser.add_argument("--service-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the chat service (repeatable)")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if "websocket" in scenarios:
+        try:
+            import websockets  # noqa: F401
+        except ImportError:
+            print("Skipping the websocket scenario: the 'websockets' package is not installed", file=sys.stderr)
+            scenarios.remove("websocket")
+
+    ollama_port, service_port = free_port(), free_port()
+    ollama_url = f"http://127.0.0.1:{ollama_port}"
+    service_url = f"http://127.0.0.1:{service_port}"
+
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    service_env = dict(env, OLLAMA_BASE_URL=ollama_url, OLLAMA_BASE_URLS=ollama_url,
+                       SEMANTIC_CACHE_ENABLED="0", FAST_PATH_ENABLED="0", SPECULATION_ENABLED="0")
+    for item in args.service_env:
+        key, _, value = item.partition("=")
+        service_env[key] = value
+
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "turns_per_conversation": args.turns_per_conversation,
+            "fake_ollama": {
+                "ttft": args.ttft,
+                "tokens_per_second": args.tokens_per_second,
+                "tokens": args.tokens,
+                "error_rate": args.error_rate,
+                "tags_error_rate": args.tags_error_rate,
+            },
+            "service_env": args.service_env,
+        },
+        "scenarios": {},
+    }
+
+    fake_command = [
+        sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(ollama_port),
+        "--ttft", str(args.ttft), "--tokens-per-second", str(args.tokens_per_second), "--tokens", str(args.tokens),
+        "--error-rate", str(args.error_rate), "--tags-error-rate", str(args.tags_error_rate),
+    ]
+    service_command = [
+        sys.executable, "-m", "uvicorn", "main:app", "--port", str(service_port), "--log-level", "warning",
+    ]
+
+    # main.py serves ./static and ./templates relative to its working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "static"))
+        os.symlink(os.path.join(ROOT, "templates"), os.path.join(workdir, "templates"))
+
+        with running(fake_command, f"{ollama_url}/api/tags", env, ROOT), \
+                running(service_command, f"{service_url}/ready", service_env, workdir) as service:
+            for name in scenarios:
+                rss_before = rss_mb(service.pid)
+                result = asyncio.run(run_scenario(
+                    name, DRIVERS[name](service_url), args.concurrency, args.duration, args.turns_per_conversation
+                ))
+                rss_after = rss_mb(service.pid)
+                result["memory_mb"] = {
+                    "rss_before": round(rss_before, 1) if rss_before is not None else None,
+                    "rss_after": round(rss_after, 1) if rss_after is not None else None,
+                    "growth": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+                }
+                report["scenarios"][name] = result
+                print(f"{name}: {result['throughput_rps']} req/s, p95 {result['latency_ms']['p95']} ms, "
+                      f"errors {result['error_rate']:.2%}", file=sys.stderr)
+            report["service_stats"] = httpx.get(f"{service_url}/stats", timeout=10.0).json()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
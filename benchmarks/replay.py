@@ -0,0 +1,288 @@
+"""Replays captured chat traffic against a build of the chat service and compares latencies
+
+Reads the JSONL segments the service writes with CAPTURE_ENABLED=1 and
+sends every turn again through the endpoint it arrived on, at its original
+offset from the start of the capture divided by --speed. Each
+conversation's turns go in their original order, one after another. The
+service is one already running (--target) or is started from
+--service-root against benchmarks.fake_ollama (the default) or a real
+Ollama (--ollama-url). The report has latency and time to first token
+percentiles per endpoint for the capture and for the replay, and the
+change between them. Captured first-token times are measured in the
+service, replayed ones at the client.
+
+    python -m benchmarks.replay captures/ --speed 2 --output replay-$(git rev-parse --short HEAD).json
+    python -m benchmarks.replay --diff replay-abc123.json replay-def456.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from benchmarks.load_test import DRIVERS, ROOT, free_port, git_commit, running, summarize
+
+PERCENTILES = ("p50", "p95", "p99", "mean", "max")
+
+
+class ReplayTurn:
+    """One captured turn, in the shape the load test drivers take"""
+
+    __slots__ = ("offset", "endpoint", "message", "conversation_id")
+
+    def __init__(self, offset: float, endpoint: str, message: str, conversation_id: str):
+        self.offset = offset
+        self.endpoint = endpoint
+        self.message = message
+        self.conversation_id = conversation_id
+
+
+def capture_files(paths: Iterable[str]) -> List[str]:
+    files: List[str] = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "capture-*.jsonl"))) if os.path.isdir(path) else [path])
+    return files
+
+
+def load_records(paths: Iterable[str], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Captured records for the replayable endpoints, oldest first"""
+    records = []
+    for path in capture_files(paths):
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("endpoint") in DRIVERS and record.get("message"):
+                    records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+def capture_summary(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Latency percentiles per endpoint as the service recorded them"""
+    summary: Dict[str, Any] = {}
+    for endpoint in DRIVERS:
+        selected = [record for record in records if record["endpoint"] == endpoint]
+        if not selected:
+            continue
+        failed = [record for record in selected
+                  if record.get("served_by") in ("error", "overloaded") or record.get("outcome") not in (None, "completed")]
+        summary[endpoint] = {
+            "requests": len(selected),
+            "error_rate": round(len(failed) / len(selected), 4),
+            "latency_ms": summarize([record["seconds"] for record in selected if record not in failed]),
+            "ttft_ms": summarize([record["first_token"] for record in selected if record.get("first_token") is not None]),
+        }
+    return summary
+
+
+async def replay(records: List[Dict[str, Any]], base_url: str, speed: float, run_id: str) -> Dict[str, Any]:
+    """Send the captured turns to base_url on their (scaled) schedule"""
+    if not records:
+        return {}
+    first = records[0]["ts"]
+    chains: Dict[str, List[ReplayTurn]] = {}
+    for record in records:
+        conversation_id = f"replay-{run_id}-{record['conversation']}"
+        offset = (record["ts"] - first) / speed if speed > 0 else 0.0
+        chains.setdefault(conversation_id, []).append(
+            ReplayTurn(offset, record["endpoint"], record["message"], conversation_id)
+        )
+
+    results = {endpoint: {"latencies": [], "ttfts": [], "errors": {}, "late": []} for endpoint in DRIVERS}
+    # HTTP drivers are shared; a WebSocket connection serves one conversation at a time
+    shared = {endpoint: await DRIVERS[endpoint](base_url)() for endpoint in ("chat", "stream")}
+    started = time.monotonic()
+
+    async def run_chain(turns: List[ReplayTurn]) -> None:
+        socket = None
+        try:
+            for turn in turns:
+                delay = started + turn.offset - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                result = results[turn.endpoint]
+                # How far behind schedule the turn starts, because the conversation's previous turn ran long
+                result["late"].append(max(-delay, 0.0))
+                if turn.endpoint == "websocket":
+                    if socket is None:
+                        socket = await DRIVERS["websocket"](base_url)()
+                    drive = socket[0]
+                else:
+                    drive = shared[turn.endpoint][0]
+                sent = time.monotonic()
+                try:
+                    ttft = await drive(turn)
+                except Exception as e:
+                    kind = type(e).__name__
+                    result["errors"][kind] = result["errors"].get(kind, 0) + 1
+                    continue
+                result["latencies"].append(time.monotonic() - sent)
+                if ttft is not None:
+                    result["ttfts"].append(ttft - sent)
+        finally:
+            if socket is not None:
+                await socket[1]()
+
+    try:
+        await asyncio.gather(*(run_chain(turns) for turns in chains.values()))
+    finally:
+        for _, close in shared.values():
+            await close()
+    elapsed = time.monotonic() - started
+
+    summary: Dict[str, Any] = {}
+    for endpoint, result in results.items():
+        errors = sum(result["errors"].values())
+        total = len(result["latencies"]) + errors
+        if not total:
+            continue
+        summary[endpoint] = {
+            "requests": total,
+            "errors": result["errors"],
+            "error_rate": round(errors / total, 4),
+            "throughput_rps": round(len(result["latencies"]) / elapsed, 2),
+            "latency_ms": summarize(result["latencies"]),
+            "ttft_ms": summarize(result["ttfts"]),
+            "behind_schedule_ms": summarize(result["late"]),
+        }
+    return summary
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Percentile changes per endpoint between two summaries"""
+    diff: Dict[str, Any] = {}
+    for endpoint in sorted(set(before) & set(after)):
+        diff[endpoint] = {"error_rate": {"before": before[endpoint]["error_rate"], "after": after[endpoint]["error_rate"]}}
+        for metric in ("latency_ms", "ttft_ms"):
+            rows = {}
+            for name in PERCENTILES:
+                old, new = before[endpoint][metric][name], after[endpoint][metric][name]
+                if old is None or new is None:
+                    continue
+                rows[name] = {"before": old, "after": new,
+                              "change_pct": round((new - old) / old * 100, 1) if old else None}
+            diff[endpoint][metric] = rows
+    return diff
+
+
+def print_diff(diff: Dict[str, Any]) -> None:
+    for endpoint, metrics in diff.items():
+        for metric in ("latency_ms", "ttft_ms"):
+            for name, row in metrics[metric].items():
+                change = f"{row['change_pct']:+.1f}%" if row["change_pct"] is not None else "n/a"
+                print(f"{endpoint:<10} {metric:<11} {name:<5} {row['before']:>10} -> {row['after']:>10} ({change})",
+                      file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="*", help="capture segment files or directories")
+    parser.add_argument("--diff", nargs=2, metavar=("BEFORE", "AFTER"), help="compare the replays of two reports")
+    parser.add_argument("--speed", type=float, default=1.0, help="timing scale: 2 replays twice as fast, 0 all at once")
+    parser.add_argument("--limit", type=int, help="replay only the first N turns")
+    parser.add_argument("--run-id", default=None, help="prefix for replayed conversation ids (default: the time)")
+    parser.add_argument("--target", help="URL of a running service; otherwise one is started")
+    parser.add_argument("--service-root", default=ROOT, help="checkout whose main.py is started")
+    parser.add_argument("--ollama-url", help="real Ollama for a started service; otherwise the fake server")
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake Ollama time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--service-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for a started service (repeatable)")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    if args.diff:
+        reports = []
+        for path in args.diff:
+            with open(path) as f:
+                reports.append(json.load(f))
+        diff = compare(reports[0]["replay"], reports[1]["replay"])
+        print_diff(diff)
+        print(json.dumps({"before": reports[0].get("commit"), "after": reports[1].get("commit"), "diff": diff}, indent=2))
+        return
+    if not args.captures:
+        parser.error("give capture files or directories, or --diff")
+
+    records = load_records(args.captures, args.limit)
+    if not records:
+        parser.error("no replayable records found")
+    if any(record["endpoint"] == "websocket" for record in records):
+        try:
+            import websockets  # noqa: F401
+        except ImportError:
+            parser.error("replaying websocket turns needs the 'websockets' package")
+    service_root = os.path.abspath(args.service_root)
+    report: Dict[str, Any] = {
+        "commit": git_commit() if service_root == ROOT and not args.target else None,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "captures": args.captures,
+            "turns": len(records),
+            "captured_seconds": round(records[-1]["ts"] - records[0]["ts"], 3),
+            "speed": args.speed,
+            "target": args.target,
+            "service_root": None if args.target else service_root,
+            "ollama": args.ollama_url or (None if args.target else "fake"),
+            "service_env": args.service_env,
+        },
+        "capture": capture_summary(records),
+    }
+    run_id = args.run_id or datetime.now().strftime("%Y%m%d%H%M%S")
+
+    with ExitStack() as stack:
+        base_url = args.target
+        if base_url is None:
+            env = dict(os.environ, PYTHONPATH=service_root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            ollama_url = args.ollama_url
+            if ollama_url is None:
+                ollama_port = free_port()
+                ollama_url = f"http://127.0.0.1:{ollama_port}"
+                stack.enter_context(running([
+                    sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(ollama_port), "--ttft", str(args.ttft),
+                    "--tokens-per-second", str(args.tokens_per_second), "--tokens", str(args.tokens),
+                ], f"{ollama_url}/api/tags", dict(os.environ, PYTHONPATH=ROOT), ROOT))
+            service_env = dict(env, OLLAMA_BASE_URL=ollama_url, OLLAMA_BASE_URLS=ollama_url, CAPTURE_ENABLED="0")
+            for item in args.service_env:
+                key, _, value = item.partition("=")
+                service_env[key] = value
+            # main.py serves ./static and ./templates relative to its working directory
+            workdir = stack.enter_context(tempfile.TemporaryDirectory())
+            os.makedirs(os.path.join(workdir, "static"))
+            os.symlink(os.path.join(service_root, "templates"), os.path.join(workdir, "templates"))
+            service_port = free_port()
+            base_url = f"http://127.0.0.1:{service_port}"
+            stack.enter_context(running([
+                sys.executable, "-m", "uvicorn", "main:app", "--port", str(service_port), "--log-level", "warning",
+            ], f"{base_url}/ready", service_env, workdir))
+
+        report["replay"] = asyncio.run(replay(records, base_url, args.speed, run_id))
+        try:
+            report["service_stats"] = httpx.get(f"{base_url}/stats", timeout=10.0).json()
+        except httpx.HTTPError:
+            report["service_stats"] = None
+
+    report["diff"] = compare(report["capture"], report["replay"])
+    print_diff(report["diff"])
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,9 @@ DEBUG = int(os.environ.get('DEBUG', 0))
 
 # ALLOWED_HOSTS from environment variable
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',') if os.environ.get('ALLOWED_HOSTS') else ['localhost', '127.0.0.1']
+# Container healthchecks call /ready/ on localhost
+if 'localhost' not in ALLOWED_HOSTS:
+    ALLOWED_HOSTS.append('localhost')
 
 # CSRF trusted origins from environment variable
 CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', '').split(',') if os.environ.get('CSRF_TRUSTED_ORIGINS') else []
@@ -54,6 +57,11 @@ ODOO_USERNAME = os.environ.get('ODOO_USERNAME', 'odoo-admin')  # Odoo user email
 ODOO_PASSWORD = os.environ.get('ODOO_PASSWORD', 'toolbandima198607050@')  # Odoo user password
 ODOO_API_TIMEOUT = int(os.environ.get('ODOO_API_TIMEOUT', '30'))
 
+# Knowledge feed for the chat assistant's search index (core/knowledge.py); off when no Redis URL is set
+KNOWLEDGE_REDIS_URL = os.environ.get('KNOWLEDGE_REDIS_URL', os.environ.get('REDIS_URL'))
+KNOWLEDGE_KEY_PREFIX = os.environ.get('KNOWLEDGE_KEY_PREFIX', 'shiraji:knowledge')
+KNOWLEDGE_STREAM_MAXLEN = int(os.environ.get('KNOWLEDGE_STREAM_MAXLEN', '10000'))
+
 # Email settings for notifications
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.zoho.com')
@@ -109,6 +117,9 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'password'),
         'HOST': os.environ.get('POSTGRES_HOST', 'db'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Keep connections open between requests, so a warmed-up worker does not reconnect for each one
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -0,0 +1,112 @@
+"""Publishes website content to the chat assistant's knowledge index
+
+Every saved or deleted Service, Project, Job and Testimonial is written to
+a Redis hash of documents and appended to a change stream, which the
+assistant (assistant/knowledge.py) follows to keep its search index
+current. Nothing is published when KNOWLEDGE_REDIS_URL is not set.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import Job, Project, Service, Testimonial
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None and settings.KNOWLEDGE_REDIS_URL:
+        import redis
+        _client = redis.Redis.from_url(settings.KNOWLEDGE_REDIS_URL, decode_responses=True)
+    return _client
+
+
+def document_id(instance):
+    return f"{instance._meta.model_name}:{instance.pk}"
+
+
+def document_for(instance):
+    """The searchable document for a row, or None when it should not be searchable"""
+    if isinstance(instance, Service):
+        return {"kind": "service", "title": instance.title, "text": instance.description}
+    if isinstance(instance, Project):
+        text = f"{instance.get_category_display()} project completed {instance.completed_date:%B %Y}. {instance.description}"
+        return {"kind": "project", "title": instance.title, "text": text}
+    if isinstance(instance, Job):
+        if not instance.is_active:
+            return None
+        requirements = "; ".join(instance.get_requirements_list())
+        text = (f"{instance.get_job_type_display()} role in {instance.department}, {instance.location}. "
+                f"{instance.description} Requirements: {requirements}")
+        return {"kind": "job", "title": instance.title, "text": text}
+    if isinstance(instance, Testimonial):
+        author = ", ".join(part for part in (instance.name, instance.position, instance.company) if part)
+        return {"kind": "testimonial", "title": author, "text": instance.quote}
+    return None
+
+
+def all_documents():
+    for model in (Service, Project, Job, Testimonial):
+        for instance in model.objects.all():
+            document = document_for(instance)
+            if document is not None:
+                yield {"id": document_id(instance), **document}
+
+
+def publish(doc_id, document):
+    """Store the document (or delete it, when None) and record the change on the stream"""
+    client = get_client()
+    if client is None:
+        return
+    prefix = settings.KNOWLEDGE_KEY_PREFIX
+    try:
+        pipe = client.pipeline()
+        if document is None:
+            pipe.hdel(f"{prefix}:docs", doc_id)
+            change = {"op": "delete", "id": doc_id}
+        else:
+            payload = json.dumps({"id": doc_id, **document})
+            pipe.hset(f"{prefix}:docs", doc_id, payload)
+            change = {"op": "upsert", "id": doc_id, "doc": payload}
+        pipe.xadd(f"{prefix}:changes", change, maxlen=settings.KNOWLEDGE_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+    except Exception as e:
+        # The site must keep working when the assistant's Redis is down; sync_knowledge repairs the index
+        logger.warning(f"Could not publish knowledge change for {doc_id}: {str(e)}")
+
+
+def rebuild():
+    """Replace the stored documents with the current database contents; returns how many were published"""
+    client = get_client()
+    if client is None:
+        return 0
+    prefix = settings.KNOWLEDGE_KEY_PREFIX
+    documents = list(all_documents())
+    stale = set(client.hkeys(f"{prefix}:docs")) - {document["id"] for document in documents}
+    for doc_id in stale:
+        publish(doc_id, None)
+    for document in documents:
+        publish(document["id"], {key: value for key, value in document.items() if key != "id"})
+    return len(documents)
+
+
+def on_save(sender, instance, **kwargs):
+    doc_id, document = document_id(instance), document_for(instance)
+    transaction.on_commit(lambda: publish(doc_id, document))
+
+
+def on_delete(sender, instance, **kwargs):
+    doc_id = document_id(instance)
+    transaction.on_commit(lambda: publish(doc_id, None))
+
+
+def connect_signals():
+    for model in (Service, Project, Job, Testimonial):
+        post_save.connect(on_save, sender=model, dispatch_uid=f"knowledge_save_{model.__name__}")
+        post_delete.connect(on_delete, sender=model, dispatch_uid=f"knowledge_delete_{model.__name__}")
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.knowledge import all_documents, get_client, rebuild
+
+
+class Command(BaseCommand):
+    help = "Publish every service, project, job and testimonial to the chat assistant's knowledge index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write the documents to this JSON file (for KNOWLEDGE_FILE) instead of Redis')
+
+    def handle(self, *args, **options):
+        if options['output']:
+            documents = list(all_documents())
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(documents, handle, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(documents)} documents to {options['output']}"))
+            return
+
+        if get_client() is None:
+            self.stderr.write("KNOWLEDGE_REDIS_URL is not set; use --output to export to a file")
+            return
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Published {count} documents"))
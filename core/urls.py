@@ -9,4 +9,5 @@ urlpatterns = [
     path('careers/', views.careers, name='careers'),
     path('contact/', views.contact, name='contact'),
     path('vendor-registration/', views.vendor_registration, name='vendor_registration'),
+    path('ready/', views.ready, name='ready'),
 ]
\ No newline at end of file
@@ -5,6 +5,7 @@ from django.contrib import messages
 from django.conf import settings
 from django.views.decorators.csrf import csrf_protect
 from django.http import JsonResponse
+from django.db import DatabaseError, connection
 from .forms import VendorRegistrationForm, ContactForm, QuoteRequestForm
 from .models import Service, Project, Testimonial, Job
 from .odoo_service import odoo_service
@@ -35,6 +36,16 @@ def index(request):
     }
     return render(request, 'core/index.html', context)
 
+def ready(request):
+    """Readiness probe for container healthchecks and rolling deploys: 200 once the database answers"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError as e:
+        logger.warning(f"Readiness check failed: {e}")
+        return JsonResponse({'status': 'database unavailable'}, status=503)
+    return JsonResponse({'status': 'ready'})
+
 def about(request):
     context = {
         # Add any context variables needed for the about page
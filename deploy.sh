@@ -2,11 +2,36 @@
 
 # Shiraji Deployment Script
 # This script pulls the latest code from git and deploys using docker-compose
+#
+# By default the web (Django) and chat (FastAPI) services are rolled out without downtime:
+# new containers start next to the old ones, nginx is switched to them once their
+# healthchecks pass (database reachable, models warm), and the old containers finish
+# their in-flight requests, streams and WebSocket turns before they stop.
+#
+# The drain protects open connections, not code consistency: web and chat bind-mount this
+# checkout (.:/app), so the pull in step 1 changes the files under the old containers too.
+# Until they stop, they run the modules they have already imported but read templates,
+# static files and anything imported later from the new code.
+#
+#   ./deploy.sh              rolling deploy
+#   ./deploy.sh --recreate   stop everything, then start again (first deploy, or when
+#                            the db or nginx services themselves change)
+#
+# READY_TIMEOUT   seconds new containers get to become healthy (default 360)
+# DRAIN_TIMEOUT   seconds old containers get to finish their work (default 60)
 
 set -e  # Exit immediately if a command exits with a non-zero status
 
+MODE="rolling"
+if [ "$1" = "--recreate" ]; then
+    MODE="recreate"
+fi
+READY_TIMEOUT=${READY_TIMEOUT:-360}
+DRAIN_TIMEOUT=${DRAIN_TIMEOUT:-60}
+UPSTREAMS_FILE="nginx/upstreams.conf"
+
 echo "=========================================="
-echo "Starting Shiraji Deployment Process"
+echo "Starting Shiraji Deployment Process ($MODE)"
 echo "=========================================="
 
 # Colors for output
@@ -15,35 +40,159 @@ YELLOW='\033[1;33m'
 RED='\033[0;31m'
 NC='\033[0m' # No Color
 
-# Step 1: Pull latest code from git
-echo -e "${YELLOW}[1/3] Pulling latest code from git...${NC}"
+# Container ids of a running service
+service_containers() {
+    docker compose ps -q "$1" | sort
+}
+
+container_name() {
+    docker inspect -f '{{.Name}}' "$1" | sed 's|^/||'
+}
+
+# Wait until every given container reports healthy; fails on unhealthy, exited or timeout
+wait_healthy() {
+    local deadline=$((SECONDS + READY_TIMEOUT))
+    local id status
+    for id in "$@"; do
+        while true; do
+            status=$(docker inspect -f '{{if .State.Health}}{{.State.Health.Status}}{{else}}{{.State.Status}}{{end}}' "$id")
+            case "$status" in
+                healthy) break ;;
+                unhealthy|exited|dead) echo -e "${RED}$(container_name "$id") is $status${NC}"; return 1 ;;
+            esac
+            if [ $SECONDS -ge $deadline ]; then
+                echo -e "${RED}$(container_name "$id") not healthy after ${READY_TIMEOUT}s${NC}"
+                return 1
+            fi
+            sleep 2
+        done
+        echo "  $(container_name "$id") is healthy"
+    done
+}
+
+# Point the nginx upstreams at the given containers
+write_upstreams() {
+    local web_ids=$1 chat_ids=$2 id
+    {
+        echo "# Written by deploy.sh during a rolling deploy"
+        echo "upstream django {"
+        for id in $web_ids; do echo "    server $(container_name "$id"):8000;"; done
+        echo "}"
+        echo ""
+        echo "upstream chat {"
+        for id in $chat_ids; do echo "    server $(container_name "$id"):8001;"; done
+        echo "    keepalive 16;"
+        echo "}"
+    } > "$UPSTREAMS_FILE.tmp"
+    mv "$UPSTREAMS_FILE.tmp" "$UPSTREAMS_FILE"
+}
+
+# Old nginx workers keep serving open connections until they finish (worker_shutdown_timeout)
+reload_nginx() {
+    docker compose exec -T nginx nginx -t -q && docker compose exec -T nginx nginx -s reload
+}
+
+# Put back the committed upstreams, which name the services rather than single containers
+restore_upstreams() {
+    git checkout -- "$UPSTREAMS_FILE"
+    reload_nginx
+}
+
+# A rolling deploy that was killed can leave its upstreams behind, which would also block the pull
+git checkout -- "$UPSTREAMS_FILE"
+
+# Step 1: Pull latest code from git (running containers see it at once through the bind mount)
+echo -e "${YELLOW}[1/5] Pulling latest code from git...${NC}"
 git pull origin main || {
     echo -e "${RED}Error: Failed to pull from git. Please check your git configuration.${NC}"
     exit 1
 }
 echo -e "${GREEN}✓ Code updated successfully${NC}"
 
-# Step 2: Stop running containers
-echo -e "${YELLOW}[2/4] Stopping running containers...${NC}"
-docker compose down || {
-    echo -e "${RED}Warning: Failed to stop containers. Continuing anyway...${NC}"
-}
-echo -e "${GREEN}✓ Containers stopped${NC}"
+OLD_WEB=$(service_containers web)
+OLD_CHAT=$(service_containers chat)
+if [ "$MODE" = "rolling" ] && { [ -z "$OLD_WEB" ] || [ -z "$OLD_CHAT" ] || [ -z "$(service_containers nginx)" ]; }; then
+    echo -e "${YELLOW}Nothing running to roll over from; doing a full start${NC}"
+    MODE="recreate"
+fi
 
-# Step 3: Build and start containers
-echo -e "${YELLOW}[3/4] Building and starting containers...${NC}"
-docker compose up -d --build || {
-    echo -e "${RED}Error: Failed to start containers${NC}"
-    exit 1
-}
-echo -e "${GREEN}✓ Containers started${NC}"
+if [ "$MODE" = "recreate" ]; then
+    # Step 2: Stop running containers
+    echo -e "${YELLOW}[2/5] Stopping running containers...${NC}"
+    docker compose down || {
+        echo -e "${RED}Warning: Failed to stop containers. Continuing anyway...${NC}"
+    }
+    echo -e "${GREEN}✓ Containers stopped${NC}"
 
-# Step 4: Collect static files
-echo -e "${YELLOW}[4/4] Collecting static files...${NC}"
-docker compose exec -T web python manage.py collectstatic --noinput || {
-    echo -e "${RED}Warning: Failed to collect static files${NC}"
-}
-echo -e "${GREEN}✓ Static files collected${NC}"
+    # Step 3: Build and start containers
+    echo -e "${YELLOW}[3/5] Building and starting containers...${NC}"
+    docker compose up -d --build || {
+        echo -e "${RED}Error: Failed to start containers${NC}"
+        exit 1
+    }
+    echo -e "${GREEN}✓ Containers started${NC}"
+
+    # Step 4: Collect static files
+    echo -e "${YELLOW}[4/5] Collecting static files...${NC}"
+    docker compose exec -T web python manage.py collectstatic --noinput || {
+        echo -e "${RED}Warning: Failed to collect static files${NC}"
+    }
+    echo -e "${GREEN}✓ Static files collected${NC}"
+    echo -e "${YELLOW}[5/5] Nothing to drain${NC}"
+else
+    # Step 2: Build and start new containers next to the old ones
+    echo -e "${YELLOW}[2/5] Building and starting new containers...${NC}"
+    docker compose build web chat
+    docker compose up -d --no-deps --no-recreate \
+        --scale web=$(( $(echo "$OLD_WEB" | wc -l) * 2 )) \
+        --scale chat=$(( $(echo "$OLD_CHAT" | wc -l) * 2 )) \
+        web chat
+    NEW_WEB=$(comm -13 <(echo "$OLD_WEB") <(service_containers web))
+    NEW_CHAT=$(comm -13 <(echo "$OLD_CHAT") <(service_containers chat))
+    echo -e "${GREEN}✓ Containers started${NC}"
+
+    # Step 3: Wait until they are ready, warm them and collect static files
+    echo -e "${YELLOW}[3/5] Waiting for new containers to become ready...${NC}"
+    if ! wait_healthy $NEW_WEB $NEW_CHAT; then
+        echo -e "${RED}Error: New containers did not become ready; removing them, the old ones keep serving${NC}"
+        docker rm -f $NEW_WEB $NEW_CHAT > /dev/null
+        exit 1
+    fi
+    for id in $NEW_WEB; do
+        # The first page view opens database connections and loads templates
+        docker exec "$id" python -c "import urllib.request; urllib.request.urlopen(urllib.request.Request('http://127.0.0.1:8000/', headers={'Host': 'localhost'}), timeout=30)" || true
+    done
+    docker exec "$(echo "$NEW_WEB" | head -n 1)" python manage.py collectstatic --noinput || {
+        echo -e "${RED}Warning: Failed to collect static files${NC}"
+    }
+    echo -e "${GREEN}✓ New containers ready${NC}"
+
+    # Step 4: Switch nginx to the new containers
+    echo -e "${YELLOW}[4/5] Switching nginx to the new containers...${NC}"
+    # However the script exits from here on (set -e included), the committed upstreams come back
+    trap restore_upstreams EXIT
+    write_upstreams "$NEW_WEB" "$NEW_CHAT"
+    reload_nginx || {
+        echo -e "${RED}Error: nginx rejected the new upstreams; removing the new containers${NC}"
+        docker rm -f $NEW_WEB $NEW_CHAT > /dev/null
+        exit 1
+    }
+    echo -e "${GREEN}✓ Traffic switched${NC}"
+
+    # Step 5: Drain and remove the old containers
+    echo -e "${YELLOW}[5/5] Draining old containers (up to ${DRAIN_TIMEOUT}s)...${NC}"
+    for id in $OLD_CHAT; do
+        # Waits for open streams and sockets; WebSocket clients are told to reconnect
+        docker exec "$id" python -c "import urllib.request; print(urllib.request.urlopen(urllib.request.Request('http://127.0.0.1:8001/drain?timeout=$DRAIN_TIMEOUT', method='POST'), timeout=$DRAIN_TIMEOUT + 10).read().decode())" &
+    done
+    wait || true
+    # SIGTERM: gunicorn and uvicorn stop accepting and finish in-flight requests
+    docker stop -t "$DRAIN_TIMEOUT" $OLD_WEB $OLD_CHAT > /dev/null
+    docker rm $OLD_WEB $OLD_CHAT > /dev/null
+    trap - EXIT
+    restore_upstreams
+    echo -e "${GREEN}✓ Old containers drained and removed${NC}"
+fi
 
 echo ""
 echo -e "${GREEN}==========================================${NC}"
@@ -1,35 +1,445 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-import httpx
 import json
 import asyncio
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any, Tuple
+from urllib.parse import quote
 import os
 from dotenv import load_dotenv
 
+from assistant.admission import AdaptiveConcurrencyLimiter, Overloaded
+from assistant.analyzer import ConversationAnalyzer
+from assistant.batch import BatchCounts, analyze_chunks, split_chunks
+from assistant.capture import TrafficCapture
+from assistant.coalescing import SingleFlight, StreamFanout, request_key
+from assistant.fast_path import FastPathResponder
+from assistant.knowledge import BM25Index, RedisKnowledgeFeed, load_file
+from assistant.conversation_store import create_conversation_store
+from assistant.draining import Drainer
+from assistant.events import AnalyticsSink
+from assistant.messages import Message, dump_messages
+from assistant.metrics import RATE_BUCKETS, TOKEN_BUCKETS, Registry
+from assistant.model_state import ModelStateCache
+from assistant.ollama_client import OllamaClient
+from assistant.prompts import PromptBudget, SmartPromptBuilder
+from assistant.resilience import CircuitBreaker, Hedger
+from assistant.routing import ModelRouter, Route, default_routing_config
+from assistant.semantic_cache import CacheProbe, HashingEmbedder, OllamaEmbedder, SemanticResponseCache, fingerprint
+from assistant.speculation import Speculation, SuggestionSpeculator
+from assistant.sse import (
+    HEARTBEAT, SSE_HEADERS, ClientDisconnected, StreamMetrics, TokenBatch, coalesce_tokens, sse_event, sse_token_event,
+    watch_client,
+)
+from assistant.summarizer import ConversationSummarizer
+from assistant.tokens import TokenCounter
+from assistant.upstreams import UpstreamPool
+from assistant.warmup import ModelWarmer, WarmHours
+
 load_dotenv()
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+# httpx logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Configuration
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "https://llm.shiraji.ae")
+# Comma-separated list of Ollama servers; defaults to the single OLLAMA_BASE_URL
+OLLAMA_BASE_URLS = [url.strip() for url in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL).split(",") if url.strip()]
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+
+# Shared Ollama connection pool
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "20"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+OLLAMA_HTTP2 = os.getenv("OLLAMA_HTTP2", "0").lower() in ("1", "true", "yes")
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_GENERATE_TIMEOUT = float(os.getenv("OLLAMA_GENERATE_TIMEOUT", "30"))
+OLLAMA_STREAM_TIMEOUT = float(os.getenv("OLLAMA_STREAM_TIMEOUT", "60"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "5"))
+
+# Upstream routing ("least_outstanding" or "ewma") and background health probing
+OLLAMA_ROUTING = os.getenv("OLLAMA_ROUTING", "least_outstanding")
+OLLAMA_PROBE_INTERVAL = float(os.getenv("OLLAMA_PROBE_INTERVAL", "5"))
+OLLAMA_EJECT_AFTER = int(os.getenv("OLLAMA_EJECT_AFTER", "2"))
+OLLAMA_REINSTATE_AFTER = int(os.getenv("OLLAMA_REINSTATE_AFTER", "2"))
+
+ollama_client = UpstreamPool(
+    [
+        OllamaClient(
+            base_url,
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+            keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+            http2=OLLAMA_HTTP2,
+            connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+            route_timeouts={
+                "generate": OLLAMA_GENERATE_TIMEOUT,
+                "stream": OLLAMA_STREAM_TIMEOUT,
+                "tags": OLLAMA_HEALTH_TIMEOUT,
+            },
+        )
+        for base_url in OLLAMA_BASE_URLS
+    ],
+    strategy=OLLAMA_ROUTING,
+    probe_interval=OLLAMA_PROBE_INTERVAL,
+    eject_after=OLLAMA_EJECT_AFTER,
+    reinstate_after=OLLAMA_REINSTATE_AFTER,
+)
+
+# Conversation history storage ("memory" per worker, or "redis" shared between workers)
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")
+REDIS_URL = os.getenv("REDIS_URL")
+CONVERSATION_MAX_COUNT = int(os.getenv("CONVERSATION_MAX_COUNT", "10000"))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "20"))
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "3600"))
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", str(64 * 1024 * 1024)))
+# zlib-compress conversations idle this many seconds (memory store; empty disables)
+CONVERSATION_COMPRESS_AFTER_SECONDS = os.getenv("CONVERSATION_COMPRESS_AFTER_SECONDS", "")
+CONVERSATION_PAGE_LIMIT = int(os.getenv("CONVERSATION_PAGE_LIMIT", "100"))
+
+conversation_store = create_conversation_store(
+    CONVERSATION_STORE,
+    redis_url=REDIS_URL,
+    max_conversations=CONVERSATION_MAX_COUNT,
+    max_messages=CONVERSATION_MAX_MESSAGES,
+    ttl_seconds=CONVERSATION_TTL_SECONDS,
+    max_bytes=CONVERSATION_MAX_BYTES,
+    compress_after=float(CONVERSATION_COMPRESS_AFTER_SECONDS) if CONVERSATION_COMPRESS_AFTER_SECONDS else None,
+)
+
+# Semantic response cache for repeated FAQ-style questions
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2048"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_STAGES = tuple(os.getenv("SEMANTIC_CACHE_STAGES", "greeting,exploration").split(","))
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "hashing")
+SEMANTIC_CACHE_EMBED_MODEL = os.getenv("SEMANTIC_CACHE_EMBED_MODEL", "nomic-embed-text")
+
+# Templated answers for simple company-fact questions (phone, email, location, services)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1").lower() in ("1", "true", "yes")
+FAST_PATH_THRESHOLD = float(os.getenv("FAST_PATH_THRESHOLD", "0.75"))
+
+# Adaptive admission control in front of Ollama
+UPSTREAM_INITIAL_CONCURRENCY = int(os.getenv("UPSTREAM_INITIAL_CONCURRENCY", "4"))
+UPSTREAM_MIN_CONCURRENCY = int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1"))
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "32"))
+UPSTREAM_LATENCY_TARGET = float(os.getenv("UPSTREAM_LATENCY_TARGET", "10"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "64"))
+UPSTREAM_MAX_QUEUE_PER_CONVERSATION = int(os.getenv("UPSTREAM_MAX_QUEUE_PER_CONVERSATION", "2"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "20"))
+
+upstream_limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=UPSTREAM_INITIAL_CONCURRENCY,
+    min_limit=UPSTREAM_MIN_CONCURRENCY,
+    max_limit=UPSTREAM_MAX_CONCURRENCY,
+    latency_target=UPSTREAM_LATENCY_TARGET,
+    max_queue=UPSTREAM_MAX_QUEUE,
+    max_queue_per_conversation=UPSTREAM_MAX_QUEUE_PER_CONVERSATION,
+    queue_timeout=UPSTREAM_QUEUE_TIMEOUT,
+)
+
+# Latency SLO for /chat: circuit breaker, hedged requests and a fallback model
+# (the SLO only cuts the primary model off when OLLAMA_FALLBACK_MODEL is set)
+CHAT_LATENCY_SLO = float(os.getenv("CHAT_LATENCY_SLO", "10"))
+OLLAMA_FALLBACK_MODEL = os.getenv("OLLAMA_FALLBACK_MODEL", "")
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATIO = float(os.getenv("BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1").lower() in ("1", "true", "yes")
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+
+circuit_breaker = CircuitBreaker(
+    window=BREAKER_WINDOW,
+    min_calls=BREAKER_MIN_CALLS,
+    failure_ratio=BREAKER_FAILURE_RATIO,
+    open_seconds=BREAKER_OPEN_SECONDS,
+)
+hedger = Hedger(
+    quantile=HEDGE_QUANTILE,
+    min_delay=HEDGE_MIN_DELAY,
+    max_delay=CHAT_LATENCY_SLO,
+    max_ratio=HEDGE_MAX_RATIO,
+    enabled=HEDGE_ENABLED,
+)
+served_by_counts = {"fast_path": 0, "cache": 0, "speculative": 0, "primary": 0, "hedge": 0, "fallback": 0, "error": 0}
+
+# Model and output length per turn, chosen from the intent analysis. MODEL_ROUTES
+# replaces the default table with JSON of the same shape (see assistant/routing.py).
+OLLAMA_FAST_MODEL = os.getenv("OLLAMA_FAST_MODEL", OLLAMA_MODEL)
+OLLAMA_LARGE_MODEL = os.getenv("OLLAMA_LARGE_MODEL", OLLAMA_MODEL)
+MODEL_ROUTES = os.getenv("MODEL_ROUTES")
+
+model_router = (
+    ModelRouter.from_json(MODEL_ROUTES) if MODEL_ROUTES
+    else ModelRouter.from_config(default_routing_config(OLLAMA_MODEL, OLLAMA_FAST_MODEL, OLLAMA_LARGE_MODEL))
+)
+
+# Per-conversation model context reuse across turns
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+CONTEXT_REUSE_ENABLED = os.getenv("CONTEXT_REUSE_ENABLED", "1").lower() in ("1", "true", "yes")
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1536"))
+CONTEXT_CACHE_MAX_TOKENS = int(os.getenv("CONTEXT_CACHE_MAX_TOKENS", "4000000"))
+CONTEXT_CACHE_MAX_CONVERSATIONS = int(os.getenv("CONTEXT_CACHE_MAX_CONVERSATIONS", "2000"))
+
+model_state = ModelStateCache(
+    max_conversations=CONTEXT_CACHE_MAX_CONVERSATIONS,
+    max_total_tokens=CONTEXT_CACHE_MAX_TOKENS,
+    max_context_tokens=CONTEXT_MAX_TOKENS,
+    enabled=CONTEXT_REUSE_ENABLED,
+)
+
+# Answers to the suggested follow-ups, generated in the background while upstream slots are spare.
+# SPECULATION_RESERVE_SLOTS slots are always left free for real turns, and a real turn that has to
+# queue anyway cancels a running speculation to take its slot.
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "1").lower() in ("1", "true", "yes")
+SPECULATION_TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "120"))
+SPECULATION_MAX_SUGGESTIONS = int(os.getenv("SPECULATION_MAX_SUGGESTIONS", "3"))
+SPECULATION_MAX_CONCURRENT = int(os.getenv("SPECULATION_MAX_CONCURRENT", "2"))
+SPECULATION_RESERVE_SLOTS = int(os.getenv("SPECULATION_RESERVE_SLOTS", "1"))
+
+# Model warm-up at startup and keep-alive pings during business hours (server local time).
+# MODEL_WARMUP_MODELS defaults to every routed model plus the fallback model.
+MODEL_WARMUP_ENABLED = os.getenv("MODEL_WARMUP_ENABLED", "1").lower() in ("1", "true", "yes")
+MODEL_WARMUP_MODELS = [model.strip() for model in os.getenv("MODEL_WARMUP_MODELS", "").split(",") if model.strip()]
+MODEL_KEEP_WARM_HOURS = os.getenv("MODEL_KEEP_WARM_HOURS", "")
+MODEL_KEEP_WARM_DAYS = os.getenv("MODEL_KEEP_WARM_DAYS", "")
+MODEL_KEEP_WARM_INTERVAL = float(os.getenv("MODEL_KEEP_WARM_INTERVAL", "240"))
+MODEL_WARMUP_RETRY_SECONDS = float(os.getenv("MODEL_WARMUP_RETRY_SECONDS", "10"))
+MODEL_COLD_LOAD_SECONDS = float(os.getenv("MODEL_COLD_LOAD_SECONDS", "1"))
+
+model_warmer = ModelWarmer(
+    ollama_client,
+    MODEL_WARMUP_MODELS or [route.model for route in model_router.routes.values()] + [OLLAMA_FALLBACK_MODEL or OLLAMA_MODEL],
+    keep_alive=OLLAMA_KEEP_ALIVE,
+    ping_interval=MODEL_KEEP_WARM_INTERVAL,
+    retry_interval=MODEL_WARMUP_RETRY_SECONDS,
+    hours=WarmHours.parse(MODEL_KEEP_WARM_HOURS, MODEL_KEEP_WARM_DAYS),
+    cold_threshold=MODEL_COLD_LOAD_SECONDS,
+    enabled=MODEL_WARMUP_ENABLED,
+)
+
+# Token budget per prompt section, with older turns folded into a rolling summary
+TOKENIZER_PATH = os.getenv("TOKENIZER_PATH")
+PROMPT_BUDGET_PREAMBLE = int(os.getenv("PROMPT_BUDGET_PREAMBLE", "400"))
+PROMPT_BUDGET_ANALYSIS = int(os.getenv("PROMPT_BUDGET_ANALYSIS", "120"))
+PROMPT_BUDGET_HISTORY = int(os.getenv("PROMPT_BUDGET_HISTORY", "600"))
+PROMPT_BUDGET_SUMMARY = int(os.getenv("PROMPT_BUDGET_SUMMARY", "150"))
+PROMPT_BUDGET_MESSAGE = int(os.getenv("PROMPT_BUDGET_MESSAGE", "400"))
+PROMPT_RECENT_MESSAGES = int(os.getenv("PROMPT_RECENT_MESSAGES", "6"))
+PROMPT_BUDGET_KNOWLEDGE = int(os.getenv("PROMPT_BUDGET_KNOWLEDGE", "200"))
+SUMMARIZATION_ENABLED = os.getenv("SUMMARIZATION_ENABLED", "1").lower() in ("1", "true", "yes")
+
+token_counter = TokenCounter(TOKENIZER_PATH)
+
+# Search index over the website's services, projects, jobs and testimonials for grounding prompts.
+# Kept current from the Django site's Redis change feed (core/knowledge.py), or loaded once from a
+# `manage.py sync_knowledge --output` export in KNOWLEDGE_FILE.
+KNOWLEDGE_ENABLED = os.getenv("KNOWLEDGE_ENABLED", "1").lower() in ("1", "true", "yes")
+KNOWLEDGE_REDIS_URL = os.getenv("KNOWLEDGE_REDIS_URL", REDIS_URL or "")
+KNOWLEDGE_KEY_PREFIX = os.getenv("KNOWLEDGE_KEY_PREFIX", "shiraji:knowledge")
+KNOWLEDGE_FILE = os.getenv("KNOWLEDGE_FILE")
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "3"))
+
+knowledge_index = BM25Index()
+knowledge_feed = (
+    RedisKnowledgeFeed.from_url(KNOWLEDGE_REDIS_URL, knowledge_index, key_prefix=KNOWLEDGE_KEY_PREFIX)
+    if KNOWLEDGE_ENABLED and KNOWLEDGE_REDIS_URL and not KNOWLEDGE_FILE else None
+)
+
+# Server-sent event streams
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_DISCONNECT_POLL_SECONDS = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", "0.25"))
+
+# Tokens are sent in one frame per STREAM_FLUSH_INTERVAL_MS or STREAM_FLUSH_BYTES of text (0 ms: one per token)
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "50")) / 1000
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "1024"))
+
+stream_metrics = StreamMetrics()
+
+# WebSocket chat connections
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "8"))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+
+socket_metrics = {"active": 0, "opened": 0, "frames_received": 0, "frames_sent": 0}
+
+# Rolling deploys call POST /drain on the old worker and give it this long to finish streamed turns
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "60"))
+
+drainer = Drainer(DRAIN_TIMEOUT_SECONDS)
+
+# Chat log analysis posted to /analyze/batch, on one process pool shared by at most
+# ANALYZE_BATCH_MAX_JOBS uploads at a time. ANALYZE_BATCH_WORKERS=0 leaves it to python -m assistant.batch.
+ANALYZE_BATCH_WORKERS = int(os.getenv("ANALYZE_BATCH_WORKERS", "2"))
+ANALYZE_BATCH_CHUNK_LINES = int(os.getenv("ANALYZE_BATCH_CHUNK_LINES", "5000"))
+ANALYZE_BATCH_MAX_JOBS = int(os.getenv("ANALYZE_BATCH_MAX_JOBS", "1"))
+# Longer lines are counted as invalid instead of being buffered
+ANALYZE_BATCH_MAX_LINE_BYTES = int(os.getenv("ANALYZE_BATCH_MAX_LINE_BYTES", str(1 << 20)))
+
+batch_executor: Optional[ProcessPoolExecutor] = None
+batch_jobs = 0
+
+# Opt-in capture of anonymized chat turns for replay (benchmarks/replay.py). CAPTURE_SALT keeps
+# conversation hashes stable across restarts and workers; without it each process uses a random one.
+# Only e-mail addresses and phone numbers are masked; names and street addresses are kept.
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "0").lower() in ("1", "true", "yes")
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+CAPTURE_SEGMENT_MB = float(os.getenv("CAPTURE_SEGMENT_MB", "64"))
+CAPTURE_MAX_SEGMENTS = int(os.getenv("CAPTURE_MAX_SEGMENTS", "20"))
+CAPTURE_SALT = os.getenv("CAPTURE_SALT")
+
+traffic_capture = TrafficCapture(
+    CAPTURE_DIR,
+    segment_bytes=int(CAPTURE_SEGMENT_MB * 1024 * 1024),
+    max_segments=CAPTURE_MAX_SEGMENTS,
+    salt=CAPTURE_SALT,
+    enabled=CAPTURE_ENABLED,
+)
+
+# Opt-in analytics: one event per chat turn, written in batches to the chat_events and chat_daily_rollups
+# tables. Without ANALYTICS_DATABASE_URL they go to the site's Postgres database when POSTGRES_ENGINE
+# names it (the same POSTGRES_* settings as construction_site/settings.py), and otherwise to SQLite.
+# Conversation ids are stored hashed; ANALYTICS_SALT (default CAPTURE_SALT) keeps the hashes stable
+# across restarts and workers, and matching the capture's when both use the same salt.
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "0").lower() in ("1", "true", "yes")
+ANALYTICS_DATABASE_URL = os.getenv("ANALYTICS_DATABASE_URL") or (
+    "postgresql://{}:{}@{}:{}/{}".format(
+        quote(os.getenv("POSTGRES_USER", "user"), safe=""),
+        quote(os.getenv("POSTGRES_PASSWORD", "password"), safe=""),
+        os.getenv("POSTGRES_HOST", "db"),
+        os.getenv("POSTGRES_PORT", "5432"),
+        os.getenv("POSTGRES_DATABASE", ""),
+    )
+    if "postgresql" in os.getenv("POSTGRES_ENGINE", "") else "sqlite:///analytics.sqlite3"
+)
+ANALYTICS_FLUSH_SIZE = int(os.getenv("ANALYTICS_FLUSH_SIZE", "500"))
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "5"))
+ANALYTICS_MAX_QUEUE = int(os.getenv("ANALYTICS_MAX_QUEUE", "10000"))
+ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", "366"))
+ANALYTICS_SALT = os.getenv("ANALYTICS_SALT") or CAPTURE_SALT
+
+analytics = AnalyticsSink.from_url(
+    ANALYTICS_DATABASE_URL,
+    max_queue=ANALYTICS_MAX_QUEUE,
+    flush_size=ANALYTICS_FLUSH_SIZE,
+    flush_interval=ANALYTICS_FLUSH_SECONDS,
+    salt=ANALYTICS_SALT,
+    enabled=ANALYTICS_ENABLED,
+)
+
+# Prometheus metrics served at /metrics
+metrics = Registry()
+chat_stage_seconds = metrics.histogram(
+    "chat_stage_seconds", "Time spent in each stage of a chat turn", ("endpoint", "stage")
+)
+chat_replies_total = metrics.counter("chat_replies_total", "/chat replies by what served them", ("served_by",))
+chat_streams_total = metrics.counter("chat_streams_total", "Streamed turns by outcome", ("endpoint", "outcome"))
+upstream_queue_seconds = metrics.histogram(
+    "ollama_queue_wait_seconds", "Time waiting for an upstream slot", ("call",)
+)
+upstream_first_token_seconds = metrics.histogram(
+    "ollama_first_token_seconds",
+    "Time from sending a generation to its first token (non-streamed: wall time less eval_duration)", ("call",)
+)
+upstream_generation_seconds = metrics.histogram(
+    "ollama_generation_seconds", "Wall time of a whole upstream generation, split by cold or warm model", ("call", "start")
+)
+model_load_seconds = metrics.histogram("ollama_load_seconds", "Model load time per generation (load_duration)", ("model",))
+eval_tokens_per_second = metrics.histogram(
+    "ollama_eval_tokens_per_second", "Output tokens per second (eval_count / eval_duration)", ("model",), RATE_BUCKETS
+)
+prompt_eval_tokens = metrics.histogram(
+    "ollama_prompt_eval_tokens", "Prompt tokens evaluated per generation (prompt_eval_count)", ("model",), TOKEN_BUCKETS
+)
+eval_tokens = metrics.histogram(
+    "ollama_eval_tokens", "Output tokens per generation (eval_count)", ("model",), TOKEN_BUCKETS
+)
+active_conversations = metrics.gauge("chat_active_conversations", "Conversations held by the store")
+store_bytes = metrics.gauge("chat_store_bytes", "Approximate size of stored conversation history")
+admission_gauge = metrics.gauge("ollama_admission", "Upstream concurrency limit, in-flight calls and queue depth", ("field",))
+upstream_outstanding = metrics.gauge("ollama_upstream_outstanding", "Calls in flight per upstream", ("upstream",))
+upstream_healthy = metrics.gauge("ollama_upstream_healthy", "1 while an upstream is taking traffic", ("upstream",))
+active_streams = metrics.gauge("chat_active_streams", "Streamed turns in progress")
+active_sockets = metrics.gauge("chat_active_websockets", "Open WebSocket connections")
+model_warm = metrics.gauge("ollama_model_warm", "1 once a model has been loaded by the warmer", ("model",))
+speculation_gauge = metrics.gauge(
+    "chat_speculation", "Speculative answers to suggestions: generated, hits, misses, wasted and their token cost", ("field",)
+)
+
+def observe_generation(model: str, data: Dict[str, Any]) -> str:
+    """Record the load time, token counts and rate from a final Ollama response body; returns the start (cold or warm)"""
+    start = model_warmer.observe(model, data)
+    if data.get("load_duration") is not None:
+        model_load_seconds.observe(data["load_duration"] / 1e9, model)
+    eval_count = data.get("eval_count")
+    if eval_count is None:
+        return start
+    eval_tokens.observe(eval_count, model)
+    prompt_eval_tokens.observe(data.get("prompt_eval_count") or 0, model)
+    eval_duration = data.get("eval_duration")
+    if eval_duration:
+        eval_tokens_per_second.observe(eval_count / (eval_duration / 1e9), model)
+    return start
+
+# Identical concurrent generations share one upstream call
+generation_flight = SingleFlight()
+stream_fanout = StreamFanout()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown"""
+    global batch_executor
+    if ANALYZE_BATCH_WORKERS > 0:
+        batch_executor = ProcessPoolExecutor(ANALYZE_BATCH_WORKERS)
+    await ollama_client.start()
+    await model_warmer.start()
+    await traffic_capture.start()
+    await analytics.start()
+    if KNOWLEDGE_ENABLED and KNOWLEDGE_FILE:
+        logger.info(f"Knowledge index loaded with {load_file(knowledge_index, KNOWLEDGE_FILE)} documents")
+    if knowledge_feed is not None:
+        await knowledge_feed.start()
+    try:
+        yield
+    finally:
+        if knowledge_feed is not None:
+            await knowledge_feed.close()
+        await model_warmer.close()
+        await speculator.close()
+        await traffic_capture.close()
+        await analytics.close()
+        await summarizer.close()
+        await ollama_client.close()
+        await conversation_store.close()
+        if batch_executor is not None:
+            batch_executor.shutdown()
+            batch_executor = None
+
 app = FastAPI(
     title="Shiraji AI Assistant",
     description="Advanced AI Assistant for Shiraji Group",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Configuration
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "https://llm.shiraji.ae")
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
-
-# In-memory conversation storage (use Redis in production)
-conversations: Dict[str, List[Dict]] = {}
-
 class ChatMessage(BaseModel):
     message: str
     conversation_id: Optional[str] = "default"
@@ -40,387 +450,841 @@ class ChatResponse(BaseModel):
     conversation_id: str
     suggestions: List[str] = []
     context_analysis: Dict[str, Any] = {}
-
-class ConversationAnalyzer:
-    """Advanced conversation analysis and context management"""
-    
-    def __init__(self):
-        self.company_context = {
-            "name": "Shiraji Group",
-            "location": "Al Nahyan, Abu Dhabi, UAE",
-            "phone": "+971 55 942 5653",
-            "email": "info@shiraji.ae",
-            "services": [
-                "Residential & Commercial Construction",
-                "Electrical Systems", "HVAC & Climate Control",
-                "Plumbing & Water Systems", "Swimming Pool Installation",
-                "Interior Design", "Maintenance Services",
-                "Security & Fencing", "Cleaning Services"
-            ]
-        }
-    
-    def analyze_intent(self, message: str, history: List[Dict]) -> Dict[str, Any]:
-        """Analyze user intent and extract context"""
-        message_lower = message.lower()
-        
-        # Intent detection
-        intents = {
-            "quote_request": any(word in message_lower for word in ["quote", "price", "cost", "estimate", "budget"]),
-            "project_inquiry": any(word in message_lower for word in ["project", "build", "construct", "renovation"]),
-            "service_question": any(word in message_lower for word in ["service", "maintenance", "repair", "install"]),
-            "general_info": any(word in message_lower for word in ["about", "company", "experience", "portfolio"]),
-            "contact_request": any(word in message_lower for word in ["contact", "call", "visit", "appointment"]),
-            "technical_support": any(word in message_lower for word in ["problem", "issue", "help", "support"])
-        }
-        
-        # Extract entities
-        entities = {
-            "project_type": self._extract_project_type(message_lower),
-            "location": self._extract_location(message_lower),
-            "budget_range": self._extract_budget(message_lower),
-            "urgency": self._extract_urgency(message_lower),
-            "services_mentioned": self._extract_services(message_lower)
-        }
-        
-        # Conversation stage analysis
-        stage = self._determine_conversation_stage(history, intents)
-        
-        return {
-            "intents": {k: v for k, v in intents.items() if v},
-            "entities": {k: v for k, v in entities.items() if v},
-            "conversation_stage": stage,
-            "message_count": len(history),
-            "primary_intent": max(intents.items(), key=lambda x: x[1])[0] if any(intents.values()) else "general"
-        }
-    
-    def _extract_project_type(self, message: str) -> Optional[str]:
-        project_types = {
-            "villa": ["villa", "house", "home", "residential"],
-            "commercial": ["office", "commercial", "business", "shop", "restaurant"],
-            "renovation": ["renovation", "remodel", "upgrade", "refurbish"],
-            "maintenance": ["maintenance", "repair", "fix", "service"]
-        }
-        
-        for project_type, keywords in project_types.items():
-            if any(keyword in message for keyword in keywords):
-                return project_type
-        return None
-    
-    def _extract_location(self, message: str) -> Optional[str]:
-        locations = ["abu dhabi", "dubai", "sharjah", "ajman", "ras al khaimah", "fujairah", "umm al quwain"]
-        for location in locations:
-            if location in message:
-                return location.title()
-        return None
-    
-    def _extract_budget(self, message: str) -> Optional[str]:
-        import re
-        budget_pattern = r'(\d+)\s*(aed|dirham|thousand|million|k|m)'
-        match = re.search(budget_pattern, message, re.IGNORECASE)
-        if match:
-            return match.group(0)
-        return None
-    
-    def _extract_urgency(self, message: str) -> Optional[str]:
-        urgency_keywords = {
-            "urgent": ["urgent", "asap", "immediately", "emergency"],
-            "soon": ["soon", "quickly", "fast", "this week"],
-            "flexible": ["flexible", "no rush", "when possible"]
-        }
-        
-        for urgency, keywords in urgency_keywords.items():
-            if any(keyword in message for keyword in keywords):
-                return urgency
-        return None
-    
-    def _extract_services(self, message: str) -> List[str]:
-        services = ["electrical", "plumbing", "hvac", "swimming pool", "interior design", 
-                   "maintenance", "painting", "tiling", "carpentry", "security"]
-        return [service for service in services if service in message]
-    
-    def _determine_conversation_stage(self, history: List[Dict], intents: Dict[str, bool]) -> str:
-        if len(history) == 0:
-            return "greeting"
-        elif len(history) <= 3:
-            return "exploration"
-        elif any(intents.get(intent, False) for intent in ["quote_request", "contact_request"]):
-            return "conversion"
-        else:
-            return "discussion"
-    
-    def generate_suggestions(self, analysis: Dict[str, Any]) -> List[str]:
-        """Generate smart follow-up suggestions based on context"""
-        suggestions = []
-        
-        primary_intent = analysis.get("primary_intent", "general")
-        entities = analysis.get("entities", {})
-        stage = analysis.get("conversation_stage", "greeting")
-        
-        if primary_intent == "quote_request":
-            if not entities.get("project_type"):
-                suggestions.append("What type of project are you planning?")
-            if not entities.get("location"):
-                suggestions.append("Which emirate is your project located in?")
-            suggestions.append("Schedule a site visit for accurate quote")
-        
-        elif primary_intent == "project_inquiry":
-            suggestions.extend([
-                "View our recent projects",
-                "Get a cost estimate",
-                "Schedule a consultation"
-            ])
-        
-        elif stage == "conversion":
-            suggestions.extend([
-                "Call us now: +971 55 942 5653",
-                "Send project details via email",
-                "Book a site visit"
-            ])
-        
-        else:
-            suggestions.extend([
-                "Tell me about your project",
-                "Get a quick quote",
-                "See our services"
-            ])
-        
-        return suggestions[:3]  # Limit to 3 suggestions
+    served_by: Optional[str] = None
 
 analyzer = ConversationAnalyzer()
 
-class SmartPromptBuilder:
-    """Build intelligent prompts based on conversation context"""
-    
-    def build_prompt(self, message: str, history: List[Dict], analysis: Dict[str, Any]) -> str:
-        base_context = f"""
-You are Shiraji AI Assistant - an expert construction consultant for Shiraji Group in Abu Dhabi, UAE.
-
-COMPANY INFO:
-- Location: Al Nahyan, Abu Dhabi, UAE
-- Phone: +971 55 942 5653
-- Email: info@shiraji.ae
-- Services: Construction, Electrical, HVAC, Plumbing, Swimming Pools, Interior Design, Maintenance
-
-CONVERSATION ANALYSIS:
-- Primary Intent: {analysis.get('primary_intent', 'general')}
-- Stage: {analysis.get('conversation_stage', 'greeting')}
-- Entities: {', '.join(f"{k}: {v}" for k, v in analysis.get('entities', {}).items() if v)}
-- Message Count: {analysis.get('message_count', 0)}
-"""
-        
-        # Add conversation history (last 6 messages)
-        recent_history = history[-6:] if len(history) > 6 else history
-        if recent_history:
-            history_text = "\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in recent_history])
-            base_context += f"\n\nRECENT CONVERSATION:\n{history_text}"
-        
-        # Add specific instructions based on intent
-        intent_instructions = self._get_intent_instructions(analysis.get('primary_intent', 'general'))
-        
-        prompt = f"""{base_context}
+fast_path = FastPathResponder(analyzer.company_context, threshold=FAST_PATH_THRESHOLD, enabled=FAST_PATH_ENABLED)
 
-CURRENT USER MESSAGE: "{message}"
+semantic_cache = SemanticResponseCache(
+    OllamaEmbedder(ollama_client, SEMANTIC_CACHE_EMBED_MODEL) if SEMANTIC_CACHE_EMBEDDER == "ollama" else HashingEmbedder(),
+    capacity=SEMANTIC_CACHE_SIZE,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    stages=SEMANTIC_CACHE_STAGES,
+    # Website content changes make cached answers stale as well
+    version_source=lambda: f"{fingerprint(analyzer.company_context)}:{knowledge_index.version}",
+    enabled=SEMANTIC_CACHE_ENABLED,
+)
 
-{intent_instructions}
+prompt_builder = SmartPromptBuilder(
+    PromptBudget(
+        preamble=PROMPT_BUDGET_PREAMBLE,
+        analysis=PROMPT_BUDGET_ANALYSIS,
+        history=PROMPT_BUDGET_HISTORY,
+        summary=PROMPT_BUDGET_SUMMARY,
+        message=PROMPT_BUDGET_MESSAGE,
+        recent_messages=PROMPT_RECENT_MESSAGES,
+        knowledge=PROMPT_BUDGET_KNOWLEDGE,
+    ),
+    token_counter,
+    knowledge=knowledge_index if KNOWLEDGE_ENABLED else None,
+    knowledge_top_k=KNOWLEDGE_TOP_K,
+)
 
-RESPONSE GUIDELINES:
-- Be conversational and helpful (not robotic)
-- Reference previous conversation naturally
-- Ask ONE specific follow-up question
-- Keep response under 100 words
-- Use emojis appropriately
-- Provide actionable advice
-- Be specific and avoid generic responses
+@asynccontextmanager
+async def upstream_slot(conversation_id: str, call: str, preemptible: bool = False):
+    """Acquire an upstream slot, recording how long the call queued for it"""
+    queued_at = time.perf_counter()
+    async with upstream_limiter.acquire(conversation_id, preemptible) as slot:
+        upstream_queue_seconds.observe(time.perf_counter() - queued_at, call)
+        yield slot
 
-Respond as Shiraji AI Assistant:"""
-        
-        return prompt
-    
-    def _get_intent_instructions(self, intent: str) -> str:
-        instructions = {
-            "quote_request": "Focus on gathering project details (type, size, location, timeline) to provide accurate pricing. Offer to schedule a site visit.",
-            "project_inquiry": "Discuss project specifics, share relevant experience, and guide toward next steps (consultation, quote, timeline).",
-            "service_question": "Explain the specific service in detail, mention related services, and suggest how to proceed.",
-            "contact_request": "Provide contact information and suggest the best way to connect based on their needs.",
-            "technical_support": "Offer practical solutions, explain the process, and suggest professional assessment if needed.",
-            "general": "Be welcoming, understand their needs, and guide the conversation toward specific services or projects."
+async def _summarize_generate(prompt: str, conversation_id: str) -> Optional[str]:
+    """Background summary generation; queued separately from the conversation's own turns"""
+    async with upstream_slot(f"summary:{conversation_id}", "summary"):
+        response = await ollama_client.generate({
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {"temperature": 0.2, "num_predict": PROMPT_BUDGET_SUMMARY}
+        })
+        response.raise_for_status()
+        return response.json().get("response")
+
+summarizer = ConversationSummarizer(
+    _summarize_generate,
+    token_counter,
+    window=PROMPT_RECENT_MESSAGES,
+    max_summary_tokens=PROMPT_BUDGET_SUMMARY,
+    max_message_tokens=PROMPT_BUDGET_HISTORY // 2,
+    enabled=SUMMARIZATION_ENABLED,
+)
+
+async def _speculate_answer(conversation_id: str, suggestion: str) -> Optional[Speculation]:
+    """Answer a suggested follow-up as if the user had just sent it (None when the fast path would answer it)"""
+    history = await conversation_store.get(conversation_id)
+    history.append(Message("user", suggestion))
+    analysis = analyzer.analyze_intent(suggestion, history)
+    if fast_path.can_answer(suggestion, analysis):
+        return None
+    route = model_router.choose(analysis)
+    prompt = prompt_builder.build_prompt(suggestion, history, analysis, summarizer.get(conversation_id))
+    payload = {
+        "model": route.model,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {
+            "temperature": route.temperature,
+            "num_predict": route.num_predict,
+            "top_p": 0.9,
+            "frequency_penalty": 0.8,
+            "presence_penalty": 0.6
         }
-        return instructions.get(intent, instructions["general"])
+    }
+    started = time.perf_counter()
+    # Only started while a slot is spare (see has_capacity), and cancelled as soon as a real turn has to queue
+    async with upstream_slot(f"speculate:{conversation_id}", "speculate", preemptible=True):
+        data = await _generate_on(payload)
+    model_router.observe(route, time.perf_counter() - started, data)
+    if "response" not in data:
+        return None
+    return Speculation(clean_reply(data["response"]), analysis, route, data)
 
-prompt_builder = SmartPromptBuilder()
+speculator = SuggestionSpeculator(
+    _speculate_answer,
+    lambda: upstream_limiter.has_spare_capacity(SPECULATION_RESERVE_SLOTS),
+    ttl_seconds=SPECULATION_TTL_SECONDS,
+    max_suggestions=SPECULATION_MAX_SUGGESTIONS,
+    max_concurrent=SPECULATION_MAX_CONCURRENT,
+    max_conversations=CONVERSATION_MAX_COUNT,
+    enabled=SPECULATION_ENABLED,
+)
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+def overloaded_response(error: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=error.status_code,
+        content={"detail": "The assistant is busy right now. Please try again shortly.", "reason": error.reason},
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+async def _ollama_generate(payload: Dict[str, Any], conversation_id: str) -> Dict[str, Any]:
+    async with upstream_slot(conversation_id, "generate"):
+        return await _generate_on(payload)
+
+async def _generate_on(payload: Dict[str, Any], upstream=None) -> Dict[str, Any]:
+    sent_at = time.perf_counter()
+    response = await ollama_client.generate(payload, upstream)
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="AI service unavailable")
+    data = response.json()
+    elapsed = time.perf_counter() - sent_at
+    upstream_generation_seconds.observe(elapsed, "generate", observe_generation(payload["model"], data))
+    if data.get("eval_duration"):
+        upstream_first_token_seconds.observe(max(elapsed - data["eval_duration"] / 1e9, 0.0), "generate")
+    return data
+
+async def _resilient_generate(payload: Dict[str, Any], conversation_id: str,
+                              fallback_prompt: Callable[[], str]) -> Dict[str, Any]:
+    """Primary model within the latency SLO (hedged to a second upstream when slow), else the fallback model
+
+    The SLO only cuts the primary model off when there is a fallback model to
+    answer instead; without one the primary gets OLLAMA_GENERATE_TIMEOUT.
+    The returned body carries "served_by": "primary", "hedge" or "fallback".
+    """
+    if circuit_breaker.allow():
+        try:
+            async with upstream_slot(conversation_id, "generate"):
+                primary = ollama_client.pick()
+                hedge = None
+                if ollama_client.available() > 1:
+                    hedge = lambda: _generate_on(payload, ollama_client.pick(exclude=[primary]))
+                data, path = await asyncio.wait_for(
+                    hedger.run(lambda: _generate_on(payload, primary), hedge),
+                    CHAT_LATENCY_SLO if OLLAMA_FALLBACK_MODEL else OLLAMA_GENERATE_TIMEOUT,
+                )
+            circuit_breaker.record(True)
+            data["served_by"] = path
+            return data
+        except (Overloaded, asyncio.CancelledError):
+            circuit_breaker.abandon()
+            raise
+        except asyncio.TimeoutError:
+            if not OLLAMA_FALLBACK_MODEL:
+                circuit_breaker.record(False)
+                raise
+            # A slow answer is not a failed one, so missing the SLO leaves the breaker alone
+            circuit_breaker.abandon()
+            logger.warning("Primary model missed the %.1fs latency SLO; using fallback model", CHAT_LATENCY_SLO)
+        except Exception as e:
+            circuit_breaker.record(False)
+            if not OLLAMA_FALLBACK_MODEL:
+                raise
+            logger.warning("Primary model failed (%s: %s); using fallback model", type(e).__name__, e)
+    elif not OLLAMA_FALLBACK_MODEL:
+        raise Overloaded("circuit_open", circuit_breaker.retry_after(), 503)
+
+    # The stored context belongs to the primary model, so send the full prompt
+    fallback_payload = {key: value for key, value in payload.items() if key != "context"}
+    fallback_payload.update(model=OLLAMA_FALLBACK_MODEL, prompt=fallback_prompt())
+    data = await _ollama_generate(fallback_payload, conversation_id)
+    data["served_by"] = "fallback"
+    return data
+
+async def _ollama_stream_events(payload: Dict[str, Any], conversation_id: str):
+    async with upstream_slot(conversation_id, "stream") as slot:
+        sent_at = time.perf_counter()
+        async with ollama_client.stream_generate(payload) as response:
+            async for chunk in response.aiter_lines():
+                if chunk:
+                    try:
+                        data = json.loads(chunk)
+                    except json.JSONDecodeError:
+                        continue
+                    # Streams adapt the limit on time to first token
+                    if slot.latency is None:
+                        slot.record(time.monotonic() - slot.started)
+                        upstream_first_token_seconds.observe(time.perf_counter() - sent_at, "stream")
+                    if data.get("done"):
+                        start = observe_generation(payload["model"], data)
+                        upstream_generation_seconds.observe(time.perf_counter() - sent_at, "stream", start)
+                    yield data
+
+def build_turn_prompt(conversation_id: str, message: str, history: List[Message], prior_history: List[Message],
+                      analysis: Dict[str, Any], model: str) -> Tuple[str, Optional[List[int]]]:
+    """Prompt for this turn, plus the stored model context it continues (if still valid)"""
+    context = model_state.lookup(conversation_id, model, prompt_builder.template_version, prior_history)
+    if context is not None:
+        return prompt_builder.build_turn(message, analysis), context
+    return prompt_builder.build_prompt(message, history, analysis, summarizer.get(conversation_id)), None
+
+def remember_context(conversation_id: str, model: str, context: Optional[List[int]], data: Dict[str, Any],
+                     ai_message: Message) -> None:
+    """Keep the context Ollama returned so the next turn only sends new text"""
+    model_state.observe(context is not None, data)
+    model_state.update(conversation_id, model, prompt_builder.template_version, data.get("context"), ai_message)
+
+def capture_turn(endpoint: str, conversation_id: str, message: str, seconds: float,
+                 data: Optional[Dict[str, Any]], **fields: Any) -> None:
+    """Queue a capture record of a finished turn, with the token counts of its generation (if any)"""
+    if not traffic_capture.enabled:
+        return
+    if data:
+        fields.update(model=data.get("model"), prompt_tokens=data.get("prompt_eval_count"), eval_tokens=data.get("eval_count"))
+    traffic_capture.record(endpoint, conversation_id, message, seconds, **fields)
+
+def clean_reply(text: str) -> str:
+    return text.replace("Shiraji AI Assistant:", "").strip()
+
+async def generate_reply(prompt: str, conversation_id: str, route: Route, context: Optional[List[int]] = None,
+                         fallback_prompt: Optional[Callable[[], str]] = None) -> Dict[str, Any]:
+    """Run one non-streaming generation on route's model and return Ollama's response body
+
+    fallback_prompt builds a full prompt for the fallback model when prompt
+    only continues the primary model's stored context.
+    """
+    payload = {
+        "model": route.model,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {
+            "temperature": route.temperature,
+            "num_predict": route.num_predict,
+            "top_p": 0.9,
+            "frequency_penalty": 0.8,
+            "presence_penalty": 0.6
+        }
+    }
+    if context is not None:
+        payload["context"] = context
+    return await generation_flight.do(
+        request_key(payload),
+        lambda: _resilient_generate(payload, conversation_id, fallback_prompt or (lambda: prompt))
+    )
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(chat_request: ChatMessage):
+    request_started = time.perf_counter()
+    served_by, ai_response_data = "error", None
+    analysis = suggestions = None
     try:
         conversation_id = chat_request.conversation_id or "default"
         
-        # Get or create conversation history
-        if conversation_id not in conversations:
-            conversations[conversation_id] = []
-        
-        history = conversations[conversation_id]
+        # An answer prepared for a suggested follow-up (any other message cancels them)
+        speculation = await speculator.take(conversation_id, chat_request.message)
         
-        # Add user message to history
-        user_message = {
-            "role": "user",
-            "content": chat_request.message,
-            "timestamp": datetime.now().isoformat()
-        }
-        history.append(user_message)
+        # Add user message to conversation history
+        user_message = Message("user", chat_request.message)
+        history = await conversation_store.append(conversation_id, [user_message])
         
         # Analyze conversation context
+        stage_started = time.perf_counter()
         analysis = analyzer.analyze_intent(chat_request.message, history)
+        chat_stage_seconds.observe(time.perf_counter() - stage_started, "chat", "analyze")
         
-        # Build intelligent prompt
-        prompt = prompt_builder.build_prompt(chat_request.message, history, analysis)
+        # Answer simple company-fact questions without the model
+        fast_reply = fast_path.answer(chat_request.message, analysis) if speculation is None else None
         
-        # Call Ollama API
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "max_tokens": 200,
-                        "top_p": 0.9,
-                        "frequency_penalty": 0.8,
-                        "presence_penalty": 0.6
-                    }
-                }
-            )
+        # Serve repeated FAQ-style questions from the semantic cache
+        cache_probe = None
+        if fast_reply is None and speculation is None:
+            try:
+                cache_probe = await semantic_cache.lookup(
+                    chat_request.message, analysis["primary_intent"], analysis["conversation_stage"],
+                    analysis["entities"],
+                )
+            except Exception as e:
+                # An embedding model that is down only costs the cache
+                logger.warning("Semantic cache lookup failed (%s: %s); treating it as a miss", type(e).__name__, e)
+                cache_probe = CacheProbe(False)
+        ai_response_data = None
+        if speculation is not None:
+            ai_response = speculation.reply
+            ai_response_data, route, context = speculation.data, speculation.route, None
+            served_by = "speculative"
+        elif fast_reply is not None:
+            ai_response = fast_reply
+            served_by = "fast_path"
+        elif cache_probe.hit:
+            ai_response = cache_probe.response
+            served_by = "cache"
+        else:
+            # Pick the model and output length for this kind of turn
+            route = model_router.choose(analysis)
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="AI service unavailable")
+            # Build intelligent prompt (incremental when the model context can be continued)
+            stage_started = time.perf_counter()
+            prompt, context = build_turn_prompt(
+                conversation_id, chat_request.message, history, history[:-1], analysis, route.model
+            )
+            chat_stage_seconds.observe(time.perf_counter() - stage_started, "chat", "prompt")
             
-            ai_response_data = response.json()
-            ai_response = ai_response_data.get("response", "I'm having trouble responding right now. Please try again.")
-        
-        # Clean up response
-        ai_response = ai_response.replace("Shiraji AI Assistant:", "").strip()
+            # Call Ollama API
+            generation_started = time.perf_counter()
+            ai_response_data = await generate_reply(
+                prompt, conversation_id, route, context,
+                lambda: prompt_builder.build_prompt(chat_request.message, history, analysis, summarizer.get(conversation_id))
+                if context is not None else prompt
+            )
+            served_by = ai_response_data.get("served_by", "primary")
+            model_router.observe(route, time.perf_counter() - generation_started, ai_response_data)
+            if "response" in ai_response_data:
+                ai_response = clean_reply(ai_response_data["response"])
+                # Fallback-model answers are a stopgap, so they are not cached
+                if served_by != "fallback":
+                    semantic_cache.store(cache_probe, ai_response, time.perf_counter() - generation_started)
+            else:
+                ai_response_data = None
+                ai_response = "I'm having trouble responding right now. Please try again."
         
         # Add AI response to history
-        ai_message = {
-            "role": "assistant",
-            "content": ai_response,
-            "timestamp": datetime.now().isoformat()
-        }
-        history.append(ai_message)
+        ai_message = Message("assistant", ai_response)
+        history = await conversation_store.append(conversation_id, [ai_message])
+        if ai_response_data is not None and served_by != "fallback":
+            remember_context(conversation_id, route.model, context, ai_response_data, ai_message)
+        summarizer.schedule(conversation_id, history)
         
-        # Generate smart suggestions
+        # Generate smart suggestions, and start answering them while the user reads this reply
         suggestions = analyzer.generate_suggestions(analysis)
+        speculator.schedule(conversation_id, suggestions)
         
-        # Limit conversation history (keep last 20 messages)
-        if len(history) > 20:
-            conversations[conversation_id] = history[-20:]
-        
+        served_by_counts[served_by] += 1
+        chat_replies_total.inc(served_by)
         return ChatResponse(
             response=ai_response,
             conversation_id=conversation_id,
             suggestions=suggestions,
-            context_analysis=analysis
+            context_analysis=analysis,
+            served_by=served_by
         )
         
-    except Exception as e:
-        print(f"Chat error: {e}")
+    except Overloaded as e:
+        served_by = "overloaded"
+        return overloaded_response(e)
+    except Exception:
+        logger.exception("Chat error")
+        served_by_counts["error"] += 1
+        chat_replies_total.inc("error")
         return ChatResponse(
             response="I'm experiencing some technical difficulties. Please try again or contact us directly at +971 55 942 5653.",
             conversation_id=conversation_id,
-            suggestions=["Call us directly", "Try again", "Send email"]
+            suggestions=["Call us directly", "Try again", "Send email"],
+            served_by="error"
         )
+    finally:
+        elapsed = time.perf_counter() - request_started
+        chat_stage_seconds.observe(elapsed, "chat", "total")
+        capture_turn("chat", conversation_id, chat_request.message, elapsed, ai_response_data, served_by=served_by)
+        analytics.record("chat", conversation_id, analysis, elapsed, served_by=served_by, suggestions=suggestions,
+                         data=ai_response_data)
+
+async def save_stream_turn(conversation_id: str, message: str, reply: str, model: str,
+                           context: Optional[List[int]], done_data: Optional[Dict[str, Any]]) -> None:
+    """Record a streamed turn, including the partial reply of a stream that ended early"""
+    now = time.time()
+    messages = [Message("user", message, now)]
+    ai_message = None
+    if reply or done_data is not None:
+        ai_message = Message("assistant", reply, now, interrupted=done_data is None)
+        if done_data is None:
+            stream_metrics.partial_replies_saved += 1
+        messages.append(ai_message)
+    history = await conversation_store.append(conversation_id, messages)
+    if done_data is not None:
+        remember_context(conversation_id, model, context, done_data, ai_message)
+    summarizer.schedule(conversation_id, history)
+
+async def start_stream_turn(conversation_id: str, message: str, endpoint: str
+                            ) -> Tuple[Dict[str, Any], Route, Optional[List[int]], AsyncIterator[TokenBatch], bool]:
+    """Analysis, route, continued model context and reply batches for a streamed turn
+
+    The flag is True when the reply was prepared for a suggested follow-up.
+    """
+    speculation = await speculator.take(conversation_id, message)
+    if speculation is not None:
+        return speculation.analysis, speculation.route, None, speculation.batches(), True
+    
+    # Get conversation history
+    history = await conversation_store.get(conversation_id)
+    
+    # Analyze context
+    stage_started = time.perf_counter()
+    analysis = analyzer.analyze_intent(message, history)
+    chat_stage_seconds.observe(time.perf_counter() - stage_started, endpoint, "analyze")
+    
+    # Pick the model and output length for this kind of turn
+    route = model_router.choose(analysis)
+    
+    # Build prompt (incremental when the model context can be continued)
+    stage_started = time.perf_counter()
+    prompt, context = build_turn_prompt(conversation_id, message, history, history, analysis, route.model)
+    chat_stage_seconds.observe(time.perf_counter() - stage_started, endpoint, "prompt")
+    
+    payload = {
+        "model": route.model,
+        "prompt": prompt,
+        "stream": True,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {
+            "temperature": route.temperature,
+            "num_predict": route.num_predict
+        }
+    }
+    if context is not None:
+        payload["context"] = context
+    return analysis, route, context, stream_tokens(payload, conversation_id), False
+
+def stream_tokens(payload: Dict[str, Any], conversation_id: str):
+    """Stream from Ollama in coalesced batches (identical concurrent streams share one generation)"""
+    return coalesce_tokens(
+        stream_fanout.subscribe(request_key(payload), lambda: _ollama_stream_events(payload, conversation_id)),
+        STREAM_FLUSH_INTERVAL,
+        STREAM_FLUSH_BYTES,
+    )
 
 @app.get("/chat/stream")
-async def chat_stream(message: str, conversation_id: str = "default"):
-    """Streaming chat endpoint for real-time responses"""
+async def chat_stream(request: Request, message: str, conversation_id: str = "default"):
+    """Streaming chat endpoint for real-time responses (server-sent events)"""
     
     async def generate_stream():
+        stream_metrics.started += 1
+        started_at = time.monotonic()
+        outcome = "failed"
+        started = False
+        context = None
+        reply_parts: List[str] = []
+        done_data = None
+        first_token = None
+        speculative = False
+        analysis = None
+        event_id = 0
         try:
-            # Get conversation history
-            history = conversations.get(conversation_id, [])
+            analysis, route, context, batches, speculative = await start_stream_turn(conversation_id, message, "stream")
+            started = True
             
-            # Analyze context
-            analysis = analyzer.analyze_intent(message, history)
-            
-            # Build prompt
-            prompt = prompt_builder.build_prompt(message, history, analysis)
-            
-            # Stream from Ollama
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{OLLAMA_BASE_URL}/api/generate",
-                    json={
-                        "model": OLLAMA_MODEL,
-                        "prompt": prompt,
-                        "stream": True,
-                        "options": {
-                            "temperature": 0.7,
-                            "max_tokens": 200
-                        }
-                    }
-                ) as response:
-                    full_response = ""
-                    async for chunk in response.aiter_lines():
-                        if chunk:
-                            try:
-                                data = json.loads(chunk)
-                                if "response" in data:
-                                    token = data["response"]
-                                    full_response += token
-                                    yield f"data: {json.dumps({'token': token, 'done': data.get('done', False)})}\n\n"
-                                    
-                                if data.get("done", False):
-                                    # Save to conversation history
-                                    if conversation_id not in conversations:
-                                        conversations[conversation_id] = []
-                                    
-                                    conversations[conversation_id].extend([
-                                        {"role": "user", "content": message, "timestamp": datetime.now().isoformat()},
-                                        {"role": "assistant", "content": full_response, "timestamp": datetime.now().isoformat()}
-                                    ])
-                                    break
-                            except json.JSONDecodeError:
-                                continue
+            # A client that goes away closes the upstream stream straight away
+            async for batch in watch_client(batches, request.is_disconnected,
+                                            SSE_HEARTBEAT_SECONDS, SSE_DISCONNECT_POLL_SECONDS):
+                if batch is None:
+                    stream_metrics.heartbeats += 1
+                    yield HEARTBEAT
+                    continue
+
+                reply_parts.append(batch.text)
+                if first_token is None:
+                    first_token = round(time.monotonic() - started_at, 6)
+                event_id += 1
+                stream_metrics.sent(batch)
+                yield sse_token_event(batch.text, event_id, batch.done is not None)
+                    
+                if batch.done is not None:
+                    done_data = batch.done
+                    if not speculative:
+                        model_router.observe(route, time.monotonic() - started_at, done_data)
+            if done_data is not None:
+                outcome = "completed"
                                 
+        except ClientDisconnected:
+            outcome = "cancelled"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
         except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            event_id += 1
+            yield sse_event({'error': str(e)}, event_id)
+        finally:
+            stream_metrics.record(outcome)
+            chat_streams_total.inc("stream", outcome)
+            chat_stage_seconds.observe(time.monotonic() - started_at, "stream", "total")
+            capture_turn("stream", conversation_id, message, time.monotonic() - started_at, done_data,
+                         outcome=outcome, first_token=first_token, speculative=speculative)
+            analytics.record("stream", conversation_id, analysis, time.monotonic() - started_at,
+                             served_by="speculative" if speculative else "primary", outcome=outcome,
+                             first_token=first_token, data=done_data)
+            full_response = "".join(reply_parts)
+            if started and (full_response or outcome != "failed"):
+                # Shielded so the turn is saved even while the response is being cancelled
+                await asyncio.shield(save_stream_turn(conversation_id, message, full_response, route.model, context, done_data))
+    
+    # Shed up front while the queue is full, rather than after a 200 has been sent
+    try:
+        upstream_limiter.ensure_capacity(conversation_id)
+    except Overloaded as e:
+        return overloaded_response(e)
+    
+    return StreamingResponse(generate_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def _socket_turn(outbox: "asyncio.Queue", request_id: str, conversation_id: str, message: str) -> None:
+    """Stream one reply as frames onto a connection's outbox"""
+    stream_metrics.started += 1
+    started_at = time.monotonic()
+    outcome = "failed"
+    started = False
+    context = None
+    reply_parts: List[str] = []
+    done_data = None
+    first_token = None
+    speculative = False
+    analysis = suggestions = None
+    try:
+        upstream_limiter.ensure_capacity(conversation_id)
+        analysis, route, context, upstream, speculative = await start_stream_turn(conversation_id, message, "websocket")
+        started = True
+        await outbox.put({"type": "start", "id": request_id, "conversation_id": conversation_id})
+        
+        try:
+            seq = 0
+            async for batch in upstream:
+                if batch.text:
+                    reply_parts.append(batch.text)
+                    if first_token is None:
+                        first_token = round(time.monotonic() - started_at, 6)
+                    seq += 1
+                    stream_metrics.sent(batch)
+                    # Blocks while the client is behind, so a slow reader holds back its own stream
+                    await outbox.put({"type": "delta", "id": request_id, "seq": seq, "token": batch.text})
+                if batch.done is not None:
+                    done_data = batch.done
+                    if not speculative:
+                        model_router.observe(route, time.monotonic() - started_at, done_data)
+        finally:
+            # Cancelling this turn closes the upstream stream straight away
+            await upstream.aclose()
+        
+        if done_data is not None:
+            suggestions = analyzer.generate_suggestions(analysis)
+            outcome = "completed"
+            await outbox.put({
+                "type": "done",
+                "id": request_id,
+                "conversation_id": conversation_id,
+                "suggestions": suggestions,
+                "context_analysis": analysis
+            })
+        else:
+            await outbox.put({"type": "error", "id": request_id, "error": "Stream ended early"})
+    
+    except Overloaded as e:
+        await outbox.put({"type": "error", "id": request_id, "error": "busy", "reason": e.reason, "retry_after": e.retry_after})
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except Exception as e:
+        await outbox.put({"type": "error", "id": request_id, "error": str(e)})
+    finally:
+        stream_metrics.record(outcome)
+        chat_streams_total.inc("websocket", outcome)
+        chat_stage_seconds.observe(time.monotonic() - started_at, "websocket", "total")
+        capture_turn("websocket", conversation_id, message, time.monotonic() - started_at, done_data,
+                     outcome=outcome, first_token=first_token, speculative=speculative)
+        analytics.record("websocket", conversation_id, analysis, time.monotonic() - started_at,
+                         served_by="speculative" if speculative else "primary", outcome=outcome,
+                         first_token=first_token, suggestions=suggestions, data=done_data)
+        full_response = "".join(reply_parts)
+        if started and (full_response or outcome != "failed"):
+            await asyncio.shield(save_stream_turn(conversation_id, message, full_response, route.model, context, done_data))
+        if outcome == "completed":
+            # Once the turn is saved, so the answers follow on from this reply
+            speculator.schedule(conversation_id, suggestions)
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    """Chat over one long-lived connection, with any number of conversations multiplexed on it
+
+    Client frames:
+      {"type": "chat", "id": "<request id>", "conversation_id": "...", "message": "..."}
+      {"type": "cancel", "id": "<request id>"}
+      {"type": "ping"}
+    Server frames: start, delta (numbered batches of tokens), done, cancelled, error and pong,
+    each carrying the request id they belong to. A worker that is draining for a deploy answers
+    new chat frames with a "restarting" error and closes the connection (code 1012) once its
+    turns are done.
+    """
+    await websocket.accept()
+    socket_metrics["opened"] += 1
+    socket_metrics["active"] += 1
+    outbox: "asyncio.Queue" = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+    turns: Dict[str, asyncio.Task] = {}
+    
+    async def send_frames():
+        while True:
+            frame = await outbox.get()
+            if frame is None:
+                await websocket.close(code=1012)
+                return
+            await websocket.send_text(json.dumps(frame))
+            socket_metrics["frames_sent"] += 1
     
-    return StreamingResponse(generate_stream(), media_type="text/plain")
+    async def close_when_drained():
+        # Queued after the last frame of the last turn, so the close follows it
+        await drainer.wait_started()
+        await drainer.wait_idle(lambda: len(turns))
+        await outbox.put(None)
+    
+    writer = asyncio.ensure_future(send_frames())
+    closer = asyncio.ensure_future(close_when_drained())
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+                if not isinstance(frame, dict):
+                    raise ValueError("frame must be an object")
+            except WebSocketDisconnect:
+                break
+            except ValueError as e:
+                await outbox.put({"type": "error", "error": f"Invalid frame: {e}"})
+                continue
+            socket_metrics["frames_received"] += 1
+            
+            kind = frame.get("type")
+            request_id = str(frame.get("id", ""))
+            if kind == "chat":
+                message = frame.get("message")
+                if not request_id or not isinstance(message, str) or not message.strip():
+                    await outbox.put({"type": "error", "id": request_id, "error": "chat frames need an id and a message"})
+                elif drainer.draining:
+                    await outbox.put({"type": "error", "id": request_id, "error": "restarting"})
+                elif request_id in turns:
+                    await outbox.put({"type": "error", "id": request_id, "error": "id already in use"})
+                elif len(turns) >= WS_MAX_IN_FLIGHT:
+                    await outbox.put({"type": "error", "id": request_id, "error": "too many messages in flight"})
+                else:
+                    task = asyncio.ensure_future(
+                        _socket_turn(outbox, request_id, str(frame.get("conversation_id") or "default"), message)
+                    )
+                    turns[request_id] = task
+                    task.add_done_callback(lambda _, request_id=request_id: turns.pop(request_id, None))
+            elif kind == "cancel":
+                task = turns.get(request_id)
+                if task is not None:
+                    task.cancel()
+                    await outbox.put({"type": "cancelled", "id": request_id})
+            elif kind == "ping":
+                await outbox.put({"type": "pong"})
+            else:
+                await outbox.put({"type": "error", "id": request_id, "error": f"Unknown frame type: {kind}"})
+    finally:
+        # Stop generating for a client that has gone away
+        pending = list(turns.values())
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        closer.cancel()
+        writer.cancel()
+        await asyncio.gather(closer, writer, return_exceptions=True)
+        socket_metrics["active"] -= 1
 
 @app.get("/conversations/{conversation_id}")
-async def get_conversation(conversation_id: str):
-    """Get conversation history"""
-    return conversations.get(conversation_id, [])
+async def get_conversation(conversation_id: str, cursor: int = Query(0, ge=0),
+                           limit: int = Query(min(50, CONVERSATION_PAGE_LIMIT), ge=1, le=CONVERSATION_PAGE_LIMIT)):
+    """Get conversation history a page at a time
+
+    At most ``limit`` messages are returned, starting at message number
+    ``cursor``; the ``X-Next-Cursor`` header carries the cursor of the next
+    page while there is one.
+    """
+    messages, next_cursor = await conversation_store.page(conversation_id, cursor, limit)
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else None
+    return Response(dump_messages(messages), media_type="application/json", headers=headers)
 
 @app.delete("/conversations/{conversation_id}")
 async def clear_conversation(conversation_id: str):
     """Clear conversation history"""
-    if conversation_id in conversations:
-        del conversations[conversation_id]
+    await conversation_store.delete(conversation_id)
+    model_state.forget(conversation_id)
+    summarizer.forget(conversation_id)
+    speculator.forget(conversation_id)
     return {"message": "Conversation cleared"}
 
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request, offset: int = 0):
+    """Intent and entity counts for a JSONL body of chat messages (line format in assistant/batch.py)
+
+    The body is analyzed as it arrives, in chunks across a process pool, so
+    large uploads do not build up in memory. ``offset`` is where the body
+    starts in the client's file and the returned offset where it ended, so
+    a large file can be sent in parts and a failed part sent again. For
+    per-message results use ``python -m assistant.batch``.
+    """
+    global batch_jobs
+    if batch_executor is None:
+        raise HTTPException(status_code=503, detail="Batch analysis is disabled here; use python -m assistant.batch")
+    if batch_jobs >= ANALYZE_BATCH_MAX_JOBS:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Another batch analysis is running. Please try again shortly."},
+            headers={"Retry-After": "30"},
+        )
+    batch_jobs += 1
+    try:
+        started = time.perf_counter()
+        counts = BatchCounts()
+        end = offset
+        chunks = split_chunks(request.stream(), offset, ANALYZE_BATCH_CHUNK_LINES, ANALYZE_BATCH_MAX_LINE_BYTES)
+        async for end, chunk_counts, _ in analyze_chunks(chunks, batch_executor, ANALYZE_BATCH_WORKERS * 2):
+            counts.merge(chunk_counts)
+    finally:
+        batch_jobs -= 1
+    return {"offset": end, "seconds": round(time.perf_counter() - started, 3), "counts": counts.as_dict()}
+
+@app.get("/analytics/daily")
+async def analytics_daily(since: Optional[date] = None, until: Optional[date] = None):
+    """Daily turns, failures, leads and average latency per primary intent and conversation stage
+
+    Days are UTC and both ends are inclusive; by default the last 7 days.
+    Events still queued in the sink are not counted yet.
+    """
+    if not analytics.enabled:
+        raise HTTPException(status_code=404, detail="Analytics are disabled")
+    until = until or datetime.now(timezone.utc).date()
+    since = since or until - timedelta(days=6)
+    if since > until or (until - since).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Give since <= until, at most {ANALYTICS_MAX_DAYS} days apart")
+    try:
+        rows = await analytics.rollups(since, until)
+    except Exception as e:
+        logger.warning(f"Could not read analytics rollups: {e}")
+        raise HTTPException(status_code=503, detail="Analytics database unavailable")
+    return {"since": since.isoformat(), "until": until.isoformat(), "rollups": rows}
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
-            ollama_status = "healthy" if response.status_code == 200 else "unhealthy"
-    except:
-        ollama_status = "unreachable"
-    
+    """Health check endpoint (answers from the background probe, without calling Ollama)"""
+    upstream_health = ollama_client.health()
     return {
         "status": "healthy",
-        "ollama_status": ollama_status,
-        "active_conversations": len(conversations)
+        "ollama_status": upstream_health["status"],
+        "ollama_upstreams": upstream_health["upstreams"],
+        "active_conversations": await conversation_store.count()
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the configured models have been loaded into Ollama, and while draining"""
+    warmup = model_warmer.stats()
+    models = {model: state["warm"] for model, state in warmup["models"].items()}
+    if drainer.draining:
+        return JSONResponse(status_code=503, content={"status": "draining", "models": models})
+    if not model_warmer.ready:
+        return JSONResponse(status_code=503, content={"status": "warming", "models": models})
+    return {"status": "ready", "models": models}
+
+@app.post("/drain")
+async def drain(request: Request, timeout: Optional[float] = None):
+    """Wind this worker down before a deploy stops it (only from inside the container)
+
+    /ready answers 503 from now on and WebSockets close once their turns
+    are done. Returns once no streamed turns or sockets are left, or after
+    ``timeout`` seconds (DRAIN_TIMEOUT_SECONDS by default).
+    """
+    if request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Drain is only accepted from localhost")
+    drainer.begin()
+    drained = await drainer.wait_idle(lambda: stream_metrics.active + socket_metrics["active"], timeout)
+    return {"drained": drained, "streams": stream_metrics.active, "websockets": socket_metrics["active"]}
+
+@app.get("/stats")
+async def service_stats():
+    """Runtime statistics for capacity planning"""
+    return {
+        "ollama_pool": ollama_client.pool_stats(),
+        "conversation_store": await conversation_store.stats(),
+        "fast_path": fast_path.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "admission": upstream_limiter.stats(),
+        "model_state": model_state.stats(),
+        "prompt": prompt_builder.stats(),
+        "knowledge": {
+            **knowledge_index.stats(),
+            "source": "redis" if knowledge_feed is not None else ("file" if KNOWLEDGE_FILE else None),
+            "feed": knowledge_feed.stats() if knowledge_feed is not None else None
+        },
+        "model_routes": model_router.stats(),
+        "model_warmup": model_warmer.stats(),
+        "summarizer": summarizer.stats(),
+        "speculation": speculator.stats(),
+        "capture": traffic_capture.stats(),
+        "analytics": analytics.stats(),
+        "streams": stream_metrics.stats(),
+        "websockets": dict(socket_metrics),
+        "drain": drainer.stats(),
+        "resilience": {
+            "latency_slo_seconds": CHAT_LATENCY_SLO,
+            "fallback_model": OLLAMA_FALLBACK_MODEL or None,
+            "circuit_breaker": circuit_breaker.stats(),
+            "hedging": hedger.stats(),
+            "served_by": dict(served_by_counts)
+        },
+        "coalescing": {
+            "generate": generation_flight.stats(),
+            "stream": stream_fanout.stats()
+        }
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Metrics in the Prometheus text format; gauges are read at scrape time"""
+    store = await conversation_store.stats()
+    active_conversations.set(store["conversations"])
+    store_bytes.set(store["bytes"])
+    admission = upstream_limiter.stats()
+    for field in ("limit", "in_flight", "queue_depth"):
+        admission_gauge.set(admission[field], field)
+    for upstream in ollama_client.upstreams:
+        upstream_outstanding.set(upstream.outstanding, upstream.name)
+        upstream_healthy.set(1 if upstream.state != "ejected" else 0, upstream.name)
+    active_streams.set(stream_metrics.active)
+    active_sockets.set(socket_metrics["active"])
+    for model, state in model_warmer.models.items():
+        model_warm.set(1 if state.warm else 0, model)
+    speculation = speculator.stats()
+    for field in ("generated", "hits", "misses", "wasted", "generated_tokens", "wasted_tokens", "skipped_no_capacity"):
+        speculation_gauge.set(speculation[field], field)
+    return Response(metrics.render(), media_type=metrics.content_type)
+
+@app.post("/cache/invalidate")
+async def invalidate_cache():
+    """Drop cached answers, e.g. after company information has changed"""
+    return {"invalidated": semantic_cache.invalidate()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
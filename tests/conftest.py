@@ -0,0 +1,13 @@
+import importlib
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """The chat service module, imported without capture or analytics writers"""
+    os.environ.setdefault("CAPTURE_ENABLED", "0")
+    os.environ.setdefault("ANALYTICS_ENABLED", "0")
+    os.environ.setdefault("CONVERSATION_STORE", "memory")
+    return importlib.import_module("main")
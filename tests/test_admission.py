@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from assistant import admission
+from assistant.admission import AdaptiveConcurrencyLimiter, Overloaded
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+async def complete(limiter, latency, conversation_id="c", fail=False):
+    async with limiter.acquire(conversation_id) as slot:
+        slot.record(latency)
+        if fail:
+            raise RuntimeError("upstream failed")
+
+
+def test_limit_grows_by_about_one_per_round_of_fast_completions(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=6, latency_target=1.0)
+
+    async def scenario():
+        for _ in range(4):
+            await complete(limiter, 0.1)
+        assert limiter.limit == 4
+        await complete(limiter, 0.1)
+        assert limiter.limit == 5
+        for _ in range(20):
+            await complete(limiter, 0.1)
+
+    asyncio.run(scenario())
+    assert limiter.limit == 6
+
+
+def test_limit_backs_off_once_per_latency_window(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, min_limit=2, latency_target=1.0, backoff=0.5)
+
+    async def scenario():
+        await complete(limiter, 2.0)
+        assert limiter.limit == 5
+        # Slow calls that were already running when the limit dropped do not drop it again
+        await complete(limiter, 2.0)
+        assert limiter.limit == 5
+        clock.now += 3.0
+        with pytest.raises(RuntimeError):
+            await complete(limiter, 0.1, fail=True)
+        assert limiter.limit == 2
+        clock.now += 3.0
+        await complete(limiter, 5.0)
+        assert limiter.limit == 2
+
+    asyncio.run(scenario())
+    assert limiter.stats()["failed"] == 1
+
+
+def test_cancelled_callers_do_not_shrink_the_limit(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, latency_target=1.0)
+
+    async def scenario():
+        task = asyncio.ensure_future(complete_slowly())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def complete_slowly():
+        async with limiter.acquire("c"):
+            await asyncio.sleep(10)
+
+    asyncio.run(scenario())
+    assert limiter.limit == 4
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_queue_is_served_round_robin_by_conversation(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1, max_queue_per_conversation=3)
+    order = []
+
+    async def turn(conversation_id, release=None):
+        async with limiter.acquire(conversation_id):
+            order.append(conversation_id)
+            if release is not None:
+                await release.wait()
+
+    async def scenario():
+        release = asyncio.Event()
+        first = asyncio.ensure_future(turn("busy", release))
+        await asyncio.sleep(0)
+        waiting = [asyncio.ensure_future(turn(name)) for name in ("a", "a", "a", "b")]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(scenario())
+    assert order == ["busy", "a", "b", "a", "a"]
+
+
+def test_sheds_when_queues_are_full(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1, max_queue=2, max_queue_per_conversation=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold(conversation_id):
+            async with limiter.acquire(conversation_id):
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(hold(name)) for name in ("busy", "a")]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as per_conversation:
+            limiter.ensure_capacity("a")
+        tasks.append(asyncio.ensure_future(hold("b")))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as full:
+            limiter.ensure_capacity("c")
+        release.set()
+        await asyncio.gather(*tasks)
+        return per_conversation.value, full.value
+
+    per_conversation, full = asyncio.run(scenario())
+    assert (per_conversation.reason, per_conversation.status_code) == ("conversation_queue_full", 429)
+    assert (full.reason, full.status_code) == ("queue_full", 503)
+    assert full.retry_after >= 1
+
+
+def test_queued_request_preempts_background_work(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+    events = []
+
+    async def background():
+        try:
+            async with limiter.acquire("speculate:c", preemptible=True):
+                await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            events.append("preempted")
+            raise
+
+    async def scenario():
+        task = asyncio.ensure_future(background())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            async with limiter.acquire("speculate:d", preemptible=True):
+                pass
+        async with limiter.acquire("c"):
+            events.append("served")
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert events == ["preempted", "served"]
+    stats = limiter.stats()
+    assert (stats["preempted"], stats["in_flight"], stats["limit"]) == (1, 0, 1)
@@ -0,0 +1,43 @@
+import pytest
+
+from assistant.analyzer import ConversationAnalyzer, KeywordMatcher
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return ConversationAnalyzer()
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("What is your pricing?", "quote_request"),
+    ("Can I get a quotation for a villa", "quote_request"),
+    ("We were quoted too much elsewhere", "quote_request"),
+    ("I need a builder", "project_inquiry"),
+    ("We are renovating our kitchen", "project_inquiry"),
+    ("Who installs the AC units?", "service_question"),
+])
+def test_matches_inflected_keywords(analyzer, message, intent):
+    assert analyzer.analyze_message(message)["primary_intent"] == intent
+
+
+def test_keywords_do_not_match_inside_other_words():
+    matcher = KeywordMatcher({"types": {"maintenance": ["fix"]}})
+    assert matcher.scan("Add a prefix to the name")["types"] == set()
+    assert matcher.scan("Can you fix the door")["types"] == {"maintenance"}
+    assert matcher.scan("Fixing a leak")["types"] == {"maintenance"}
+
+
+def test_stems_need_an_inflection():
+    matcher = KeywordMatcher({"intents": {"quote": ["price"], "project": ["renovation"]}})
+    assert matcher.scan("pric renovat")["intents"] == set()
+    assert matcher.scan("priced, renovated")["intents"] == {"quote", "project"}
+
+
+def test_extracts_entities(analyzer):
+    analysis = analyzer.analyze_message("Renovating an office in Abu  Dhabi, budget 500k, urgent")
+    assert analysis["entities"] == {
+        "project_type": "commercial",
+        "location": "Abu Dhabi",
+        "budget_range": "500k",
+        "urgency": "urgent",
+    }
@@ -0,0 +1,55 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from assistant.messages import Message
+
+
+@pytest.fixture
+def client(main_module):
+    return TestClient(main_module.app)
+
+
+def test_conversation_pages(main_module, client):
+    asyncio.run(main_module.conversation_store.append("paged", [Message("user", str(n)) for n in range(5)]))
+
+    response = client.get("/conversations/paged", params={"limit": 2})
+    assert [message["content"] for message in response.json()] == ["0", "1"]
+    assert response.headers["X-Next-Cursor"] == "2"
+
+    response = client.get("/conversations/paged", params={"cursor": 4, "limit": 2})
+    assert [message["content"] for message in response.json()] == ["4"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.parametrize("params", [
+    {"limit": -3, "cursor": 2},
+    {"limit": 0},
+    {"cursor": -1},
+    {"limit": 10 ** 6},
+])
+def test_conversation_page_bounds(client, params):
+    assert client.get("/conversations/paged", params=params).status_code == 422
+
+
+def test_batch_analysis_uses_the_shared_pool(main_module, client, monkeypatch):
+    body = b'{"message": "What is your pricing for a villa?"}\n{"role": "assistant", "content": "Hi"}\n'
+    with ThreadPoolExecutor(1) as executor:
+        monkeypatch.setattr(main_module, "batch_executor", executor)
+        response = client.post("/analyze/batch", content=body)
+    assert response.status_code == 200
+    assert response.json()["offset"] == len(body)
+    assert response.json()["counts"]["primary_intent"] == {"quote_request": 1}
+
+
+def test_batch_analysis_is_limited_and_can_be_disabled(main_module, client, monkeypatch):
+    monkeypatch.setattr(main_module, "batch_executor", None)
+    assert client.post("/analyze/batch", content=b"").status_code == 503
+
+    monkeypatch.setattr(main_module, "batch_executor", object())
+    monkeypatch.setattr(main_module, "batch_jobs", main_module.ANALYZE_BATCH_MAX_JOBS)
+    response = client.post("/analyze/batch", content=b"")
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
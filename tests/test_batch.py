@@ -0,0 +1,41 @@
+import asyncio
+
+from assistant.batch import BatchCounts, OverlongLine, analyze_chunk, split_chunks
+
+
+async def stream(*parts):
+    for part in parts:
+        yield part
+
+
+def chunks_of(*parts, **kwargs):
+    async def collect():
+        return [chunk async for chunk in split_chunks(stream(*parts), **kwargs)]
+
+    return asyncio.run(collect())
+
+
+def test_overlong_lines_are_dropped_as_they_arrive_and_counted_invalid():
+    good = b'{"message": "What is your pricing for a villa?"}\n'
+    parts = [good[:10], good[10:] + b"x" * 40, b"x" * 40, b"x" * 40 + b"\n" + good, b"y" * 100]
+    chunks = chunks_of(*parts, max_line_bytes=64)
+
+    assert len(chunks) == 1
+    offset, lines = chunks[0]
+    assert offset == 0
+    assert [type(line) for line in lines] == [bytes, OverlongLine, bytes, OverlongLine]
+    assert sum(map(len, lines)) == sum(map(len, parts))
+
+    counts, _ = analyze_chunk(lines, offset)
+    assert (counts.messages, counts.invalid) == (2, 2)
+
+
+def test_chunk_offsets_count_dropped_bytes():
+    line = b'{"message": "hi"}\n'
+    chunks = chunks_of(b"z" * 100 + b"\n" + line, line, chunk_lines=1, max_line_bytes=64)
+
+    assert [offset for offset, _ in chunks] == [0, 101, 101 + len(line)]
+    totals = BatchCounts()
+    for offset, lines in chunks:
+        totals.merge(analyze_chunk(lines, offset)[0])
+    assert (totals.messages, totals.invalid) == (2, 1)
@@ -0,0 +1,38 @@
+import asyncio
+import json
+import os
+
+from assistant.capture import TrafficCapture, anonymize
+
+
+def test_masks_emails_and_phone_numbers_only():
+    masked = anonymize("I'm Sara, ali@example.com, +971 50 123 4567, villa at 12 Beach Rd, budget 1500000 AED")
+    assert masked == "I'm Sara, <email>, <phone>, villa at 12 Beach Rd, budget 1500000 AED"
+
+
+def test_prunes_segments_left_by_earlier_runs(tmp_path):
+    for n in range(4):
+        path = tmp_path / f"capture-2024010{n}-000000-1-0001.jsonl"
+        path.write_text("{}\n")
+        os.utime(path, (1000 + n, 1000 + n))
+    (tmp_path / "notes.jsonl").write_text("")
+    capture = TrafficCapture(str(tmp_path), max_segments=3, salt="s", flush_interval=3600, enabled=True)
+
+    async def run():
+        await capture.start()
+        capture.record("chat", "conversation", "hello", 0.5)
+        await capture.close()
+
+    asyncio.run(run())
+    names = sorted(os.listdir(tmp_path))
+    assert "notes.jsonl" in names
+    segments = [name for name in names if name.startswith("capture-")]
+    assert len(segments) == 3
+    assert "capture-20240100-000000-1-0001.jsonl" not in segments
+    assert "capture-20240101-000000-1-0001.jsonl" not in segments
+
+    new = [name for name in segments if not name.startswith("capture-202401")]
+    with open(tmp_path / new[0]) as handle:
+        record = json.loads(handle.readline())
+    assert record["conversation"] == capture.conversation_hash("conversation")
+    assert record["message"] == "hello"
@@ -0,0 +1,54 @@
+import asyncio
+
+from assistant.sse import TokenBatch
+
+
+class DisconnectingRequest:
+    """Reports the client as gone once disconnect is set"""
+
+    def __init__(self):
+        self.disconnect = asyncio.Event()
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnect.is_set()
+
+
+def test_partial_reply_is_saved_when_the_client_disconnects(main_module, monkeypatch):
+    main = main_module
+    closed = []
+
+    async def batches():
+        try:
+            yield TokenBatch("We build vil", 3)
+            await asyncio.sleep(3600)
+            yield TokenBatch("las.", 1, {"done": True})
+        finally:
+            closed.append(True)
+
+    async def start_stream_turn(conversation_id, message, endpoint):
+        analysis = main.analyzer.analyze_intent(message, [])
+        return analysis, main.model_router.choose(analysis), None, batches(), False
+
+    monkeypatch.setattr(main, "start_stream_turn", start_stream_turn)
+    monkeypatch.setattr(main, "SSE_DISCONNECT_POLL_SECONDS", 0.01)
+    saved_before = main.stream_metrics.partial_replies_saved
+
+    async def scenario():
+        request = DisconnectingRequest()
+        response = await main.chat_stream(request, "What do you build?", "sse-disconnect")
+        body = response.body_iterator
+        first = await body.__anext__()
+        request.disconnect.set()
+        rest = [chunk async for chunk in body]
+        return first, rest, await main.conversation_store.get("sse-disconnect")
+
+    first, rest, history = asyncio.run(scenario())
+
+    assert '"token": "We build vil"' in first
+    assert rest == []
+    assert closed == [True]
+    assert [(message.role, message.content, message.interrupted) for message in history] == [
+        ("user", "What do you build?", False),
+        ("assistant", "We build vil", True),
+    ]
+    assert main.stream_metrics.partial_replies_saved == saved_before + 1
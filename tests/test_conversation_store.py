@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from assistant import conversation_store
+from assistant.conversation_store import InMemoryConversationStore, RedisConversationStore
+from assistant.messages import Message
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conversation_store.time, "monotonic", clock)
+    return clock
+
+
+def messages(*contents):
+    return [Message("user", content) for content in contents]
+
+
+def test_trims_history_to_max_messages():
+    store = InMemoryConversationStore(max_messages=3)
+    history = asyncio.run(store.append("a", messages("1", "2", "3", "4", "5")))
+    assert [message.content for message in history] == ["3", "4", "5"]
+
+
+def test_evicts_least_recently_used_conversation(clock):
+    store = InMemoryConversationStore(max_conversations=2)
+
+    async def run():
+        await store.append("a", messages("a"))
+        await store.append("b", messages("b"))
+        await store.get("a")
+        await store.append("c", messages("c"))
+        return await store.get("a"), await store.get("b"), (await store.stats())["evictions"]
+
+    a, b, evictions = asyncio.run(run())
+    assert [message.content for message in a] == ["a"]
+    assert b == []
+    assert evictions["max_conversations"] == 1
+
+
+def test_expires_idle_conversations(clock):
+    store = InMemoryConversationStore(ttl_seconds=60)
+
+    async def run():
+        await store.append("old", messages("x"))
+        clock.now += 30
+        await store.append("new", messages("y"))
+        clock.now += 45
+        return await store.get("old"), await store.get("new"), await store.count()
+
+    old, new, count = asyncio.run(run())
+    assert old == []
+    assert [message.content for message in new] == ["y"]
+    assert count == 1
+
+
+def test_memory_cap_keeps_the_most_recent_conversation(clock):
+    store = InMemoryConversationStore(max_bytes=1)
+
+    async def run():
+        await store.append("a", messages("a" * 100))
+        await store.append("b", messages("b" * 100))
+        return await store.get("a"), await store.get("b")
+
+    a, b = asyncio.run(run())
+    assert a == []
+    assert len(b) == 1
+
+
+def test_compressed_conversation_expands_on_access(clock):
+    store = InMemoryConversationStore(compress_after=10)
+
+    async def run():
+        await store.append("a", messages("hello", "world"))
+        clock.now += 20
+        await store.get("missing")
+        compressed = (await store.stats())["compressed"]
+        history = await store.get("a")
+        return compressed, history, (await store.stats())["compressed"]
+
+    compressed_before, history, compressed_after = asyncio.run(run())
+    assert compressed_before == 1
+    assert [message.content for message in history] == ["hello", "world"]
+    assert compressed_after == 0
+
+
+def test_pages_keep_their_place_after_trimming():
+    store = InMemoryConversationStore(max_messages=4)
+
+    async def run():
+        await store.append("a", messages("1", "2", "3"))
+        first_page = await store.page("a", 0, 2)
+        await store.append("a", messages("4", "5"))
+        second_page = await store.page("a", first_page[1], 2)
+        return first_page, second_page, await store.page("a", 1, 10)
+
+    (first, first_next), (second, second_next), (rest, rest_next) = asyncio.run(run())
+    assert [message.content for message in first] == ["1", "2"] and first_next == 2
+    assert [message.content for message in second] == ["3", "4"] and second_next == 4
+    # Message 1 was trimmed, so the page starts at the oldest one kept
+    assert [message.content for message in rest] == ["2", "3", "4", "5"] and rest_next is None
+
+
+@pytest.mark.parametrize("cursor, limit", [(0, 0), (0, -3), (-1, 10)])
+def test_rejects_invalid_pages(cursor, limit):
+    store = InMemoryConversationStore()
+    with pytest.raises(ValueError):
+        asyncio.run(store.page("a", cursor, limit))
+
+
+def test_redis_store_evicts_oldest_conversation():
+    store = RedisConversationStore.from_url("fakeredis://", max_conversations=2)
+
+    async def run():
+        await store.append("a", messages("a"))
+        await asyncio.sleep(0.01)
+        await store.append("b", messages("b"))
+        await asyncio.sleep(0.01)
+        await store.append("c", messages("c"))
+        result = await store.get("a"), await store.get("c"), await store.count()
+        await store.close()
+        return result
+
+    a, c, count = asyncio.run(run())
+    assert a == []
+    assert [message.content for message in c] == ["c"]
+    assert count == 2
@@ -0,0 +1,56 @@
+import asyncio
+import sqlite3
+from datetime import date, timedelta
+
+from assistant.capture import TrafficCapture
+from assistant.events import AnalyticsSink, SQLiteBackend
+
+
+def test_writes_hashed_events_and_daily_rollups(tmp_path):
+    sink = AnalyticsSink(SQLiteBackend(str(tmp_path / "analytics.sqlite3")), flush_interval=3600, salt="s")
+    analysis = {"primary_intent": "quote_request", "conversation_stage": "exploration", "entities": {}}
+
+    async def run():
+        await sink.start()
+        sink.record("chat", "user-42", analysis, 0.5)
+        sink.record("stream", "user-42", analysis, 1.5, outcome="cancelled")
+        await sink._flush()
+        today = date.today()
+        rows = await sink.rollups(today - timedelta(days=1), today + timedelta(days=1))
+        await sink.close()
+        return rows
+
+    rows = asyncio.run(run())
+    assert [(row["primary_intent"], row["turns"], row["failed"], row["leads"], row["avg_latency_ms"]) for row in rows] == [
+        ("quote_request", 2, 0, 2, 1000.0),
+    ]
+
+    connection = sqlite3.connect(str(tmp_path / "analytics.sqlite3"))
+    stored = {row[0] for row in connection.execute("SELECT conversation_id FROM chat_events")}
+    connection.close()
+    assert stored == {TrafficCapture("unused", salt="s").conversation_hash("user-42")}
+
+
+def test_only_failed_turns_count_as_failed(tmp_path):
+    sink = AnalyticsSink(SQLiteBackend(str(tmp_path / "analytics.sqlite3")), flush_interval=3600, salt="s")
+
+    async def run():
+        await sink.start()
+        sink.record("stream", "a", None, 0.1, outcome="cancelled")
+        sink.record("stream", "b", None, 0.1, outcome="failed")
+        sink.record("chat", "c", None, 0.1, served_by="overloaded")
+        await sink._flush()
+        today = date.today()
+        rows = await sink.rollups(today - timedelta(days=1), today + timedelta(days=1))
+        await sink.close()
+        return rows
+
+    rows = asyncio.run(run())
+    assert sum(row["turns"] for row in rows) == 3
+    assert sum(row["failed"] for row in rows) == 2
+
+
+def test_disabled_sink_records_nothing():
+    sink = AnalyticsSink.from_url("sqlite://", enabled=False)
+    sink.record("chat", "c", None, 0.1)
+    assert sink.stats()["recorded"] == 0
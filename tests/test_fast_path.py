@@ -0,0 +1,76 @@
+import pytest
+
+from assistant.analyzer import ConversationAnalyzer
+from assistant.fast_path import FastPathResponder
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return ConversationAnalyzer()
+
+
+@pytest.fixture
+def responder(analyzer):
+    return FastPathResponder(analyzer.company_context)
+
+
+def answer(responder, analyzer, message):
+    return responder.answer(message, analyzer.analyze_message(message))
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("What is your phone number?", "📞"),
+    ("Your phone number please", "📞"),
+    ("Hi, what's your email?", "📧"),
+    ("Where are you located?", "📍"),
+    ("What services do you offer?", "🏗️"),
+])
+def test_answers_direct_fact_questions(responder, analyzer, message, expected):
+    reply = answer(responder, analyzer, message)
+    assert reply is not None and reply.startswith(expected)
+    assert responder.stats()["llm_skipped"] == 1
+
+
+def test_answers_every_fact_asked_for(responder, analyzer):
+    reply = answer(responder, analyzer, "Can you give me your email address and phone number?")
+    assert reply.splitlines()[:2] == [
+        f"📞 You can call or WhatsApp us on {analyzer.company_context['phone']}.",
+        f"📧 You can email us at {analyzer.company_context['email']}.",
+    ]
+
+
+@pytest.mark.parametrize("message", [
+    "Do you offer discounts?",
+    "Do you provide warranty on your work?",
+    "what number of floors is allowed in Abu Dhabi",
+    "Do you have an office in Dubai?",
+    "What is the address of my site visit",
+    "What location do you need for the pool",
+    "Email me",
+])
+def test_leaves_other_questions_to_the_model(responder, analyzer, message):
+    assert answer(responder, analyzer, message) is None
+    assert responder.stats()["llm_skipped"] == 0
+
+
+@pytest.mark.parametrize("message", [
+    "What is your address for the villa project site in Dubai?",
+    "What is your phone number, my kitchen in Sharjah needs new cabinets",
+    "What services do you offer for a villa renovation with a budget of 500k AED?",
+])
+def test_confidence_drops_with_the_rest_of_the_message(responder, analyzer, message):
+    assert responder.confidence(message, analyzer.analyze_message(message)) < responder.threshold
+    assert answer(responder, analyzer, message) is None
+
+
+def test_confidence_is_the_share_of_the_message_the_question_covers(responder, analyzer):
+    message = "What is your phone number in the UAE please"
+    # "in" and "uae" are neither the fact nor the question around it
+    assert responder.confidence(message, analyzer.analyze_message(message)) == pytest.approx(1 - 2 / 9)
+
+
+def test_threshold_is_exclusive(responder, analyzer):
+    message = "Your phone number Dubai"
+    assert responder.confidence(message, analyzer.analyze_message(message)) == responder.threshold == 0.75
+    assert answer(responder, analyzer, message) is None
+    assert responder.stats()["low_confidence"] == 1
@@ -0,0 +1,27 @@
+from assistant.messages import Message
+from assistant.prompts import PromptBudget, SmartPromptBuilder
+
+
+def history_tokens(builder, history, summary):
+    before = builder.prompt_tokens_total
+    builder._budget_history(history, summary)
+    return builder.prompt_tokens_total - before
+
+
+def test_summary_tokens_count_towards_the_prompt_total():
+    builder = SmartPromptBuilder(PromptBudget(history=600, summary=150))
+    history = [Message("user", "I want a villa"), Message("assistant", "Great, where?")]
+    summary = "The client is planning a four bedroom villa in Abu Dhabi."
+
+    without_summary = history_tokens(builder, history, None)
+    with_summary = history_tokens(builder, history, summary)
+    assert with_summary == without_summary + builder.counter.count(summary)
+
+
+def test_summary_is_held_to_what_is_left_of_the_history_budget():
+    builder = SmartPromptBuilder(PromptBudget(history=40, summary=150))
+    history = [Message("user", "word " * 10)]
+    summary = "older detail " * 100
+
+    assert history_tokens(builder, history, summary) <= 40
+    assert builder.stats()["truncated"]["history"] >= 1
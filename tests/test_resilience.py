@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from assistant import resilience
+from assistant.resilience import CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_at_failure_ratio_after_min_calls(clock):
+    breaker = CircuitBreaker(window=10, min_calls=4, failure_ratio=0.5, open_seconds=30)
+    for ok in (False, False, True):
+        breaker.record(ok)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_trial_closes_or_reopens(clock):
+    breaker = CircuitBreaker(window=2, min_calls=2, open_seconds=30, half_open_calls=1)
+    breaker.record(False)
+    breaker.record(False)
+    clock.now += 29
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["recent_calls"] == 0
+
+
+def test_abandoned_trial_frees_its_place(clock):
+    breaker = CircuitBreaker(window=2, min_calls=2, open_seconds=30)
+    breaker.record(False)
+    breaker.record(False)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def slow_generations(seconds_by_model):
+    async def generate_on(payload, upstream=None):
+        await asyncio.sleep(seconds_by_model[payload["model"]])
+        return {"response": payload["model"], "done": True}
+    return generate_on
+
+
+@pytest.fixture
+def generation(main_module, monkeypatch):
+    main = main_module
+    breaker = CircuitBreaker(window=4, min_calls=1, failure_ratio=0.5)
+    monkeypatch.setattr(main, "circuit_breaker", breaker)
+    monkeypatch.setattr(main, "CHAT_LATENCY_SLO", 0.05)
+    monkeypatch.setattr(main, "OLLAMA_GENERATE_TIMEOUT", 1.0)
+    return main, breaker
+
+
+def test_slo_miss_uses_fallback_without_counting_as_failure(generation, monkeypatch):
+    main, breaker = generation
+    monkeypatch.setattr(main, "OLLAMA_FALLBACK_MODEL", "small")
+    monkeypatch.setattr(main, "_generate_on", slow_generations({"big": 0.2, "small": 0.0}))
+
+    data = asyncio.run(main._resilient_generate({"model": "big", "prompt": "hi"}, "slo", lambda: "hi"))
+
+    assert (data["response"], data["served_by"]) == ("small", "fallback")
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["recent_failures"] == 0
+
+
+def test_without_fallback_the_primary_gets_the_generate_timeout(generation, monkeypatch):
+    main, breaker = generation
+    monkeypatch.setattr(main, "OLLAMA_FALLBACK_MODEL", "")
+    monkeypatch.setattr(main, "_generate_on", slow_generations({"big": 0.2}))
+
+    data = asyncio.run(main._resilient_generate({"model": "big", "prompt": "hi"}, "slo", lambda: "hi"))
+
+    assert data["response"] == "big"
+    assert breaker.stats()["recent_failures"] == 0
@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from assistant.semantic_cache import HashingEmbedder, SemanticResponseCache
+
+
+class VectorEmbedder:
+    """Returns preset vectors, so similarities are known exactly"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    async def __call__(self, text):
+        return np.asarray(self.vectors[text], dtype=np.float32)
+
+
+def lookup(cache, message, intent="general", stage="greeting", entities=None):
+    return asyncio.run(cache.lookup(message, intent, stage, entities))
+
+
+def remember(cache, message, response, **kwargs):
+    probe = lookup(cache, message, **kwargs)
+    assert not probe.hit
+    cache.store(probe, response, 1.0)
+
+
+def test_hit_needs_similarity_at_threshold():
+    cache = SemanticResponseCache(VectorEmbedder({
+        "what do you do": [1.0, 0.0],
+        "what is it you do": [0.9, np.sqrt(1 - 0.81)],
+        "where are you": [0.8, 0.6],
+    }), threshold=0.85)
+    remember(cache, "What do you do?", "We build villas.")
+
+    assert lookup(cache, "what is it you do").response == "We build villas."
+    assert not lookup(cache, "where are you").hit
+    assert cache.stats()["hits"] == 1
+
+
+def test_partitions_by_intent_and_stage():
+    cache = SemanticResponseCache(HashingEmbedder())
+    remember(cache, "tell me about your company", "About us.", intent="general_info")
+
+    assert not lookup(cache, "tell me about your company", intent="quote_request").hit
+    assert not lookup(cache, "tell me about your company", intent="general_info", stage="exploration").hit
+    assert lookup(cache, "tell me about your company", intent="general_info").hit
+
+
+def test_partitions_by_entities_and_numbers():
+    cache = SemanticResponseCache(HashingEmbedder(), threshold=0.5)
+    remember(cache, "How long does a villa in Dubai take?", "Dubai answer",
+             entities={"project_type": "villa", "location": "Dubai"})
+
+    assert not lookup(cache, "How long does a villa in Sharjah take?",
+                      entities={"project_type": "villa", "location": "Sharjah"}).hit
+    assert lookup(cache, "How long does a villa in Dubai take",
+                  entities={"location": "Dubai", "project_type": "villa"}).response == "Dubai answer"
+
+    remember(cache, "Can you do it for 300k", "300k answer")
+    assert not lookup(cache, "Can you do it for 900k").hit
+    assert lookup(cache, "can you do it for 300k").response == "300k answer"
+
+
+def test_only_configured_stages_are_cached():
+    cache = SemanticResponseCache(HashingEmbedder(), stages=("greeting",))
+    probe = lookup(cache, "hello there", stage="decision")
+    assert not probe.cacheable
+    cache.store(probe, "Hi!", 1.0)
+    assert cache.stats()["entries"] == 0
+
+
+def test_embedder_errors_propagate():
+    async def broken(text):
+        raise ConnectionError("embedding model is down")
+
+    cache = SemanticResponseCache(broken)
+    with pytest.raises(ConnectionError):
+        lookup(cache, "hello")
+
+
+def test_evicts_least_recently_used():
+    cache = SemanticResponseCache(HashingEmbedder(), capacity=2)
+    remember(cache, "first question", "1")
+    remember(cache, "second question", "2")
+    assert lookup(cache, "first question").hit
+    remember(cache, "third question", "3")
+
+    assert not lookup(cache, "second question").hit
+    assert lookup(cache, "first question").hit
+    assert cache.stats()["evictions"] == 1